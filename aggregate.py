@@ -0,0 +1,419 @@
+"""
+aggregate.py
+Streaming statistics for large batches of 0-player games.  Games are played over a process pool as in simulation.py,
+but each worker folds its games into a gameStatistics and only that partial aggregate is sent back, where it's merged
+into the running total.  Nothing is kept per game, so memory stays constant however many games are played, and a
+snapshot of the totals is written to JSON or CSV every few seconds while the run goes on.
+
+    python aggregate.py --games 100000 --output stats.json --flush-seconds 5
+    python aggregate.py --input results.jsonl --output stats.csv
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED,ProcessPoolExecutor,wait
+
+import battleship
+import simulation
+
+class quantileSketch:
+    """
+    quantileSketch class estimates quantiles of positive numbers in bounded memory.  Values are counted in buckets
+    whose bounds grow geometrically, so every estimate is within relativeAccuracy of a value that was added, and two
+    sketches with the same accuracy merge by adding their bucket counts.
+    """
+    def __init__(self,relativeAccuracy=0.01):
+        """
+        :param relativeAccuracy: Float bound on the relative error of each quantile.
+        """
+        self.relativeAccuracy = relativeAccuracy
+        self.gamma = (1+relativeAccuracy)/(1-relativeAccuracy)
+        self.logGamma = math.log(self.gamma)
+        # buckets[key] counts the values in (gamma**(key-1), gamma**key].  Values of 0 or less are counted in zeros.
+        self.buckets = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self,value,count=1):
+        """
+        Count a value.
+        :param value: Number.
+        :param count: Integer number of times to count it.
+        :return: None.
+        """
+        if value <= 0:
+            self.zeros += count
+        else:
+            key = math.ceil(math.log(value)/self.logGamma)
+            self.buckets[key] = self.buckets.get(key,0)+count
+        self.count += count
+
+    def merge(self,other):
+        """
+        Add another sketch's counts to this one.
+        :param other: quantileSketch with the same relativeAccuracy.
+        :return: None.
+        """
+        if other.relativeAccuracy != self.relativeAccuracy:
+            raise ValueError("only sketches with the same relative accuracy can be merged")
+        for key,count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key,0)+count
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def quantile(self,fraction):
+        """
+        Estimate a quantile.
+        :param fraction: Float between 0 and 1, e.g. 0.5 for the median.
+        :return: Float estimate, or None if nothing has been added.
+        """
+        if not self.count:
+            return None
+        rank = fraction*(self.count-1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                return 2*self.gamma**key/(self.gamma+1)
+        return 2*self.gamma**max(self.buckets)/(self.gamma+1)
+
+class gameStatistics:
+    """
+    gameStatistics class folds game results into running totals: wins by seat and by starting player, a shots-to-win
+    histogram and quantile sketch, per-cell hit and miss counts over every shot fired, and how often each ship size
+    went down first, second and so on.  Its size depends on the gameboard and fleet, never on the number of games.
+    """
+    def __init__(self,rows=10,columns=10):
+        """
+        :param rows: Integer number of gameboard rows.
+        :param columns: Integer number of gameboard columns.
+        """
+        self.rows = rows
+        self.columns = columns
+        self.games = 0
+        # Wins by seat, games started by each player and wins by the player who started.
+        self.wins = {1:0,2:0}
+        self.started = {1:0,2:0}
+        self.starterWins = {1:0,2:0}
+        # shotsHistogram[shots] counts the games won in that many shots.
+        self.shotsHistogram = {}
+        self.shotsSketch = quantileSketch()
+        self.shotsTotal = 0
+        self.shotsSquares = 0
+        # hits[cell] and misses[cell] count shots at each cell of a target gameboard.  Only games with a shot stream
+        # (simulation.playGame() with record) add to them.
+        cells = rows*columns
+        if cells <= battleship.denseCells:
+            self.hits = [0]*cells
+            self.misses = [0]*cells
+        else:
+            self.hits = {}
+            self.misses = {}
+        self.heatMapGames = 0
+        # sinkOrder[(position, ship size)] counts how often an aggressor's position-th sinking (from 1) was that size.
+        self.sinkOrder = {}
+
+    def addGame(self,gameResult):
+        """
+        Fold one game into the totals.
+        :param gameResult: Dictionary from simulation.playGame() or a line of simulation.py --output.
+        :return: None.
+        """
+        self.games += 1
+        winner = gameResult["winner"]
+        firstPlayer = gameResult.get("firstPlayer",1)
+        self.wins[winner] += 1
+        self.started[firstPlayer] += 1
+        if winner == firstPlayer:
+            self.starterWins[firstPlayer] += 1
+        shots = gameResult["shots"]
+        self.shotsHistogram[shots] = self.shotsHistogram.get(shots,0)+1
+        self.shotsSketch.add(shots)
+        self.shotsTotal += shots
+        self.shotsSquares += shots*shots
+        positions = {1:0,2:0}
+        for aggressor,shipSize in gameResult["sinkOrder"]:
+            positions[aggressor] += 1
+            key = (positions[aggressor],shipSize)
+            self.sinkOrder[key] = self.sinkOrder.get(key,0)+1
+        shotStream = gameResult.get("shotStream")
+        if shotStream is not None:
+            self.heatMapGames += 1
+            hits = self.hits
+            misses = self.misses
+            if isinstance(hits,list):
+                for player,cell,result in shotStream:
+                    if result == "Miss":
+                        misses[cell] += 1
+                    elif result != "Repeat":
+                        hits[cell] += 1
+            else:
+                for player,cell,result in shotStream:
+                    if result == "Miss":
+                        misses[cell] = misses.get(cell,0)+1
+                    elif result != "Repeat":
+                        hits[cell] = hits.get(cell,0)+1
+
+    def merge(self,other):
+        """
+        Add another gameStatistics, e.g. a worker's partial aggregate, to this one.
+        :param other: gameStatistics for the same gameboard size.
+        :return: None.
+        """
+        if (other.rows,other.columns) != (self.rows,self.columns):
+            raise ValueError("only statistics for the same gameboard size can be merged")
+        self.games += other.games
+        for player in (1,2):
+            self.wins[player] += other.wins[player]
+            self.started[player] += other.started[player]
+            self.starterWins[player] += other.starterWins[player]
+        for shots,count in other.shotsHistogram.items():
+            self.shotsHistogram[shots] = self.shotsHistogram.get(shots,0)+count
+        self.shotsSketch.merge(other.shotsSketch)
+        self.shotsTotal += other.shotsTotal
+        self.shotsSquares += other.shotsSquares
+        if isinstance(self.hits,list):
+            self.hits = [a+b for a,b in zip(self.hits,other.hits)]
+            self.misses = [a+b for a,b in zip(self.misses,other.misses)]
+        else:
+            for mine,theirs in ((self.hits,other.hits),(self.misses,other.misses)):
+                for cell,count in theirs.items():
+                    mine[cell] = mine.get(cell,0)+count
+        self.heatMapGames += other.heatMapGames
+        for key,count in other.sinkOrder.items():
+            self.sinkOrder[key] = self.sinkOrder.get(key,0)+count
+
+    def cellCounts(self):
+        """
+        List the cells that were fired at.
+        :return: List of (cell index, hits, misses) tuples in cell order.
+        """
+        if isinstance(self.hits,list):
+            return [(cell,hits,misses) for cell,(hits,misses) in enumerate(zip(self.hits,self.misses)) if hits or misses]
+        return [(cell,self.hits.get(cell,0),self.misses.get(cell,0)) for cell in sorted(set(self.hits) | set(self.misses))]
+
+    def snapshot(self):
+        """
+        Summarize the totals.
+        :return: Dictionary of statistics.
+        """
+        games = self.games
+        rate = lambda wins,played: round(wins/played,4) if played else None
+        summary = {"games":games,
+                   "rows":self.rows,
+                   "columns":self.columns,
+                   "winRate":{str(player):rate(self.wins[player],games) for player in (1,2)},
+                   "winRateByStartingPlayer":{str(player):rate(self.starterWins[player],self.started[player])
+                                              for player in (1,2) if self.started[player]}}
+        shotsToWin = {"mean":None,"stdev":None,"min":None,"max":None}
+        if games:
+            mean = self.shotsTotal/games
+            shotsToWin["mean"] = round(mean,3)
+            shotsToWin["stdev"] = round(math.sqrt(max(0.0,self.shotsSquares/games-mean*mean)),3)
+            shotsToWin["min"] = min(self.shotsHistogram)
+            shotsToWin["max"] = max(self.shotsHistogram)
+        for name,fraction in (("p50",0.5),("p90",0.9),("p99",0.99)):
+            estimate = self.shotsSketch.quantile(fraction)
+            shotsToWin[name] = None if estimate is None else round(estimate,2)
+        shotsToWin["histogram"] = {str(shots):self.shotsHistogram[shots] for shots in sorted(self.shotsHistogram)}
+        summary["shotsToWin"] = shotsToWin
+        heatMap = {"games":self.heatMapGames}
+        if isinstance(self.hits,list):
+            heatMap["hits"] = [self.hits[row*self.columns:(row+1)*self.columns] for row in range(self.rows)]
+            heatMap["misses"] = [self.misses[row*self.columns:(row+1)*self.columns] for row in range(self.rows)]
+        else:
+            geometry = battleship.gameboardGeometry(self.rows,self.columns)
+            heatMap["cells"] = {geometry.label(cell):[hits,misses] for cell,hits,misses in self.cellCounts()}
+        summary["heatMap"] = heatMap
+        sinkOrder = {}
+        for (position,shipSize),count in sorted(self.sinkOrder.items()):
+            sinkOrder.setdefault(str(position),{})[str(shipSize)] = count
+        summary["sinkOrder"] = sinkOrder
+        return summary
+
+    def csvRows(self):
+        """
+        Flatten the totals into (statistic, key, value) rows.
+        :return: List of tuples.
+        """
+        summary = self.snapshot()
+        rows = [("games","",summary["games"])]
+        for player,value in summary["winRate"].items():
+            rows.append(("winRate",player,value))
+        for player,value in summary["winRateByStartingPlayer"].items():
+            rows.append(("winRateByStartingPlayer",player,value))
+        for name,value in summary["shotsToWin"].items():
+            if name != "histogram":
+                rows.append(("shotsToWin",name,value))
+        for shots,count in summary["shotsToWin"]["histogram"].items():
+            rows.append(("shotsToWinHistogram",shots,count))
+        geometry = battleship.gameboardGeometry(self.rows,self.columns)
+        for cell,hits,misses in self.cellCounts():
+            rows.append(("hits",geometry.label(cell),hits))
+            rows.append(("misses",geometry.label(cell),misses))
+        for position,sizes in summary["sinkOrder"].items():
+            for shipSize,count in sizes.items():
+                rows.append(("sinkOrder",position+":"+shipSize,count))
+        return rows
+
+    def writeSnapshot(self,path):
+        """
+        Write a snapshot to a file, CSV if the path ends in .csv and JSON otherwise.  The file is replaced in one step so
+        a reader never sees half a snapshot.
+        :param path: String file path.
+        :return: None.
+        """
+        temporaryPath = path+".tmp"
+        with open(temporaryPath,"w",newline="") as snapshotFile:
+            if path.endswith(".csv"):
+                writer = csv.writer(snapshotFile)
+                writer.writerow(("statistic","key","value"))
+                writer.writerows(self.csvRows())
+            else:
+                json.dump(self.snapshot(),snapshotFile,indent=2)
+        os.replace(temporaryPath,path)
+
+def aggregateHeadlessGames(seeds,backend="dict",strategy="hunt",rows=10,columns=10,fleet=None,alternateFirst=False):
+    """
+    aggregateHeadlessGames() plays a chunk of games inside one worker process and folds them into a gameStatistics.
+    :param seeds: List of integer seeds, one per game.
+    :param backend: String key into simulation.BACKENDS.
+    :param strategy: String key into simulation.STRATEGIES.
+    :param rows: Integer number of gameboard rows.
+    :param columns: Integer number of gameboard columns.
+    :param fleet: List of ship sizes, defaults to battleship.defaultFleet.
+    :param alternateFirst: Boolean, games with an odd seed start with player two.
+    :return: gameStatistics instance for the chunk.
+    """
+    statistics = gameStatistics(rows,columns)
+    for seed in seeds:
+        firstPlayer = 2 if alternateFirst and seed % 2 else 1
+        statistics.addGame(simulation.playHeadlessGame(seed,backend,strategy,True,rows,columns,fleet,firstPlayer))
+    return statistics
+
+def seedChunks(games,seed,chunkSize):
+    """
+    seedChunks() yields the same per-game seeds as simulation.gameSeeds(), a chunk at a time, without holding them all.
+    :param games: Integer number of games.
+    :param seed: Integer base seed.
+    :param chunkSize: Integer number of seeds per chunk.
+    :return: Generator of lists of integer seeds.
+    """
+    seedGenerator = random.Random(seed)
+    for start in range(0,games,chunkSize):
+        yield [seedGenerator.getrandbits(64) for i in range(min(chunkSize,games-start))]
+
+def streamGames(games,workers=None,seed=0,chunkSize=1000,backend="dict",strategy="hunt",rows=10,columns=10,fleet=None,
+                alternateFirst=False,output=None,flushSeconds=5.0):
+    """
+    streamGames() plays games over a process pool and merges each worker's partial aggregate as it arrives.  At most two
+    chunks per worker are in flight, so memory doesn't grow with the number of games.
+    :param games: Integer number of games to play.
+    :param workers: Integer number of worker processes.  Defaults to the CPU count; 1 plays every game in this process.
+    :param seed: Integer base seed.  The totals are the same for any worker count or chunk size.
+    :param chunkSize: Integer number of games handed to a worker at once.
+    :param backend: String key into simulation.BACKENDS.
+    :param strategy: String key into simulation.STRATEGIES.
+    :param rows: Integer number of gameboard rows.
+    :param columns: Integer number of gameboard columns.
+    :param fleet: List of ship sizes, defaults to battleship.defaultFleet.
+    :param alternateFirst: Boolean, games with an odd seed start with player two.
+    :param output: String path a snapshot is written to every flushSeconds and at the end, or None.
+    :param flushSeconds: Float seconds between snapshots.
+    :return: gameStatistics instance with every game.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    totals = gameStatistics(rows,columns)
+    lastFlush = time.perf_counter()
+    chunks = seedChunks(games,seed,chunkSize)
+    options = (backend,strategy,rows,columns,fleet,alternateFirst)
+
+    def fold(partial):
+        nonlocal lastFlush
+        totals.merge(partial)
+        if output and time.perf_counter()-lastFlush >= flushSeconds:
+            totals.writeSnapshot(output)
+            lastFlush = time.perf_counter()
+
+    if workers <= 1:
+        for chunk in chunks:
+            fold(aggregateHeadlessGames(chunk,*options))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = set()
+            for chunk in chunks:
+                pending.add(executor.submit(aggregateHeadlessGames,chunk,*options))
+                if len(pending) >= 2*workers:
+                    done,pending = wait(pending,return_when=FIRST_COMPLETED)
+                    for future in done:
+                        fold(future.result())
+            for future in pending:
+                fold(future.result())
+    if output:
+        totals.writeSnapshot(output)
+    return totals
+
+def aggregateFile(path,rows=10,columns=10,output=None,flushSeconds=5.0):
+    """
+    aggregateFile() folds the game results in a simulation.py --output file into a gameStatistics, one line at a time.
+    :param path: String path to a JSON lines file of game results.
+    :param rows: Integer number of gameboard rows the games were played on.
+    :param columns: Integer number of gameboard columns.
+    :param output: String path a snapshot is written to every flushSeconds and at the end, or None.
+    :param flushSeconds: Float seconds between snapshots.
+    :return: gameStatistics instance.
+    """
+    totals = gameStatistics(rows,columns)
+    lastFlush = time.perf_counter()
+    with open(path) as resultFile:
+        for line in resultFile:
+            if line.strip():
+                totals.addGame(json.loads(line))
+                if output and time.perf_counter()-lastFlush >= flushSeconds:
+                    totals.writeSnapshot(output)
+                    lastFlush = time.perf_counter()
+    if output:
+        totals.writeSnapshot(output)
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description="Play headless games and keep streaming statistics.")
+    parser.add_argument("--games",type=int,default=10000,help="number of games to play")
+    parser.add_argument("--workers",type=int,default=None,help="worker processes (default: CPU count)")
+    parser.add_argument("--seed",type=int,default=0,help="base seed, the same as simulation.py's")
+    parser.add_argument("--chunk",type=int,default=1000,help="games per worker task")
+    parser.add_argument("--backend",choices=sorted(simulation.BACKENDS),default="dict",help="Gameboard implementation")
+    parser.add_argument("--strategy",choices=sorted(simulation.STRATEGIES),default="hunt",help="NPC targeting strategy")
+    parser.add_argument("--rows",type=int,default=10,help="gameboard rows")
+    parser.add_argument("--columns",type=int,default=10,help="gameboard columns")
+    parser.add_argument("--fleet",type=battleship.parseFleet,default=None,help="ship sizes, e.g. 5,4,3*2,2*4")
+    parser.add_argument("--alternate-first",action="store_true",help="games with an odd seed start with player two")
+    parser.add_argument("--input",default=None,help="aggregate this simulation.py --output file instead of playing games")
+    parser.add_argument("--output",default=None,help="snapshot file, CSV if it ends in .csv and JSON otherwise")
+    parser.add_argument("--flush-seconds",type=float,default=5.0,help="seconds between snapshots")
+    args = parser.parse_args()
+    if (args.rows,args.columns) != (10,10) and args.strategy not in simulation.SCALABLE_STRATEGIES:
+        parser.error("only "+", ".join(sorted(simulation.SCALABLE_STRATEGIES))+" can play on gameboards other than 10x10")
+
+    start = time.perf_counter()
+    if args.input:
+        totals = aggregateFile(args.input,args.rows,args.columns,args.output,args.flush_seconds)
+    else:
+        totals = streamGames(args.games,args.workers,args.seed,args.chunk,args.backend,args.strategy,args.rows,
+                             args.columns,args.fleet,args.alternate_first,args.output,args.flush_seconds)
+    elapsed = time.perf_counter()-start
+    summary = totals.snapshot()
+    del summary["heatMap"],summary["shotsToWin"]["histogram"]
+    summary["seconds"] = round(elapsed,3)
+    summary["gamesPerSecond"] = round(totals.games/elapsed,1) if elapsed > 0 else None
+    print(json.dumps(summary,indent=2))
+
+if __name__ == '__main__':
+    main()
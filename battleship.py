@@ -3,7 +3,176 @@ Ethan Wong
 Spring 2022
 battleship.py
 """
+import argparse
+import json
 import random
+import sys
+from array import array
+from collections import deque
+from string import ascii_letters
+
+import instrumentation
+import playerinput
+import renderer
+
+# Lines framing both grids printed by Gameboard.printGameboard().
+boardSeparator = "==============================================================="
+boardHeader = "     1     2     3     4     5     6     7     8     9     10"
+
+# Gameboards larger than this are drawn one page of at most pageRows x pageColumns cells at a time.
+pageRows = 20
+pageColumns = 20
+# Gameboards with at most this many cells get their cell tables built up front.  Larger ones compute entries on demand.
+denseCells = 10000
+
+def rowLabel(row):
+    """
+    rowLabel() names a row the way spreadsheets name columns: A-Z, then AA, AB and so on.
+    :param row: Integer row index from 0.
+    :return: String row label.
+    """
+    label = ""
+    row += 1
+    while row > 0:
+        row,letter = divmod(row-1,26)
+        label = chr(letter+65)+label
+    return label
+
+def rowIndex(label):
+    """
+    rowIndex() converts a row label from rowLabel() back into a row index.
+    :param label: String of upper case letters.
+    :return: Integer row index from 0.
+    """
+    row = 0
+    for letter in label:
+        row = row*26+ord(letter)-64
+    return row-1
+
+class cellTable:
+    """
+    cellTable class stands in for a list of cell table entries on gameboards too large to tabulate.  Each entry is
+    computed when it's looked up, so nothing proportional to the gameboard's area is stored.
+    """
+    def __init__(self,cells,entry):
+        self.cells = cells
+        self.entry = entry
+
+    def __getitem__(self,cell):
+        return self.entry(cell)
+
+    def __len__(self):
+        return self.cells
+
+class boardGeometry:
+    """
+    boardGeometry class describes the size of a gameboard and holds its cell tables.  Cell indices number the gameboard
+    row by row (cell = row*columns+column).  The NPC and simulation code works with cell indices and these tables, so
+    strings are only parsed or built where a human types or reads a coordinate.
+    """
+    def __init__(self,rows,columns):
+        if rows < 1 or columns < 1:
+            raise ValueError("a gameboard needs at least one row and one column")
+        self.rows = rows
+        self.columns = columns
+        self.cells = rows*columns
+        if self.cells <= denseCells:
+            table = lambda entry: [entry(cell) for cell in range(self.cells)]
+        else:
+            table = lambda entry: cellTable(self.cells,entry)
+        # cellCoordinates[cell] is the numeric coordinate tuple used as a Gameboard key.
+        self.cellCoordinates = table(self.coordinate)
+        # cellLabels[cell] is the gameboard coordinate string, e.g. "A1".
+        self.cellLabels = table(self.label)
+        # cellRays[direction][cell] is the next cell in that direction, or None past the edge of the gameboard.
+        self.cellRays = {direction:table(lambda cell,direction=direction: self.ray(direction,cell)) for direction in "NSWE"}
+        # cellNeighbors[cell] lists the (direction, cell) pairs adjacent to a cell in the order N, S, W, E.
+        self.cellNeighbors = table(self.neighbors)
+        # cellIndices maps a coordinate tuple back to its cell, see coordinateCells().
+        self.cellIndices = None
+
+    def coordinateCells(self,coordinates):
+        """
+        Convert coordinate tuples into cell indices, checking each is on the gameboard.  Gameboards up to denseCells
+        cells look every coordinate up in a table built on first use.
+        :param coordinates: Iterable of tuples of row and column indices.
+        :return: List of integer cell indices.
+        """
+        if self.cells <= denseCells:
+            if self.cellIndices is None:
+                self.cellIndices = {coordinate:cell for cell,coordinate in enumerate(self.cellCoordinates)}
+            try:
+                return [self.cellIndices[coordinate] for coordinate in coordinates]
+            except KeyError as error:
+                raise ValueError("coordinate "+str(error.args[0])+" is off the gameboard")
+        cells = []
+        for row,column in coordinates:
+            if not (0 <= row < self.rows and 0 <= column < self.columns):
+                raise ValueError("coordinate "+str((row,column))+" is off the gameboard")
+            cells.append(row*self.columns+column)
+        return cells
+
+    def coordinate(self,cell):
+        return divmod(cell,self.columns)
+
+    def label(self,cell):
+        row,column = divmod(cell,self.columns)
+        return rowLabel(row)+str(column+1)
+
+    def ray(self,direction,cell):
+        row,column = divmod(cell,self.columns)
+        if direction == "N":
+            return cell-self.columns if row > 0 else None
+        if direction == "S":
+            return cell+self.columns if row < self.rows-1 else None
+        if direction == "W":
+            return cell-1 if column > 0 else None
+        return cell+1 if column < self.columns-1 else None
+
+    def neighbors(self,cell):
+        return tuple((direction,neighbor) for direction,neighbor in ((direction,self.ray(direction,cell)) for direction in "NSWE")
+                     if neighbor is not None)
+
+# Every boardGeometry built so far, keyed by (rows, columns).
+geometries = {}
+
+def gameboardGeometry(rows,columns):
+    """
+    gameboardGeometry() looks up the boardGeometry for a gameboard size, building it the first time.
+    :param rows: Integer number of rows.
+    :param columns: Integer number of columns.
+    :return: boardGeometry instance.
+    """
+    geometry = geometries.get((rows,columns))
+    if geometry is None:
+        geometry = geometries[(rows,columns)] = boardGeometry(rows,columns)
+    return geometry
+
+# The standard 10x10 gameboard.  Its tables are also available at module level since most code only deals with it.
+standardGeometry = gameboardGeometry(10,10)
+cellCoordinates = standardGeometry.cellCoordinates
+cellLabels = standardGeometry.cellLabels
+cellRays = standardGeometry.cellRays
+cellNeighbors = standardGeometry.cellNeighbors
+
+def numCoordToCell(numCoord):
+    """
+    numCoordToCell() converts a numeric coordinate into a cell index.
+    :param numCoord: Tuple of indices from 0-9.
+    :return: Integer cell index from 0-99.
+    """
+    return numCoord[0]*10+numCoord[1]
+
+def boardCoordToCell(boardCoord):
+    """
+    boardCoordToCell() converts a gameboard coordinate string into a cell index.
+    :param boardCoord: String representing the gameboard coordinate.
+    :return: Integer cell index from 0-99 if valid, None otherwise.
+    """
+    numCoord = validCoordinate(boardCoord)
+    if numCoord:
+        return numCoord[0]*10+numCoord[1]
+    return None
 
 def boardCoordToNumCoord(boardCoord):
     """
@@ -17,31 +186,192 @@ def boardCoordToNumCoord(boardCoord):
 
 class Ship:
     """
-    Ship class represents a ship with data on the size and locations on the gameboard the ship occupies.
+    Ship class represents a ship with data on its size and how many of its tiles have been struck.
     """
+    __slots__ = ("size","hits")
+
     def __init__(self,size):
         # Size represents not only the number of tiles occupied, but the ship type as each type has a unique size.
         self.size = size
         """
-        Locations set represents the coordinates occupied by the ship.  This set is also used to determine if the ship
-        has been hit by the opponent.  Gameboard.board only stores opponent misses and coordinates with ships on them.  
-        If a ship coordinate is present in Gameboard.board but not Ship.locations, that means it has been struck.  When
-        locations is empty, the ship has sunk.
+        Hits counts the ship's tiles struck by the opponent.  Which tiles the ship occupies and which of those have been
+        struck are kept in Gameboard.cells.  When hits reaches size, the ship has sunk.
         """
-        self.locations = set()
+        self.hits = 0
+
+    def copy(self):
+        """
+        Copy this ship, including how many of its tiles have been struck.
+        :return: Ship instance.
+        """
+        newShip = Ship(self.size)
+        newShip.hits = self.hits
+        return newShip
+
+class volleyResult:
+    """
+    volleyResult class holds the outcome of a salvo resolved by Gameboard.fireVolley(): one result per distinct target,
+    in the order the targets were given, and the totals over the whole salvo.  Targets are kept as cell indices and
+    only turned into coordinates when asked for.
+    """
+    __slots__ = ("geometry","cells","results","hits","repeats","sunk")
+
+    def __init__(self,geometry,cells,results,hits,repeats,sunk):
+        """
+        :param geometry: boardGeometry of the gameboard fired at.
+        :param cells: List of the distinct cell indices fired at.
+        :param results: List of Gameboard.fireAtTarget() results, one per cell.
+        :param hits: Integer number of shots that struck a ship, sinking shots included.
+        :param repeats: Integer number of shots at cells fired at on an earlier turn.
+        :param sunk: List of the sizes of the ships the salvo sank.
+        """
+        self.geometry = geometry
+        self.cells = cells
+        self.results = results
+        self.hits = hits
+        self.repeats = repeats
+        self.sunk = sunk
+
+    @property
+    def targets(self):
+        return [self.geometry.cellCoordinates[cell] for cell in self.cells]
+
+    @property
+    def misses(self):
+        return len(self.results)-self.hits-self.repeats
+
+    def __iter__(self):
+        return zip(self.targets,self.results)
+
+class sparseCells(dict):
+    """
+    sparseCells class stands in for Gameboard.cells on gameboards too large to tabulate.  Only cells that aren't empty
+    are stored, and every other cell reads as 0.
+    """
+    __slots__ = ()
+
+    def __missing__(self,cell):
+        return 0
+
+class cellMap:
+    """
+    cellMap class is a dictionary-like map from coordinates to "O" (miss) or "X" (hit) that stores one byte per cell of
+    the gameboard instead of a dictionary entry per coordinate.  Coordinates must be on the gameboard.
+    """
+    __slots__ = ("columns","cells")
+    # Value stored for each byte, 0 meaning the coordinate isn't in the map.
+    values = (None,"O","X")
+
+    def __init__(self,geometry):
+        """
+        :param geometry: boardGeometry of the gameboard the coordinates are on.
+        """
+        self.columns = geometry.columns
+        self.cells = bytearray(geometry.cells)
+
+    def __contains__(self,coordinate):
+        return self.cells[coordinate[0]*self.columns+coordinate[1]] != 0
+
+    def __getitem__(self,coordinate):
+        value = self.cells[coordinate[0]*self.columns+coordinate[1]]
+        if not value:
+            raise KeyError(coordinate)
+        return cellMap.values[value]
+
+    def __setitem__(self,coordinate,value):
+        self.cells[coordinate[0]*self.columns+coordinate[1]] = 1 if value == "O" else 2
+
+    def get(self,coordinate,default=None):
+        value = self.cells[coordinate[0]*self.columns+coordinate[1]]
+        return cellMap.values[value] if value else default
+
+    def __len__(self):
+        return len(self.cells)-bytes(self.cells).count(0)
+
+    def __iter__(self):
+        return (divmod(cell,self.columns) for cell,value in enumerate(self.cells) if value)
+
+    def items(self):
+        return ((divmod(cell,self.columns),cellMap.values[value]) for cell,value in enumerate(self.cells) if value)
+
+    def copy(self):
+        newMap = object.__new__(cellMap)
+        newMap.columns = self.columns
+        newMap.cells = bytearray(self.cells)
+        return newMap
+
+def firedOnMap(geometry):
+    """
+    firedOnMap() creates an empty firedOn map for shots at a gameboard of the given size: a cellMap, or a dictionary on
+    gameboards too large to tabulate.
+    :param geometry: boardGeometry of the gameboard being fired at.
+    :return: cellMap instance or dictionary.
+    """
+    if geometry.cells > denseCells:
+        return {}
+    return cellMap(geometry)
+
+# Attribute names declared in __slots__ by each class and its bases, see copyState().
+slotNames = {}
+
+def copyState(source,target):
+    """
+    copyState() points every attribute of target at the same object as the attribute of source, for classes that keep
+    their attributes in __slots__ instead of a __dict__.
+    :param source: Instance to copy from.
+    :param target: Instance of the same class to copy to.
+    :return: None.
+    """
+    names = slotNames.get(source.__class__)
+    if names is None:
+        names = slotNames[source.__class__] = tuple(name for cls in source.__class__.__mro__
+                                                    for name in cls.__dict__.get("__slots__",()))
+    for name in names:
+        try:
+            setattr(target,name,getattr(source,name))
+        except AttributeError:
+            pass
+    if hasattr(source,"__dict__"):
+        target.__dict__.update(source.__dict__)
 
 class Gameboard:
     """
-    Gameboard class holds all of the data for a player's gameboard.
+    Gameboard class holds all of the data for a player's gameboard.  Each cell takes a byte on gameboards up to
+    denseCells cells.  Larger gameboards only store ships and shots, so memory and the cost of a shot don't depend on
+    the size of the gameboard.
     """
-    def __init__(self,player):
+    __slots__ = ("player","rows","columns","geometry","fleet","cells","ships","firedOn","remainingShips","sharedBoard",
+                 "sharedFiredOn")
+
+    def __init__(self,player,rows=10,columns=10,fleet=None):
+        """
+        :param player: Player name.
+        :param rows: Integer number of rows.
+        :param columns: Integer number of columns.
+        :param fleet: List of ship sizes in this gameboard's fleet, defaults to defaultFleet.
+        """
         # Player name.
         self.player = player
-        # Board represent's your gameboard.  The only things stored are opponent misses and coordinates with Ship objects on them.
-        self.board = {}
+        self.rows = rows
+        self.columns = columns
+        self.geometry = gameboardGeometry(rows,columns)
+        self.fleet = tuple(defaultFleet if fleet is None else fleet)
+        """
+        Cells holds your gameboard, indexed by cell (row*columns+column).  0 is an empty cell, 1 an opponent miss,
+        2n+2 a tile of ship n and 2n+3 a tile of ship n that has been struck.  The codes fit a bytearray until the
+        fleet grows past 126 ships, when addShip() widens it to two bytes per cell.
+        """
+        self.cells = bytearray(self.geometry.cells) if self.geometry.cells <= denseCells else sparseCells()
+        # Ship instances in the order they were added, so ships[n] is ship n.
+        self.ships = []
         # firedOn represent's your actions on your opponent's gameboard.  Only hits ('X') and misses ('O') are kept track of.
-        self.firedOn = {}
-        self.remainingShips = 7
+        self.firedOn = firedOnMap(self.geometry)
+        # Ships placed and still afloat.  addShip() counts each ship in, so a board is only "sunk" once it has ships.
+        self.remainingShips = 0
+        # Set while cells and ships or firedOn may be shared with a fork.  Whoever changes a shared structure first
+        # copies it for themselves, see fork().
+        self.sharedBoard = False
+        self.sharedFiredOn = False
 
     def validShipLocation(self,listOfCoordinates):
         """
@@ -49,8 +379,8 @@ class Gameboard:
         :param listOfCoordinates: List of potential coordinates for a new ship.
         :return: True if we can place the ship, false otherwise (coordinate is occupied by another ship).
         """
-        for i in listOfCoordinates:
-            if i in self.board:
+        for row,column in listOfCoordinates:
+            if self.cells[row*self.columns+column]:
                 return False
         return True
 
@@ -60,13 +390,19 @@ class Gameboard:
         :param listOfCoordinates: List of coordinates for the new ship.
         :return: True if successful, false otherwise.
         """
-        newShip = Ship(len(listOfCoordinates))
         # If the ship can be added without overlapping with an existing ship...
         if self.validShipLocation(listOfCoordinates):
-            for i in listOfCoordinates:
-                # (0-9,0-9) -> Ship()
-                self.board[i] = newShip
-                newShip.locations.add(i)
+            if self.sharedBoard:
+                self.ownBoard()
+            code = 2*len(self.ships)+2
+            # The struck code, code+1, no longer fits in a byte.  array() would read a bytearray as raw bytes, so the
+            # codes are passed as a list.
+            if code > 254 and isinstance(self.cells,bytearray):
+                self.cells = array("H",list(self.cells))
+            for row,column in listOfCoordinates:
+                self.cells[row*self.columns+column] = code
+            self.ships.append(Ship(len(listOfCoordinates)))
+            self.remainingShips += 1
             return True
         else:
             return False
@@ -74,66 +410,263 @@ class Gameboard:
     def fireAtTarget(self,target):
         """
         Handles actions by your opponent on your gameboard.  Target represents the coordinate they want to fire at.
-        :param target: Coordinate representing the target.  Tuple of indices from 0-9.
+        :param target: Coordinate representing the target.  Tuple of row and column indices.
         :return: String representing the result of the action or an integer representing the ship's size if it sank.
         "Hit" if it hit ia ship, "Miss" if it didn't hit a ship, or "Repeat" if the user has already fired at this spot.
         """
-        # If the target is in the board, then it's either a ship or an 'O' from a previous miss.
-        if target in self.board:
-            if isinstance(self.board[target],Ship):
-                # If the target is in the Ship instance's set, then it's a hit.
-                if target in self.board[target].locations:
-                    self.board[target].locations.remove(target)
-                    # If the set is empty, we just sank the ship!
-                    if len(self.board[target].locations) == 0:
-                        self.remainingShips -=1
-                        return self.board[target].size
-                    return "Hit"
-                else:
-                    return "Repeat"
+        cell = target[0]*self.columns+target[1]
+        code = self.cells[cell]
+        # Odd codes are a previous miss or a struck ship tile.
+        if code & 1:
+            return "Repeat"
+        if self.sharedBoard:
+            self.ownBoard()
+        if code == 0:
+            self.cells[cell] = 1
+            return "Miss"
+        self.cells[cell] = code+1
+        ship = self.ships[(code-2) >> 1]
+        ship.hits += 1
+        # If every tile has been struck, we just sank the ship!
+        if ship.hits == ship.size:
+            self.remainingShips -=1
+            return ship.size
+        return "Hit"
+
+    def checkVolley(self,cells):
+        """
+        Check every cell of a salvo is on the gameboard.
+        :param cells: List of integer cell indices.
+        :return: None.
+        """
+        if cells and (min(cells) < 0 or max(cells) >= self.geometry.cells):
+            raise ValueError("cell "+str(min(cells) if min(cells) < 0 else max(cells))+" is off the gameboard")
+
+    def fireVolley(self,targets):
+        """
+        Handles a salvo by your opponent: every target is resolved in one pass, as if fireAtTarget() was called on each
+        distinct target in turn.  The targets are all checked before any is fired at, so an invalid salvo changes nothing.
+        :param targets: Iterable of coordinates.  Tuples of row and column indices.
+        :return: volleyResult instance.
+        """
+        return self.fireCells(self.geometry.coordinateCells(targets))
+
+    def fireCells(self,cells):
+        """
+        fireVolley() for targets given as cell indices, which is how NPCs pick them.
+        :param cells: List of integer cell indices.
+        :return: volleyResult instance.
+        """
+        self.checkVolley(cells)
+        if self.sharedBoard:
+            self.ownBoard()
+        board = self.cells
+        ships = self.ships
+        # Distinct cells in the order given, and their results.
+        fired = []
+        results = []
+        hits = 0
+        repeats = 0
+        sunk = []
+        for cell in cells:
+            code = board[cell]
+            if code & 1:
+                # A cell listed twice in this salvo reads as fired at by then.  Those are dropped, so the membership
+                # test is only paid for on repeats.
+                if cell in fired:
+                    continue
+                results.append("Repeat")
+                repeats += 1
+            elif code == 0:
+                board[cell] = 1
+                results.append("Miss")
             else:
-                return "Repeat"
+                board[cell] = code+1
+                hits += 1
+                ship = ships[(code-2) >> 1]
+                ship.hits += 1
+                if ship.hits == ship.size:
+                    sunk.append(ship.size)
+                    results.append(ship.size)
+                else:
+                    results.append("Hit")
+            fired.append(cell)
+        self.remainingShips -= len(sunk)
+        return volleyResult(self.geometry,fired,results,hits,repeats,sunk)
+
+    def recordVolley(self,volley):
+        """
+        Record the results of your salvo at the opponent on firedOn.
+        :param volley: volleyResult from the opponent's Gameboard.fireVolley().
+        :return: None.
+        """
+        if self.sharedFiredOn:
+            self.firedOn = self.firedOn.copy()
+            self.sharedFiredOn = False
+        if isinstance(self.firedOn,cellMap):
+            # Write cellMap's codes straight into its bytes rather than going through __setitem__ per shot.
+            marks = self.firedOn.cells
+            for cell,result in zip(volley.cells,volley.results):
+                if result != "Repeat":
+                    marks[cell] = 1 if result == "Miss" else 2
         else:
-            self.board[target] = " O "
-            return "Miss"
+            for target,result in volley:
+                if result != "Repeat":
+                    self.firedOn[target] = "O" if result == "Miss" else "X"
 
-    def printGameboard(self):
+    def recordShot(self,target,result):
         """
-        Print the current gameboard.
+        Record the result of your shot at the opponent on firedOn.
+        :param target: Coordinate fired at.  Tuple of row and column indices.
+        :param result: Result from the opponent's Gameboard.fireAtTarget().
         :return: None.
         """
-        print("Player "+str(self.player)+"'s Gameboard")
-        print("===============================================================")
-        print("     1     2     3     4     5     6     7     8     9     10")
-        for row in range(10):
-            for column in range(10):
-                if column == 0:
-                    print(chr(row+65),end=" |")
-                getFiredOnContents = self.firedOn.get((row,column)," ")
-                print(" {} |".format(" "+getFiredOnContents+" "),end="")
-            print()
-        print("===============================================================")
-        print("     1     2     3     4     5     6     7     8     9     10")
-        for row in range(10):
-            for column in range(10):
-                if column == 0:
-                    print(chr(row+65),end=" |")
-                getBoardContents = self.board.get((row,column),"   ")
-                if isinstance(getBoardContents,Ship):
-                    if (row,column) in getBoardContents.locations:
-                        getBoardContents = "[ ]"
-                    else:
-                        getBoardContents = "[#]"
-                print(" {} |".format(getBoardContents),end="")
-            print()
-        print()
+        if result == "Repeat":
+            return
+        if self.sharedFiredOn:
+            self.firedOn = self.firedOn.copy()
+            self.sharedFiredOn = False
+        self.firedOn[target] = "O" if result == "Miss" else "X"
+
+    def fork(self):
+        """
+        Make an independent copy of this gameboard in constant time.  The copy shares cells, ships and firedOn with this
+        gameboard until either of them changes one of those, at which point only the one making the change copies it.
+        :return: Gameboard instance of the same class.
+        """
+        clone = object.__new__(self.__class__)
+        copyState(self,clone)
+        self.sharedBoard = self.sharedFiredOn = True
+        clone.sharedBoard = clone.sharedFiredOn = True
+        return clone
+
+    def snapshot(self):
+        """
+        Capture the current state so it can be brought back with restore().  The snapshot is a fork and shouldn't be
+        changed.
+        :return: Gameboard instance of the same class.
+        """
+        return self.fork()
+
+    def restore(self,snapshot):
+        """
+        Return to the state captured by snapshot().  Like fork(), this takes constant time.
+        :param snapshot: Gameboard returned by snapshot() on this gameboard.
+        :return: None.
+        """
+        copyState(snapshot,self)
+        self.sharedBoard = self.sharedFiredOn = True
+        snapshot.sharedBoard = snapshot.sharedFiredOn = True
+
+    def ownBoard(self):
+        """
+        Give this gameboard its own copy of cells and ships before changing them.
+        :return: None.
+        """
+        if isinstance(self.cells,dict):
+            self.cells = sparseCells(self.cells)
+        elif isinstance(self.cells,memoryview):
+            # Cells in a shared buffer, see sharedstate.py.  The copy is private to this gameboard.
+            self.cells = bytearray(self.cells)
+        else:
+            self.cells = self.cells[:]
+        self.ships = [ship.copy() for ship in self.ships]
+        self.sharedBoard = False
+
+    def shipLayout(self):
+        """
+        Identify the coordinates of every ship on the gameboard, hit or not.
+        :return: List of coordinate lists, one per ship in the order they were added.
+        """
+        layout = [[] for ship in self.ships]
+        cells = sorted(self.cells.items()) if isinstance(self.cells,dict) else enumerate(self.cells)
+        for cell,code in cells:
+            if code > 1:
+                layout[(code-2) >> 1].append(divmod(cell,self.columns))
+        return layout
+
+    @instrumentation.phase("render")
+    def printGameboard(self,page=0):
+        """
+        Print the current gameboard.  The whole frame is built first and written with a single call.
+        :param page: Integer page to print on gameboards larger than one page.  See renderGameboard().
+        :return: None.
+        """
+        sys.stdout.write(self.renderGameboard(page))
+
+    def pageCount(self):
+        """
+        Count the pages renderGameboard() splits this gameboard into.
+        :return: Integer number of pages, 1 for gameboards up to pageRows x pageColumns.
+        """
+        return -(-self.rows//pageRows)*-(-self.columns//pageColumns)
+
+    def renderGameboard(self,page=0):
+        """
+        Build the text printed by printGameboard(): your shots at the opponent on top and your own gameboard below.
+        Gameboards larger than pageRows x pageColumns are split into pages, numbered left to right and then top to
+        bottom, and only the requested page is built.
+        :param page: Integer page number from 0.
+        :return: String holding the whole frame.
+        """
+        if not 0 <= page < self.pageCount():
+            raise ValueError("page "+str(page)+" is out of range, this gameboard has "+str(self.pageCount())+" pages")
+        pagesAcross = -(-self.columns//pageColumns)
+        firstRow = page//pagesAcross*pageRows
+        firstColumn = page%pagesAcross*pageColumns
+        rows = range(firstRow,min(firstRow+pageRows,self.rows))
+        columns = range(firstColumn,min(firstColumn+pageColumns,self.columns))
+        labelWidth = len(rowLabel(self.rows-1))
+        if labelWidth == 1 and len(columns) == 10:
+            separator = boardSeparator
+            header = boardHeader
+        else:
+            separator = "="*(labelWidth+2+6*len(columns))
+            header = " "*(labelWidth-1)+"".join(str(column+1).rjust(6) for column in columns)
+        title = "Player "+str(self.player)+"'s Gameboard"
+        if self.pageCount() > 1:
+            title += " (page "+str(page+1)+" of "+str(self.pageCount())+": rows "+rowLabel(rows[0])+"-"+rowLabel(rows[-1])+\
+                     ", columns "+str(columns[0]+1)+"-"+str(columns[-1]+1)+")"
+        labels = [rowLabel(row).ljust(labelWidth) for row in rows]
+        lines = [title,separator,header]
+        for label,row in zip(labels,rows):
+            lines.append(label+" |"+"".join(" "+self.firedOnSymbol((row,column))+" |" for column in columns))
+        lines.append(separator)
+        lines.append(header)
+        for label,row in zip(labels,rows):
+            lines.append(label+" |"+"".join(" "+self.boardSymbol((row,column))+" |" for column in columns))
+        lines.append("")
+        return "\n".join(lines)+"\n"
+
+    def firedOnSymbol(self,coordinate):
+        """
+        Identify how a coordinate you've fired at should be displayed.
+        :param coordinate: Tuple of row and column indices.
+        :return: String representing the coordinate.  " X " for a hit, " O " for a miss, or blank.
+        """
+        return " "+self.firedOn.get(coordinate," ")+" "
+
+    def boardSymbol(self,coordinate):
+        """
+        Identify how a coordinate on your own gameboard should be displayed.
+        :param coordinate: Tuple of row and column indices.
+        :return: String representing the coordinate.  "[ ]" for an intact ship, "[#]" for a struck ship, " O " for an
+        opponent miss, or blank.
+        """
+        code = self.cells[coordinate[0]*self.columns+coordinate[1]]
+        if code > 1:
+            return "[#]" if code & 1 else "[ ]"
+        return " O " if code else "   "
 
 class autoCoordinate:
     """
     autoCoordinate class represents a coordinate and is only used whenever the player is an NPC.  This is used when we
     queue additional coordinate to search for another hit.
     """
+    __slots__ = ("coordinate","direction")
+
     def __init__(self,coordinate):
+        # Integer cell index.
         self.coordinate = coordinate
         """
         Direction represents where this coordinate is relative to the previous coordinate.  This is used to identify the
@@ -142,25 +675,14 @@ class autoCoordinate:
         """
         self.direction = None
 
-    def identifyNextCoordinate(self):
+    def identifyNextCoordinate(self,rays=cellRays):
         """
         Identify the next coordinate based on this coordinate.
-        :return: Coordinate representing the next coordinate in the same direction as this coordinate.
-        """
-        value = boardCoordToNumCoord(self.coordinate)
-        if self.direction == "N":
-            nextCoordinate = (value[0]-1,value[1])
-        elif self.direction == "E":
-            nextCoordinate = (value[0],value[1]+1)
-        elif self.direction == "S":
-            nextCoordinate = (value[0]+1,value[1])
-        elif self.direction == "W":
-            nextCoordinate = (value[0],value[1]-1)
-
-        # If the new coordinate is within the limits of the gameboard, return it.
-        if (nextCoordinate[0] >= 0 and nextCoordinate[0] <= 9) and (nextCoordinate[1] >= 0 and nextCoordinate[1] <= 9):
-            return chr(nextCoordinate[0]+65)+str(nextCoordinate[1]+1)
-        return False
+        :param rays: cellRays table of the gameboard's boardGeometry, defaults to the standard gameboard's.
+        :return: Cell index of the next coordinate in the same direction as this coordinate, or None if it would be off
+        the gameboard.
+        """
+        return rays[self.direction][self.coordinate]
 
 class simulatedQueue:
     """
@@ -168,7 +690,8 @@ class simulatedQueue:
     to search for hits.  Used only in games involving NPC.
     """
     def __init__(self):
-        self.queue = []
+        # A deque pops from the front in constant time, unlike list.pop(0).
+        self.queue = deque()
 
     def enqueue(self,value):
         """
@@ -183,22 +706,179 @@ class simulatedQueue:
         Remove the first value in the queue at the front.
         :return: First value in the queue.
         """
-        return self.queue.pop(0)
+        return self.queue.popleft()
+
+    def __len__(self):
+        return len(self.queue)
+
+class targetFrontier:
+    """
+    targetFrontier class tracks an NPC's remaining targets.  Cells it hasn't fired at yet are kept in a swap-remove pool
+    so a random untargeted cell is picked in constant time however far the game has gone, and queued autoCoordinate
+    entries are kept in a deque that never holds the same cell twice or a cell that was already fired at.
+    """
+    __slots__ = ("geometry","pool","position","queue","queued","rng")
+
+    def __init__(self,geometry=None,rng=None):
+        """
+        :param geometry: boardGeometry of the gameboard being fired at, defaults to the standard gameboard.
+        :param rng: random.Random instance the random picks are drawn from, defaults to the random module.
+        """
+        self.geometry = geometry or standardGeometry
+        self.rng = random if rng is None else rng
+        # pool holds every cell not fired at yet in no particular order.  position[cell] is its index in pool, or -1
+        # once it has been removed.  Both are arrays of machine integers, two bytes each where the cell indices fit.
+        typecode = "h" if self.geometry.cells <= 32767 else "i"
+        self.pool = array(typecode,range(self.geometry.cells))
+        self.position = array(typecode,range(self.geometry.cells))
+        self.queue = deque()
+        # Cells currently waiting in the queue.
+        self.queued = set()
+
+    def __contains__(self,cell):
+        return self.position[cell] >= 0
+
+    def remove(self,cell):
+        """
+        Remove a cell from the pool by moving the last cell into its slot.
+        :param cell: Integer cell index.
+        :return: None.
+        """
+        index = self.position[cell]
+        if index >= 0:
+            last = self.pool.pop()
+            if last != cell:
+                self.pool[index] = last
+                self.position[last] = index
+            self.position[cell] = -1
+
+    def randomCell(self):
+        """
+        Pick a random cell that hasn't been fired at.
+        :return: Integer cell index.
+        """
+        return self.pool[self.rng.randrange(len(self.pool))]
+
+    def poolSize(self):
+        """
+        Count the cells that haven't been fired at.
+        :return: Integer number of cells.
+        """
+        return len(self.pool)
+
+    def enqueue(self,value):
+        """
+        Add an autoCoordinate to the end of the queue unless its cell is already queued or was already fired at.
+        :param value: autoCoordinate instance.
+        :return: None.
+        """
+        if self.position[value.coordinate] >= 0 and value.coordinate not in self.queued:
+            self.queued.add(value.coordinate)
+            self.queue.append(value)
+        elif instrumentation.enabled:
+            instrumentation.count("npc.droppedQueueEntries")
+
+    def dequeue(self):
+        """
+        Remove the first autoCoordinate in the queue whose cell hasn't been fired at.
+        :return: autoCoordinate instance, or None if the queue ran out.
+        """
+        while self.queue:
+            value = self.queue.popleft()
+            self.queued.discard(value.coordinate)
+            if self.position[value.coordinate] >= 0:
+                return value
+            if instrumentation.enabled:
+                instrumentation.count("npc.discardedQueueEntries")
+        return None
 
     def __len__(self):
         return len(self.queue)
 
-def playerSelectionInput():
+class identityMap(dict):
+    """
+    identityMap class is a dictionary that maps every key it doesn't hold to itself.
+    """
+    def __missing__(self,key):
+        return key
+
+class sparseFrontier(targetFrontier):
+    """
+    sparseFrontier class is a targetFrontier for large gameboards.  The pool is shuffled lazily (a sparse Fisher-Yates
+    shuffle): pool and position start out as the identity and only the entries that differ from it are stored, so
+    memory grows with the number of shots instead of the size of the gameboard.
+    """
+    __slots__ = ("size",)
+
+    def __init__(self,geometry,rng=None):
+        """
+        :param geometry: boardGeometry of the gameboard being fired at.
+        :param rng: random.Random instance the random picks are drawn from, defaults to the random module.
+        """
+        self.geometry = geometry
+        self.rng = random if rng is None else rng
+        # Number of cells still in the pool.  pool[index] and position[cell] work as in targetFrontier.
+        self.size = geometry.cells
+        self.pool = identityMap()
+        self.position = identityMap()
+        self.queue = deque()
+        self.queued = set()
+
+    def remove(self,cell):
+        """
+        Remove a cell from the pool by moving the last cell into its slot.
+        :param cell: Integer cell index.
+        :return: None.
+        """
+        index = self.position[cell]
+        if index >= 0:
+            self.size -= 1
+            last = self.pool.pop(self.size,self.size)
+            if last != cell:
+                self.pool[index] = last
+                self.position[last] = index
+            self.position[cell] = -1
+
+    def randomCell(self):
+        """
+        Pick a random cell that hasn't been fired at.
+        :return: Integer cell index.
+        """
+        return self.pool[self.rng.randrange(self.size)]
+
+    def poolSize(self):
+        """
+        Count the cells that haven't been fired at.
+        :return: Integer number of cells.
+        """
+        return self.size
+
+def createFrontier(geometry=None,rng=None):
+    """
+    createFrontier() creates the targetFrontier for an NPC firing at a gameboard of the given size, a sparseFrontier
+    for gameboards too large to tabulate.
+    :param geometry: boardGeometry of the gameboard being fired at, defaults to the standard gameboard.
+    :param rng: random.Random instance the random picks are drawn from, defaults to the random module.
+    :return: targetFrontier instance.
+    """
+    if geometry is not None and geometry.cells > denseCells:
+        return sparseFrontier(geometry,rng)
+    return targetFrontier(geometry,rng)
+
+def playerSelectionInput(inputSource=None):
     """
     playerSelectionInput() will prompt the user for the number of players they want to play the game wtih.  A zero-person
     game will be a game between two NPC's, a one-person game will be a game between a real player and one NPC, and a two-player
     game will be a game between two real players.
+    :param inputSource: Input source from playerinput.py the answer is read from.  Defaults to playerinput.consoleInput.
     :return: Integer representing player count.
     """
+    if inputSource is None:
+        inputSource = playerinput.consoleInput()
     while True:
         print("Please select the game mode.  Enter '0' for a zero-person game, '1' for a one-person game, or '2' for a two-player game.")
         try:
-            playersSelectionInput = int(input("Enter Players Count: "))
+            playersSelectionInput = int(inputSource.read("Enter Players Count: "))
             print()
             if playersSelectionInput == 0 or playersSelectionInput == 1 or playersSelectionInput == 2:
                 return playersSelectionInput
@@ -213,33 +893,45 @@ def directionToEndCoordinates(shipSize,startCoordinate,direction):
     :param shipSize: Integer representing ship size.
     :param startCoordinate: String representing the user's input for the start of the ship.
     :param direction: String representing the direction the user wants the ship to face.
-    :return:
+    :return: String representing the end coordinate, False if the direction is invalid or the ship would run off the
+    top of the gameboard.
     """
     inputDirection = direction.capitalize()
+    row,column = startCoordinate
     if inputDirection == "N":
-        return chr((startCoordinate[0]+65)+(shipSize-1))+str(startCoordinate[1]+1)
+        row += shipSize-1
     elif inputDirection == "E":
-        return chr(startCoordinate[0]+65)+str((startCoordinate[1]-(shipSize-1)+1))
+        column -= shipSize-1
     elif inputDirection == "S":
-        return chr((startCoordinate[0]-(shipSize-1))+65)+str(startCoordinate[1]+1)
+        row -= shipSize-1
     elif inputDirection == "W":
-        return chr(startCoordinate[0]+65)+str((startCoordinate[1]+(shipSize-1))+1)
-    return False
+        column += shipSize-1
+    else:
+        return False
+    if row < 0:
+        return False
+    return rowLabel(row)+str(column+1)
 
-def validCoordinate(coordinate):
+def validCoordinate(coordinate,rows=10,columns=10):
     """
     validCoordinate() determines if a coordinate is valid.
-    :param coordinate: String representing gameboard coordinate.
+    :param coordinate: String representing gameboard coordinate, row letters followed by a column number.
+    :param rows: Integer number of rows on the gameboard.
+    :param columns: Integer number of columns on the gameboard.
     :return: Tuple representing number coordinates if valid, False otherwise.
     """
     if isinstance(coordinate,str):
-        firstChar = ord(coordinate[0].capitalize())-65
-        if firstChar >= 0 and firstChar <= 9:
-            column = coordinate[1:]
-            if column.isnumeric():
-                lastChar = int(column)-1
-                if lastChar >= 0 and lastChar <= 9:
-                    return (firstChar,lastChar)
+        letters = 0
+        while letters < len(coordinate) and coordinate[letters] in ascii_letters:
+            letters += 1
+        if letters:
+            firstChar = rowIndex(coordinate[:letters].upper())
+            if firstChar < rows:
+                column = coordinate[letters:]
+                if column.isnumeric():
+                    lastChar = int(column)-1
+                    if lastChar >= 0 and lastChar < columns:
+                        return (firstChar,lastChar)
     return False
 
 def identifyCoordinates(start,end):
@@ -270,10 +962,10 @@ def validateAndAddShip(startCoordinate,direction,shipSize,gameboard):
     :param gameboard: Gameboard instance.
     :return: True if it was successfully added, false otherwise.
     """
-    startValid = validCoordinate(startCoordinate)
+    startValid = validCoordinate(startCoordinate,gameboard.rows,gameboard.columns)
     if startValid:
         # If start coordinate was valid, generate the end coordinate with directionToEndCoordinates() and confirm it's valid.
-        endValid = validCoordinate(directionToEndCoordinates(shipSize,startValid,direction))
+        endValid = validCoordinate(directionToEndCoordinates(shipSize,startValid,direction),gameboard.rows,gameboard.columns)
         if endValid:
             # Get a list of spaces the ship occupies.
             shipSpaces = identifyCoordinates(startValid,endValid)
@@ -284,20 +976,22 @@ def validateAndAddShip(startCoordinate,direction,shipSize,gameboard):
                     return True
     return False
 
-def shipLocationInput(shipSize,gameboard):
+def shipLocationInput(shipSize,gameboard,inputSource=None):
     """
     shipLocationInput() prompts user for the location of a ship.
     :param shipSize: Integer representing ship size.
     :param gameboard: Gameboard instance for player.
+    :param inputSource: Input source from playerinput.py the answers are read from.  Defaults to playerinput.consoleInput.
     :return: None.
     """
-    shipName = {1:"submarine",2:"destroyer",3:"cruiser",4:"battleship",5:"aircraft carrier"}
+    if inputSource is None:
+        inputSource = playerinput.consoleInput()
     while True:
-        print("Player "+str(gameboard.player)+", please select a start coordinate and direction to place the "+shipName[shipSize]+".")
+        print("Player "+str(gameboard.player)+", please select a start coordinate and direction to place the "+shipName(shipSize)+".")
         print("N for north, E for east, S for south, W for west.")
 
-        start = input("Enter Start Coordinate: ")
-        direction = input("Enter Direction: ")
+        start = inputSource.read("Enter Start Coordinate: ")
+        direction = inputSource.read("Enter Direction: ")
         print()
 
         if direction.isalpha() and len(direction) == 1:
@@ -307,6 +1001,17 @@ def shipLocationInput(shipSize,gameboard):
                 break
         print("These are invalid coordinates.  Please try again.\n")
 
+def shipName(shipSize):
+    """
+    shipName() converts a ship's size into its name.
+    :param shipSize: Integer representing ship size.
+    :return: String ship name.
+    """
+    return shipNames.get(shipSize,str(shipSize)+" tile ship")
+
+# shipNames names the ships in the standard fleet by size.
+shipNames = {1:"submarine",2:"destroyer",3:"cruiser",4:"battleship",5:"aircraft carrier"}
+
 def randomCoordinate():
     """
     randomCoordinate() generates a random coordinate.
@@ -314,70 +1019,150 @@ def randomCoordinate():
     """
     return chr(random.randint(0,9)+65)+str(random.randint(1,10))
 
+def randomCell():
+    """
+    randomCell() picks a random cell.
+    :return: Integer cell index from 0-99.
+    """
+    return random.randrange(100)
+
+def resolveFireAtTarget(target,aggressorGameboard,targetGameboard):
+    """
+    resolveFireAtTarget() fires at a numeric coordinate and records the outcome on the aggressor's firedOn board without
+    printing anything.  Both the console flow and headless simulations go through this.
+    :param target: Tuple representing numeric coordinate.
+    :param aggressorGameboard: Gameboard instance for the aggressor.
+    :param targetGameboard: Gameboard instance for the target.
+    :return: Result from Gameboard.fireAtTarget().
+    """
+    if instrumentation.enabled:
+        instrumentation.enterPhase("fire")
+    result = targetGameboard.fireAtTarget(target)
+    aggressorGameboard.recordShot(target,result)
+    if instrumentation.enabled:
+        instrumentation.exitPhase()
+        instrumentation.count("fire.sunk" if isinstance(result,int) else "fire."+result)
+    return result
+
+def resolveVolley(targets,aggressorGameboard,targetGameboard,cells=False):
+    """
+    resolveVolley() fires a salvo through Gameboard.fireVolley() and records the outcome on the aggressor's firedOn board
+    without printing anything.  The salvo counterpart of resolveFireAtTarget().
+    :param targets: Iterable of numeric coordinates, or of cell indices when cells is True.
+    :param aggressorGameboard: Gameboard instance for the aggressor.
+    :param targetGameboard: Gameboard instance for the target.
+    :param cells: Boolean, the targets are cell indices and go through Gameboard.fireCells().
+    :return: volleyResult from Gameboard.fireVolley().
+    """
+    if instrumentation.enabled:
+        instrumentation.enterPhase("fire")
+    volley = targetGameboard.fireCells(targets) if cells else targetGameboard.fireVolley(targets)
+    aggressorGameboard.recordVolley(volley)
+    if instrumentation.enabled:
+        instrumentation.exitPhase()
+        instrumentation.count("fire.volleys")
+        for result in volley.results:
+            instrumentation.count("fire.sunk" if isinstance(result,int) else "fire."+result)
+    return volley
+
+def printFireResult(result):
+    """
+    printFireResult() prints the outcome of a shot.
+    :param result: Result from Gameboard.fireAtTarget().
+    :return: None.
+    """
+    if result == "Hit":
+        print("Hit!  You've hit a ship!\n")
+    elif result == "Miss":
+        print("You've missed!\n")
+    elif result == "Repeat":
+        print("You've already fired at this target.  Please try again.\n")
+    elif isinstance(result,int):
+        print("You've sunk a "+shipName(result)+"!\n")
+
+def printVolleyResult(volley):
+    """
+    printVolleyResult() prints the outcome of every shot in a salvo, then the totals.
+    :param volley: volleyResult from Gameboard.fireVolley().
+    :return: None.
+    """
+    for target,result in volley:
+        sys.stdout.write(rowLabel(target[0])+str(target[1]+1)+": ")
+        printFireResult(result)
+    print("Salvo: "+str(volley.hits)+" hit(s), "+str(volley.misses)+" miss(es), "+str(len(volley.sunk))+" sunk.\n")
+
 def handleFireAtTarget(target,aggressorGameboard,targetGameboard):
     """
     handleFireAtTarget() is used to call Gameboard.fireAtTarget() to fire at a coordinate prints out the results.
-    :param target: Tuple representing numeric coordinate.
+    :param target: String representing gameboard coordinate.
     :param aggressorGameboard: Gameboard instance for the aggressor.
     :param targetGameboard: Gameboard instance for the target.
     :return: True if hit or miss, false otherwise.
     """
-    # shipName is used to convert a ship's size into it's name.
-    shipName = {1:"submarine",2:"destroyer",3:"cruiser",4:"battleship",5:"aircraft carrier"}
-    validTarget = validCoordinate(target)
+    validTarget = validCoordinate(target,targetGameboard.rows,targetGameboard.columns)
     if validTarget:
-        # Attempt to fire at the target and store the result.
-        result = targetGameboard.fireAtTarget(validTarget)
-        if result != "Repeat":
-            boardCoord = boardCoordToNumCoord(target)
-            if result == "Hit":
-                aggressorGameboard.firedOn[boardCoord] = "X"
-                print("Hit!  You've hit a ship!\n")
-            elif result == "Miss":
-                aggressorGameboard.firedOn[boardCoord] = "O"
-                print("You've missed!\n")
-            elif isinstance(result,int):
-                aggressorGameboard.firedOn[boardCoord] = "X"
-                print("You've sunk a "+shipName[result]+"!\n")
-            return True
-        else:
-            print("You've already fired at this target.  Please try again.\n")
-            return False
+        # Attempt to fire at the target and print the result.
+        result = resolveFireAtTarget(validTarget,aggressorGameboard,targetGameboard)
+        printFireResult(result)
+        return result != "Repeat"
     return False
 
-def userFireAtTarget(aggressorGameboard,targetGameboard):
+def userFireAtTarget(aggressorGameboard,targetGameboard,inputSource=None):
     """
     userFireAtTarget() is used to allow the user to decide on a target to fire at.
     :param aggressorGameboard: Gameboard instance of the aggressor.
     :param targetGameboard: Gameboard instance of the target.
+    :param inputSource: Input source from playerinput.py the target is read from.  Defaults to playerinput.consoleInput.
     :return: None.
     """
+    if inputSource is None:
+        inputSource = playerinput.consoleInput()
     while True:
         print("Player "+str(aggressorGameboard.player)+", please select a coordinate to fire at.")
-        target = input("Enter Coordinate:")
+        target = inputSource.read("Enter Coordinate:")
         target = target.capitalize()
         result = handleFireAtTarget(target,aggressorGameboard,targetGameboard)
         # If the attack was successful, break out of the infinite loop.
         if result:
             break
 
+def userFireVolley(aggressorGameboard,targetGameboard,shots,inputSource=None):
+    """
+    userFireVolley() lets the user pick every target of a salvo, one coordinate per prompt, and fires them together.
+    Coordinates that are invalid, already fired at or already picked this turn are asked for again.
+    :param aggressorGameboard: Gameboard instance of the aggressor.
+    :param targetGameboard: Gameboard instance of the target.
+    :param shots: Integer number of shots in the salvo.  Capped at the number of cells not fired at yet.
+    :param inputSource: Input source from playerinput.py the targets are read from.  Defaults to playerinput.consoleInput.
+    :return: volleyResult from Gameboard.fireVolley().
+    """
+    if inputSource is None:
+        inputSource = playerinput.consoleInput()
+    # Late in a game there can be fewer cells left than shots, as in autoFireVolley().
+    shots = min(shots,targetGameboard.geometry.cells-len(aggressorGameboard.firedOn))
+    targets = []
+    print("Player "+str(aggressorGameboard.player)+", please select "+str(shots)+" coordinate(s) to fire at.")
+    while len(targets) < shots:
+        target = validCoordinate(inputSource.read("Enter Coordinate "+str(len(targets)+1)+" of "+str(shots)+":").capitalize(),
+                                 targetGameboard.rows,targetGameboard.columns)
+        if not target:
+            print("That coordinate is invalid.  Please try again.\n")
+            continue
+        if target in aggressorGameboard.firedOn or target in targets:
+            printFireResult("Repeat")
+            continue
+        targets.append(target)
+    volley = resolveVolley(targets,aggressorGameboard,targetGameboard)
+    printVolleyResult(volley)
+    return volley
+
 def identifyAdjacentCoordinates(coordinate):
     """
     identifyAdjacentCoordinates() identifies the coordinates adjacent to the coordinate one square away.
     :param coordinate: String representing gameboard coordinate.
     :return: List of gameboard coordinates.
     """
-    value = boardCoordToNumCoord(coordinate)
-    output = []
-    if (value[0]-1) >= 0 and (value[0]-1) <= 9:
-        output.append(chr((value[0]-1)+65)+str(value[1]+1))
-    if (value[0]+1) >= 0 and (value[0]+1) <= 9:
-        output.append(chr((value[0]+1)+65)+str(value[1]+1))
-    if (value[1]-1) >= 0 and (value[1]-1) <= 9:
-        output.append(chr(value[0]+65)+str((value[1]-1)+1))
-    if (value[1]+1) >= 0 and (value[1]+1) <= 9:
-        output.append(chr(value[0]+65)+str((value[1]+1)+1))
-    return output
+    return [cellLabels[neighbor] for direction,neighbor in cellNeighbors[boardCoordToCell(coordinate)]]
 
 def identifyDirection(coordinate,centerCoordinate):
     """
@@ -388,80 +1173,192 @@ def identifyDirection(coordinate,centerCoordinate):
     :param centerCoordinate: String representing the center gamebaord coordinate.
     :return: String representing the direction.
     """
-    coordinateValue = boardCoordToNumCoord(coordinate)
-    centerCoordinateValue = boardCoordToNumCoord(centerCoordinate)
-
-    # If both coordinates are horizontal ...
-    if coordinateValue[0] == centerCoordinateValue[0]:
-        if coordinateValue[1] > centerCoordinateValue[1]:
-            return "E"
-        elif coordinateValue[1] < centerCoordinateValue[1]:
-            return "W"
-    # If both coordinates are vertical ...
-    elif coordinateValue[1] == centerCoordinateValue[1]:
-        if coordinateValue[0] < centerCoordinateValue[0]:
-            return "N"
-        elif coordinateValue[0] > centerCoordinateValue[0]:
-            return "S"
-
-def autoFireAtTarget(aggressorGameboard,aggressorQueue,targetGameboard):
-    """
-    autoFireAtTarget() is used by NPC players to choose a gameboard target to fire at.
+    coordinateCell = boardCoordToCell(coordinate)
+    for direction,neighbor in cellNeighbors[boardCoordToCell(centerCoordinate)]:
+        if neighbor == coordinateCell:
+            return direction
+
+def queueFollowUps(aggressorQueue,target,autoCoord):
+    """
+    queueFollowUps() queues the cells an NPC should try after a hit.
+    :param aggressorQueue: targetFrontier instance for the aggressor.
+    :param target: Integer cell index that was hit.
+    :param autoCoord: autoCoordinate the target was taken from the queue as, or None if it was picked at random.
+    :return: None.
+    """
+    geometry = aggressorQueue.geometry
+    # If we hit this target from the queue, identify the next coordinate in the same direction and enqueue.
+    if autoCoord is not None:
+        nextCoordinate = autoCoord.identifyNextCoordinate(geometry.cellRays)
+        if nextCoordinate is not None:
+            newCoord = autoCoordinate(nextCoordinate)
+            newCoord.direction = autoCoord.direction
+            aggressorQueue.enqueue(newCoord)
+    # If this was an arbitrarily chosen target, add all adjacent neighbors to the queue to identify the next hit.
+    else:
+        for direction,neighbor in geometry.cellNeighbors[target]:
+            coord = autoCoordinate(neighbor)
+            coord.direction = direction
+            aggressorQueue.enqueue(coord)
+
+def autoFireAtTarget(aggressorGameboard,aggressorQueue,targetGameboard,verbose=True):
+    """
+    autoFireAtTarget() is used by NPC players to choose a gameboard target to fire at.  Targets are handled as cell
+    indices throughout, so no coordinate strings are built unless verbose output is on.
     :param aggressorGameboard: Gameboard instance for the aggressor.
-    :param aggressorQueue: simulatedQueue instance for the aggressor.
+    :param aggressorQueue: targetFrontier instance for the aggressor, created for the target's gameboard size.
     :param targetGameboard: Gameboard instance for the target.
-    :return: None.
+    :param verbose: Boolean, print the shot and its outcome when True.  Headless simulations pass False.
+    :return: Tuple of the numeric coordinate fired at and the result from Gameboard.fireAtTarget().
     """
+    if instrumentation.enabled:
+        instrumentation.enterPhase("npc")
+    geometry = aggressorQueue.geometry
     while True:
-        autoCoord = None
-        # If the queue of targets to attack is empty, arbitrarily pick a coordinate.
-        if len(aggressorQueue) == 0:
-            target = randomCoordinate()
-        # Otherwise get the next coordinate in the queue.
+        # Get the next coordinate in the queue.
+        autoCoord = aggressorQueue.dequeue()
+        # If the queue of targets to attack is empty, arbitrarily pick a coordinate we haven't fired at.
+        if autoCoord is None:
+            target = aggressorQueue.randomCell()
         else:
-            autoCoord = aggressorQueue.dequeue()
             target = autoCoord.coordinate
-        targetBoardCoord = boardCoordToNumCoord(target)
+        aggressorQueue.remove(target)
+        targetBoardCoord = geometry.cellCoordinates[target]
+        if instrumentation.enabled:
+            instrumentation.count("npc.randomPicks" if autoCoord is None else "npc.queuedPicks")
         # If we didn't already choose this coordinate ...
         if targetBoardCoord not in aggressorGameboard.firedOn:
-            print("Player "+str(aggressorGameboard.player)+" is firing at "+target+"!")
             # Fire at this target.
-            result = handleFireAtTarget(target,aggressorGameboard,targetGameboard)
-            if result:
-                # If firing at this target is results in a hit ...
-                if aggressorGameboard.firedOn[targetBoardCoord] == "X":
-                    # If we hit this target from the queue, identify the next coordinate in the same direction and enqueue.
-                    if autoCoord is not None:
-                        nextCoordinate = autoCoord.identifyNextCoordinate()
-                        if nextCoordinate is not False:
-                            newCoord = autoCoordinate(nextCoordinate)
-                            newCoord.direction = autoCoord.direction
-                            aggressorQueue.enqueue(newCoord)
-                    # If this was an arbitrarily chosen target, add all adjacent neighbors to the queue to identify the next hit.
-                    else:
-                        neighbors = identifyAdjacentCoordinates(target)
-                        for i in neighbors:
-                            coord = autoCoordinate(i)
-                            coord.direction = identifyDirection(i,target)
-                            aggressorQueue.enqueue(coord)
+            result = resolveFireAtTarget(targetBoardCoord,aggressorGameboard,targetGameboard)
+            if verbose:
+                print("Player "+str(aggressorGameboard.player)+" is firing at "+geometry.cellLabels[target]+"!")
+                printFireResult(result)
+            # If firing at this target is results in a hit ...
+            if aggressorGameboard.firedOn[targetBoardCoord] == "X":
+                queueFollowUps(aggressorQueue,target,autoCoord)
+            if instrumentation.enabled:
+                instrumentation.exitPhase()
+            return targetBoardCoord,result
+        if instrumentation.enabled:
+            instrumentation.count("npc.alreadyFiredRetries")
+
+def randomFireAtTarget(aggressorGameboard,aggressorQueue,targetGameboard,verbose=True):
+    """
+    randomFireAtTarget() is the baseline NPC.  It fires at a random cell it hasn't fired at yet and never follows up on
+    a hit.  Same signature as autoFireAtTarget().
+    :param aggressorGameboard: Gameboard instance for the aggressor.
+    :param aggressorQueue: targetFrontier instance for the aggressor.  Only its pool of unfired cells is used.
+    :param targetGameboard: Gameboard instance for the target.
+    :param verbose: Boolean, print the shot and its outcome when True.
+    :return: Tuple of the numeric coordinate fired at and the result from Gameboard.fireAtTarget().
+    """
+    if instrumentation.enabled:
+        instrumentation.enterPhase("npc")
+    target = aggressorQueue.randomCell()
+    aggressorQueue.remove(target)
+    targetBoardCoord = aggressorQueue.geometry.cellCoordinates[target]
+    result = resolveFireAtTarget(targetBoardCoord,aggressorGameboard,targetGameboard)
+    if instrumentation.enabled:
+        instrumentation.count("npc.randomPicks")
+        instrumentation.exitPhase()
+    if verbose:
+        print("Player "+str(aggressorGameboard.player)+" is firing at "+aggressorQueue.geometry.cellLabels[target]+"!")
+        printFireResult(result)
+    return targetBoardCoord,result
+
+def autoFireVolley(aggressorGameboard,aggressorQueue,targetGameboard,shots,verbose=True):
+    """
+    autoFireVolley() is the salvo counterpart of autoFireAtTarget().  The salvo is filled from the queue first, so
+    every follow-up left by earlier hits is fired at together, and the rest of the shots go to random cells not fired at
+    yet.  Hits queue their follow-ups for the next salvo.
+    :param aggressorGameboard: Gameboard instance for the aggressor.
+    :param aggressorQueue: targetFrontier instance for the aggressor, created for the target's gameboard size.
+    :param targetGameboard: Gameboard instance for the target.
+    :param shots: Integer number of shots in the salvo, usually the aggressor's remainingShips.
+    :param verbose: Boolean, print the salvo and its outcome when True.
+    :return: volleyResult from Gameboard.fireVolley().
+    """
+    if instrumentation.enabled:
+        instrumentation.enterPhase("npc")
+    cellCoordinates = aggressorQueue.geometry.cellCoordinates
+    firedOn = aggressorGameboard.firedOn
+    cells = []
+    picks = []
+    while len(cells) < shots:
+        autoCoord = aggressorQueue.dequeue()
+        if autoCoord is None:
+            if not aggressorQueue.poolSize():
                 break
+            target = aggressorQueue.randomCell()
+        else:
+            target = autoCoord.coordinate
+        aggressorQueue.remove(target)
+        if instrumentation.enabled:
+            instrumentation.count("npc.randomPicks" if autoCoord is None else "npc.queuedPicks")
+        if cellCoordinates[target] not in firedOn:
+            cells.append(target)
+            picks.append(autoCoord)
+    volley = resolveVolley(cells,aggressorGameboard,targetGameboard,cells=True)
+    for target,autoCoord,result in zip(cells,picks,volley.results):
+        # Only a hit or a sink leads anywhere.  A repeat carries no news about the cells next to it.
+        if result == "Hit" or isinstance(result,int):
+            queueFollowUps(aggressorQueue,target,autoCoord)
+    if instrumentation.enabled:
+        instrumentation.exitPhase()
+    if verbose:
+        print("Player "+str(aggressorGameboard.player)+" fires a salvo of "+str(len(cells))+"!")
+        printVolleyResult(volley)
+    return volley
 
-def runBattleship(playerOneGameboard,playerTwoGameboard,players):
+def randomFireVolley(aggressorGameboard,aggressorQueue,targetGameboard,shots,verbose=True):
+    """
+    randomFireVolley() is the baseline salvo NPC, the salvo counterpart of randomFireAtTarget().  Same signature as
+    autoFireVolley().
+    :param aggressorGameboard: Gameboard instance for the aggressor.
+    :param aggressorQueue: targetFrontier instance for the aggressor.  Only its pool of unfired cells is used.
+    :param targetGameboard: Gameboard instance for the target.
+    :param shots: Integer number of shots in the salvo.
+    :param verbose: Boolean, print the salvo and its outcome when True.
+    :return: volleyResult from Gameboard.fireVolley().
+    """
+    targets = []
+    for i in range(min(shots,aggressorQueue.poolSize())):
+        target = aggressorQueue.randomCell()
+        aggressorQueue.remove(target)
+        targets.append(target)
+    volley = resolveVolley(targets,aggressorGameboard,targetGameboard,cells=True)
+    if verbose:
+        print("Player "+str(aggressorGameboard.player)+" fires a salvo of "+str(len(targets))+"!")
+        printVolleyResult(volley)
+    return volley
+
+def runBattleship(playerOneGameboard,playerTwoGameboard,players,gameboardRenderer=None,inputSource=None,salvo=False):
     """
     runBattleship() runs the game based on the players specified at setup.
     :param playerOneGameboard: Gameboard instance for player one.
     :param playerTwoGameboard: Gameboard instance for player two.
     :param players: Integer representing the number of players in the game.
-    :return: None.
+    :param gameboardRenderer: Renderer from renderer.py used to draw gameboards each turn.  Defaults to
+    renderer.bufferedRenderer, which prints the same layout as Gameboard.printGameboard().
+    :param inputSource: Input source from playerinput.py the players' targets are read from.  Defaults to
+    playerinput.consoleInput.
+    :param salvo: Boolean, play the salvo variant: each turn fires one shot per ship the player has left afloat.
+    :return: Integer representing the player who won.
     """
+    if salvo:
+        return runSalvo(playerOneGameboard,playerTwoGameboard,players,gameboardRenderer,inputSource)
+    if gameboardRenderer is None:
+        gameboardRenderer = renderer.bufferedRenderer()
+    if inputSource is None:
+        inputSource = playerinput.consoleInput()
     print("=======================================================================================================")
     print("Beginning game ...")
     print("=======================================================================================================\n")
 
     if players == 0:
-        autoOneHitQueue = simulatedQueue()
+        autoOneHitQueue = createFrontier(playerTwoGameboard.geometry)
     if players <= 1:
-        autoTwoHitQueue = simulatedQueue()
+        autoTwoHitQueue = createFrontier(playerOneGameboard.geometry)
 
     # Loop while no one has won.
     while playerOneGameboard.remainingShips > 0 and playerTwoGameboard.remainingShips > 0:
@@ -469,19 +1366,67 @@ def runBattleship(playerOneGameboard,playerTwoGameboard,players):
             autoFireAtTarget(playerOneGameboard,autoOneHitQueue,playerTwoGameboard)
             autoFireAtTarget(playerTwoGameboard,autoTwoHitQueue,playerOneGameboard)
         elif players == 1:
-            playerOneGameboard.printGameboard()
-            userFireAtTarget(playerOneGameboard,playerTwoGameboard)
+            gameboardRenderer.render(playerOneGameboard)
+            userFireAtTarget(playerOneGameboard,playerTwoGameboard,inputSource)
             autoFireAtTarget(playerTwoGameboard,autoTwoHitQueue,playerOneGameboard)
         elif players == 2:
-            playerOneGameboard.printGameboard()
-            userFireAtTarget(playerOneGameboard,playerTwoGameboard)
-            playerTwoGameboard.printGameboard()
-            userFireAtTarget(playerTwoGameboard,playerOneGameboard)
+            gameboardRenderer.render(playerOneGameboard)
+            userFireAtTarget(playerOneGameboard,playerTwoGameboard,inputSource)
+            gameboardRenderer.render(playerTwoGameboard)
+            userFireAtTarget(playerTwoGameboard,playerOneGameboard,inputSource)
+    gameboardRenderer.close()
+
+    if playerOneGameboard.remainingShips == 0:
+        print("Player 2 has won the game!\n")
+        return 2
+    else:
+        print("Player 1 has won the game!\n")
+        return 1
+
+def runSalvo(playerOneGameboard,playerTwoGameboard,players,gameboardRenderer=None,inputSource=None):
+    """
+    runSalvo() runs a game of the salvo variant for runBattleship().  A player's salvo is as many shots as they have
+    ships afloat at the start of their turn.
+    :param playerOneGameboard: Gameboard instance for player one.
+    :param playerTwoGameboard: Gameboard instance for player two.
+    :param players: Integer representing the number of players in the game.
+    :param gameboardRenderer: Renderer from renderer.py used to draw gameboards each turn.
+    :param inputSource: Input source from playerinput.py the players' targets are read from.
+    :return: Integer representing the player who won.
+    """
+    if gameboardRenderer is None:
+        gameboardRenderer = renderer.bufferedRenderer()
+    if inputSource is None:
+        inputSource = playerinput.consoleInput()
+    print("=======================================================================================================")
+    print("Beginning salvo game ...")
+    print("=======================================================================================================\n")
+
+    autoHitQueues = {}
+    if players == 0:
+        autoHitQueues[1] = createFrontier(playerTwoGameboard.geometry)
+    if players <= 1:
+        autoHitQueues[2] = createFrontier(playerOneGameboard.geometry)
+
+    turns = ((playerOneGameboard,playerTwoGameboard),(playerTwoGameboard,playerOneGameboard))
+    while playerOneGameboard.remainingShips > 0 and playerTwoGameboard.remainingShips > 0:
+        for aggressorGameboard,targetGameboard in turns:
+            shots = aggressorGameboard.remainingShips
+            if aggressorGameboard.player in autoHitQueues:
+                autoFireVolley(aggressorGameboard,autoHitQueues[aggressorGameboard.player],targetGameboard,shots)
+            else:
+                gameboardRenderer.render(aggressorGameboard)
+                userFireVolley(aggressorGameboard,targetGameboard,shots,inputSource)
+            if targetGameboard.remainingShips == 0:
+                break
+    gameboardRenderer.close()
 
     if playerOneGameboard.remainingShips == 0:
         print("Player 2 has won the game!\n")
+        return 2
     else:
         print("Player 1 has won the game!\n")
+        return 1
 
 def repeatUntilShipValidated(direction,shipSize,gameboard):
     """
@@ -496,60 +1441,331 @@ def repeatUntilShipValidated(direction,shipSize,gameboard):
         success = validateAndAddShip(randomCoordinate(),direction,shipSize,gameboard)
         if success:
             break
+        if instrumentation.enabled:
+            instrumentation.count("setup.repeatUntilShipValidatedRetries")
 
-def userGameboardSetup(player):
+def userGameboardSetup(player,rows=10,columns=10,fleet=None,inputSource=None):
     """
     userGameboardSetup() performs the setup for a real player's gameboard.
     :param player: Integer representing the player.
+    :param rows: Integer number of rows.
+    :param columns: Integer number of columns.
+    :param fleet: List of ship sizes, placed in this order.  Defaults to defaultFleet.
+    :param inputSource: Input source from playerinput.py the placements are read from.  Defaults to
+    playerinput.consoleInput.
     :return: Gameboard instance created.
     """
-    playerGameboard = Gameboard(player)
-    for i in range(1,6):
-        if i <= 2:
-            shipLocationInput(i,playerGameboard)
-            playerGameboard.printGameboard()
-        shipLocationInput(i,playerGameboard)
+    playerGameboard = Gameboard(player,rows,columns,fleet)
+    for i in playerGameboard.fleet:
+        shipLocationInput(i,playerGameboard,inputSource)
         playerGameboard.printGameboard()
     return playerGameboard
 
-def autoGameboardSetup(player):
+# Ship sizes in every player's fleet: two submarines, two destroyers, a cruiser, a battleship and an aircraft carrier.
+defaultFleet = (1,1,2,2,3,4,5)
+
+# placementTable maps a ship size to every legal placement of that ship on an empty gameboard.  It's filled in lazily by
+# shipPlacements() the first time a size is needed.
+placementTable = {}
+
+def shipPlacements(shipSize):
+    """
+    shipPlacements() lists every legal placement for a ship of the given size on the standard 10x10 gameboard.
+    :param shipSize: Integer representing the ship size.
+    :return: List of (coordinates, mask) tuples.  Coordinates is a tuple of numeric coordinates and mask is an integer
+    with bit row*10+column set for each of them.
+    """
+    placements = placementTable.get(shipSize)
+    if placements is None:
+        placements = []
+        for row in range(10):
+            for column in range(10):
+                # Horizontal placement starting here ...
+                if column+shipSize <= 10:
+                    placements.append(tuple((row,column+i) for i in range(shipSize)))
+                # ... and vertical, unless it's a single tile which looks the same either way.
+                if shipSize > 1 and row+shipSize <= 10:
+                    placements.append(tuple((row+i,column) for i in range(shipSize)))
+        placements = [(i,sum(1 << (j[0]*10+j[1]) for j in i)) for i in placements]
+        placementTable[shipSize] = placements
+    return placements
+
+def sampleFleet(fleet,uniform=False,rng=None):
+    """
+    sampleFleet() draws a random non-overlapping placement for every ship in a fleet straight from the placement table.
+    :param fleet: List of ship sizes.
+    :param uniform: Boolean.  False places the largest ships first, each drawn uniformly from the placements that don't
+    overlap the ships already placed.  True draws every ship independently and
+    starts over on any overlap, which is uniform over all legal fleet layouts.
+    :param rng: random.Random instance the placements are drawn from, defaults to the random module.
+    :return: List of coordinate tuples, one per ship in the same order as fleet.
+    """
+    if rng is None:
+        rng = random
+    while True:
+        chosen = [None]*len(fleet)
+        occupied = 0
+        if uniform:
+            for i,shipSize in enumerate(fleet):
+                coordinates,mask = rng.choice(shipPlacements(shipSize))
+                if mask & occupied:
+                    if instrumentation.enabled:
+                        instrumentation.count("setup.fleetRestarts")
+                    break
+                occupied |= mask
+                chosen[i] = coordinates
+            else:
+                return chosen
+        else:
+            for i in sorted(range(len(fleet)),key=lambda i: -fleet[i]):
+                placements = shipPlacements(fleet[i])
+                # Drawing from the full table and skipping overlaps is uniform over the non-overlapping placements and
+                # almost always succeeds on the first draw.  After a few misses, filter the table once instead.
+                for attempt in range(8):
+                    coordinates,mask = rng.choice(placements)
+                    if not mask & occupied:
+                        break
+                    if instrumentation.enabled:
+                        instrumentation.count("setup.placementRetries")
+                else:
+                    candidates = [j for j in placements if not j[1] & occupied]
+                    # Only possible when the fleet barely fits the board.  Start over with a fresh layout.
+                    if not candidates:
+                        if instrumentation.enabled:
+                            instrumentation.count("setup.fleetRestarts")
+                        break
+                    coordinates,mask = rng.choice(candidates)
+                occupied |= mask
+                chosen[i] = coordinates
+            else:
+                return chosen
+
+def randomPlacement(shipSize,rows,columns):
+    """
+    randomPlacement() draws one of the legal placements of a ship on an empty gameboard, uniformly and without listing
+    them.
+    :param shipSize: Integer representing the ship size.
+    :param rows: Integer number of rows.
+    :param columns: Integer number of columns.
+    :return: Tuple of numeric coordinates.
+    """
+    horizontal = rows*(columns-shipSize+1) if columns >= shipSize else 0
+    vertical = (rows-shipSize+1)*columns if shipSize > 1 and rows >= shipSize else 0
+    if horizontal+vertical == 0:
+        raise ValueError("a ship of size "+str(shipSize)+" doesn't fit on a "+str(rows)+"x"+str(columns)+" gameboard")
+    index = random.randrange(horizontal+vertical)
+    if index < horizontal:
+        row,column = divmod(index,columns-shipSize+1)
+        return tuple((row,column+i) for i in range(shipSize))
+    row,column = divmod(index-horizontal,columns)
+    return tuple((row+i,column) for i in range(shipSize))
+
+def sampleSparseFleet(fleet,rows,columns,uniform=False):
+    """
+    sampleSparseFleet() is sampleFleet() for gameboards of any size.  Placements are drawn with randomPlacement() and
+    occupied cells are kept in a set, so the cost depends on the fleet rather than the size of the gameboard.
+    :param fleet: List of ship sizes.
+    :param rows: Integer number of rows.
+    :param columns: Integer number of columns.
+    :param uniform: Boolean, start over on any overlap instead of redrawing the ship.  See sampleFleet().
+    :return: List of coordinate tuples, one per ship in the same order as fleet.
+    """
+    if sum(fleet) > rows*columns:
+        raise ValueError("a fleet of "+str(sum(fleet))+" tiles doesn't fit on a "+str(rows)+"x"+str(columns)+" gameboard")
+    order = range(len(fleet)) if uniform else sorted(range(len(fleet)),key=lambda i: -fleet[i])
+    while True:
+        chosen = [None]*len(fleet)
+        occupied = set()
+        for i in order:
+            for attempt in range(1 if uniform else 100):
+                coordinates = randomPlacement(fleet[i],rows,columns)
+                if occupied.isdisjoint(coordinates):
+                    break
+                if instrumentation.enabled:
+                    instrumentation.count("setup.placementRetries")
+            else:
+                if instrumentation.enabled:
+                    instrumentation.count("setup.fleetRestarts")
+                break
+            occupied.update(coordinates)
+            chosen[i] = coordinates
+        else:
+            return chosen
+
+def transformLayout(layout,symmetry,rows=10,columns=10):
+    """
+    transformLayout() maps a fleet layout through one of the symmetries of the gameboard.  Any shooter that doesn't
+    favour a side or corner of the gameboard finds every transformed layout as hard to sink as the original.
+    :param layout: List of coordinate lists as returned by Gameboard.shipLayout().
+    :param symmetry: Integer 0-7.  Bit 0 flips the rows, bit 1 flips the columns and bit 2 swaps rows and columns,
+    which is skipped unless the gameboard is square.
+    :param rows: Integer number of rows.
+    :param columns: Integer number of columns.
+    :return: List of coordinate lists.
+    """
+    transformed = []
+    for coordinates in layout:
+        ship = []
+        for row,column in coordinates:
+            if symmetry & 1:
+                row = rows-1-row
+            if symmetry & 2:
+                column = columns-1-column
+            if symmetry & 4 and rows == columns:
+                row,column = column,row
+            ship.append((row,column))
+        transformed.append(ship)
+    return transformed
+
+def loadLayoutLibrary(path,fleet=None):
+    """
+    loadLayoutLibrary() reads the layouts from a library written by placement.py.
+    :param path: String path to the JSON library.
+    :param fleet: List of ship sizes the layouts must hold, defaults to defaultFleet.  Raises ValueError if the library
+    was built for another fleet or one of its layouts doesn't match it.
+    :return: List of layouts, each a list of coordinate lists.
+    """
+    with open(path) as libraryFile:
+        library = json.load(libraryFile)
+    expected = sorted(defaultFleet if fleet is None else fleet)
+    if sorted(library.get("fleet",expected)) != expected:
+        raise ValueError("layout library "+path+" was built for fleet "+str(library["fleet"])+", not "+str(expected))
+    layouts = [[[tuple(coordinate) for coordinate in ship] for ship in entry["layout"]] for entry in library["layouts"]]
+    for number,layout in enumerate(layouts):
+        if sorted(len(ship) for ship in layout) != expected:
+            raise ValueError("layout "+str(number)+" of "+path+" doesn't hold fleet "+str(expected))
+    return layouts
+
+@instrumentation.phase("setup")
+def autoGameboardSetup(player,gameboardClass=Gameboard,uniform=False,rows=10,columns=10,fleet=None,layouts=None):
     """
     autoGameboardSetup() performs the setup for a NPC's gameboard.
     :param player: Integer representing the player.
+    :param gameboardClass: Gameboard class or subclass to create, e.g. bitboard.BitboardGameboard.
+    :param uniform: Boolean, draw the fleet uniformly over all legal fleet layouts.  See sampleFleet().
+    :param rows: Integer number of rows.
+    :param columns: Integer number of columns.
+    :param fleet: List of ship sizes, defaults to defaultFleet.
+    :param layouts: List of layouts to draw from instead of placing ships at random, e.g. from loadLayoutLibrary().  The
+    drawn layout is put through a random symmetry of the gameboard, see transformLayout().  Raises ValueError if its
+    ships don't match fleet.
     :return: Gameboard instance created.
     """
-    autoGameboard = Gameboard(player)
-    direction = ["N","E","S","W"]
-    for i in range(1,6):
-        if i <= 2:
-            repeatUntilShipValidated(direction[random.randint(0,3)],i,autoGameboard)
-        repeatUntilShipValidated(direction[random.randint(0,3)],i,autoGameboard)
+    autoGameboard = gameboardClass(player,rows,columns,fleet)
+    if layouts:
+        layout = random.choice(layouts)
+        sizes = sorted(len(ship) for ship in layout)
+        if sizes != sorted(autoGameboard.fleet):
+            raise ValueError("a layout of fleet "+str(sizes)+" can't set up fleet "+str(sorted(autoGameboard.fleet)))
+        layout = transformLayout(layout,random.randrange(8),rows,columns)
+    elif rows == 10 and columns == 10:
+        layout = sampleFleet(autoGameboard.fleet,uniform)
+    else:
+        layout = sampleSparseFleet(autoGameboard.fleet,rows,columns,uniform)
+    for coordinates in layout:
+        autoGameboard.addShip(list(coordinates))
     return autoGameboard
 
-def main():
-    print("=======================================================================================================")
-    print("Welcome to Battleship!  This is a game where you and an opponent take turns firing at each other's ship.")
-    print("=======================================================================================================")
+def parseFleet(text):
+    """
+    parseFleet() reads a fleet from the command line.  Sizes are separated by commas and "size*count" repeats a size,
+    e.g. "5,4,3*2,2*4".
+    :param text: String fleet.
+    :return: Tuple of ship sizes.
+    """
+    fleet = []
+    for part in text.split(","):
+        shipSize,times,count = part.partition("*")
+        fleet.extend([int(shipSize)]*(int(count) if times else 1))
+    if not fleet or min(fleet) < 1:
+        raise ValueError("ship sizes must be positive")
+    return tuple(fleet)
 
-    players = playerSelectionInput()
+def startGame(rows=10,columns=10,fleet=None,gameboardRenderer=None,inputSource=None,layouts=None,salvo=False):
+    """
+    startGame() asks for the number of players, sets up every gameboard and plays the game.
+    :param rows: Integer number of rows.
+    :param columns: Integer number of columns.
+    :param fleet: List of ship sizes.  Defaults to defaultFleet.
+    :param gameboardRenderer: Renderer from renderer.py used in 1- and 2-player games.  Defaults to
+    renderer.bufferedRenderer.
+    :param inputSource: Input source from playerinput.py every answer is read from.  Defaults to
+    playerinput.consoleInput.
+    :param layouts: List of layouts NPC fleets are drawn from, see autoGameboardSetup().  None places them at random.
+    :param salvo: Boolean, play the salvo variant.  See runBattleship().
+    :return: Integer representing the player who won.
+    """
+    if inputSource is None:
+        inputSource = playerinput.consoleInput()
+    size = (rows,columns,fleet)
+    players = playerSelectionInput(inputSource)
 
     if players == 0:
-        autoOneGameboard = autoGameboardSetup(1)
+        autoOneGameboard = autoGameboardSetup(1,Gameboard,False,*size,layouts)
     if players <= 1:
-        autoTwoGameboard = autoGameboardSetup(2)
+        autoTwoGameboard = autoGameboardSetup(2,Gameboard,False,*size,layouts)
     if players >= 1:
-        playerOneGameboard = userGameboardSetup(1)
+        playerOneGameboard = userGameboardSetup(1,*size,inputSource)
     if players == 2:
-        playerTwoGameboard = userGameboardSetup(2)
+        playerTwoGameboard = userGameboardSetup(2,*size,inputSource)
 
     if players == 0:
-        runBattleship(autoOneGameboard,autoTwoGameboard,players)
+        winner = runBattleship(autoOneGameboard,autoTwoGameboard,players,salvo=salvo)
         autoOneGameboard.printGameboard()
         autoTwoGameboard.printGameboard()
     elif players == 1:
-        runBattleship(playerOneGameboard,autoTwoGameboard,players)
+        winner = runBattleship(playerOneGameboard,autoTwoGameboard,players,gameboardRenderer,inputSource,salvo)
     elif players == 2:
-        runBattleship(playerOneGameboard,playerTwoGameboard,players)
+        winner = runBattleship(playerOneGameboard,playerTwoGameboard,players,gameboardRenderer,inputSource,salvo)
+    return winner
+
+def main():
+    parser = argparse.ArgumentParser(description="Play a game of Battleship.")
+    parser.add_argument("--renderer",choices=sorted(renderer.RENDERERS),default="buffered",
+                        help="how gameboards are drawn each turn: buffered (default), ansi (redraw changed cells only) or null")
+    parser.add_argument("--rows",type=int,default=10,help="gameboard rows")
+    parser.add_argument("--columns",type=int,default=10,help="gameboard columns")
+    parser.add_argument("--fleet",type=parseFleet,default=defaultFleet,help="ship sizes, e.g. 5,4,3*2,2*4 (default: 1,1,2,2,3,4,5)")
+    parser.add_argument("--seed",type=int,default=None,help="seed the NPC so a game can be replayed")
+    parser.add_argument("--script",default=None,help="read every answer from this file, one line per prompt, instead of the terminal")
+    parser.add_argument("--record",default=None,help="append this game's seed and answers to this JSON lines file, see sessions.py")
+    parser.add_argument("--layouts",default=None,help="NPCs draw their fleets from this layout library, see placement.py")
+    parser.add_argument("--salvo",action="store_true",help="salvo variant: fire one shot per ship you have afloat each turn")
+    args = parser.parse_args()
+
+    seed = args.seed
+    if seed is None and args.record:
+        seed = random.randrange(1 << 32)
+    if seed is not None:
+        random.seed(seed)
+    if args.script:
+        with open(args.script) as scriptFile:
+            inputSource = playerinput.scriptedInput(scriptFile.readlines(),echo=True)
+    else:
+        inputSource = playerinput.consoleInput()
+    if args.record:
+        inputSource = playerinput.recordingInput(inputSource)
+
+    print("=======================================================================================================")
+    print("Welcome to Battleship!  This is a game where you and an opponent take turns firing at each other's ship.")
+    print("=======================================================================================================")
+
+    layouts = None
+    if args.layouts:
+        try:
+            layouts = loadLayoutLibrary(args.layouts,args.fleet)
+        except ValueError as error:
+            parser.error(str(error))
+    winner = startGame(args.rows,args.columns,args.fleet,renderer.RENDERERS[args.renderer](),inputSource,layouts,
+                       args.salvo)
+
+    if args.record:
+        with open(args.record,"a") as recordFile:
+            record = {"seed":seed,"rows":args.rows,"columns":args.columns,"fleet":list(args.fleet),
+                      "inputs":inputSource.lines,"winner":winner}
+            if args.salvo:
+                record["salvo"] = True
+            recordFile.write(json.dumps(record)+"\n")
 
 if __name__ == '__main__':
     main()
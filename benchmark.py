@@ -0,0 +1,322 @@
+"""
+benchmark.py
+Benchmark suite for the game's hot paths: NPC setup, Gameboard.addShip, Gameboard.fireAtTarget, Gameboard.fork,
+autoFireAtTarget decisions, printGameboard rendering and full headless games.  Every case runs from fixed seeds, results are stored as
+JSON, and the compare command flags cases that got slower than a threshold.
+
+    python benchmark.py run --output baseline.json
+    python benchmark.py compare baseline.json current.json --threshold 0.10
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import sys
+import time
+
+import battleship
+import density
+import simulation
+
+# Each benchmark case is a pair of functions.  prepare(operations) builds whatever the case needs outside of the timed
+# region and run(state) does the timed work, returning the number of operations it performed.
+
+def prepareNothing(operations):
+    """
+    prepareNothing() is the prepare function for cases that need no inputs.
+    :param operations: Integer number of operations.
+    :return: The number of operations unchanged.
+    """
+    return operations
+
+def runSetup(operations):
+    """
+    runSetup() sets up NPC gameboards.
+    :param operations: Integer number of gameboards.
+    :return: Integer number of gameboards set up.
+    """
+    for i in range(operations):
+        battleship.autoGameboardSetup(1)
+    return operations
+
+def prepareAddShip(operations):
+    """
+    prepareAddShip() draws the fleets for runAddShip().
+    :param operations: Integer number of fleets.
+    :return: List of fleets from battleship.sampleFleet().
+    """
+    return [battleship.sampleFleet(battleship.defaultFleet) for i in range(operations)]
+
+def runAddShip(fleets):
+    """
+    runAddShip() adds whole fleets to empty gameboards, one addShip() call per ship.
+    :param fleets: List of fleets from battleship.sampleFleet().
+    :return: Integer number of addShip() calls.
+    """
+    for fleet in fleets:
+        gameboard = battleship.Gameboard(1)
+        for coordinates in fleet:
+            gameboard.addShip(coordinates)
+    return len(fleets)*len(battleship.defaultFleet)
+
+def prepareFireAtTarget(operations):
+    """
+    prepareFireAtTarget() sets up the gameboards and the firing order for runFireAtTarget().
+    :param operations: Integer number of gameboards.
+    :return: Tuple of (list of Gameboard instances, list of targets).
+    """
+    order = list(battleship.cellCoordinates)
+    random.shuffle(order)
+    # Firing at the first cell again at the end covers "Repeat" as well.
+    order.append(order[0])
+    return [battleship.autoGameboardSetup(1) for i in range(operations)],order
+
+def runFireAtTarget(state):
+    """
+    runFireAtTarget() fires at every cell of NPC gameboards in a random order.
+    :param state: Tuple of (list of Gameboard instances, list of targets).
+    :return: Integer number of fireAtTarget() calls.
+    """
+    gameboards,order = state
+    for gameboard in gameboards:
+        for target in order:
+            gameboard.fireAtTarget(target)
+    return len(gameboards)*len(order)
+
+def prepareFork(operations):
+    """
+    prepareFork() sets up a gameboard part way through a game and the cells fired at on its forks.
+    :param operations: Integer number of forks.
+    :return: Tuple of (Gameboard instance, list of targets).
+    """
+    gameboard = battleship.autoGameboardSetup(1)
+    order = list(battleship.cellCoordinates)
+    random.shuffle(order)
+    for target in order[:40]:
+        gameboard.fireAtTarget(target)
+    return gameboard,[order[40+i%60] for i in range(operations)]
+
+def runFork(state):
+    """
+    runFork() forks a gameboard and fires one shot at each fork, so the copy made on the first change is timed too.
+    :param state: Tuple of (Gameboard instance, list of targets).
+    :return: Integer number of forks.
+    """
+    gameboard,targets = state
+    for target in targets:
+        gameboard.fork().fireAtTarget(target)
+    return len(targets)
+
+def prepareFleets(operations):
+    """
+    prepareFleets() sets up the NPC gameboards for the NPCs to sink.
+    :param operations: Integer number of gameboards.
+    :return: List of Gameboard instances.
+    """
+    return [battleship.autoGameboardSetup(2) for i in range(operations)]
+
+def runAutoFireAtTarget(targetGameboards):
+    """
+    runAutoFireAtTarget() lets the hunt/target NPC sink whole fleets.
+    :param targetGameboards: List of Gameboard instances to sink.
+    :return: Integer number of autoFireAtTarget() calls.
+    """
+    decisions = 0
+    for targetGameboard in targetGameboards:
+        aggressorGameboard = battleship.Gameboard(1)
+        aggressorQueue = battleship.targetFrontier()
+        while targetGameboard.remainingShips > 0:
+            battleship.autoFireAtTarget(aggressorGameboard,aggressorQueue,targetGameboard,verbose=False)
+            decisions += 1
+    return decisions
+
+def runDensityFireAtTarget(targetGameboards):
+    """
+    runDensityFireAtTarget() lets the density NPC sink whole fleets.
+    :param targetGameboards: List of Gameboard instances to sink.
+    :return: Integer number of densityFireAtTarget() calls.
+    """
+    decisions = 0
+    for targetGameboard in targetGameboards:
+        aggressorGameboard = battleship.Gameboard(1)
+        aggressorMap = density.densityMap()
+        while targetGameboard.remainingShips > 0:
+            density.densityFireAtTarget(aggressorGameboard,aggressorMap,targetGameboard,verbose=False)
+            decisions += 1
+    return decisions
+
+def preparePrintGameboard(operations):
+    """
+    preparePrintGameboard() plays part of a game so both grids of the rendered gameboard have shots on them.
+    :param operations: Integer number of renders.
+    :return: Tuple of (Gameboard instance, number of renders).
+    """
+    gameboard = battleship.autoGameboardSetup(1)
+    opponentGameboard = battleship.autoGameboardSetup(2)
+    gameboardQueue = battleship.targetFrontier()
+    opponentQueue = battleship.targetFrontier()
+    # Fill in both grids with 40 shots each way.
+    for i in range(40):
+        battleship.autoFireAtTarget(gameboard,gameboardQueue,opponentGameboard,verbose=False)
+        battleship.autoFireAtTarget(opponentGameboard,opponentQueue,gameboard,verbose=False)
+    return gameboard,operations
+
+def runPrintGameboard(state):
+    """
+    runPrintGameboard() renders a gameboard part way through a game into an in-memory buffer so terminal speed
+    doesn't count.
+    :param state: Tuple of (Gameboard instance, number of renders).
+    :return: Integer number of renders.
+    """
+    gameboard,operations = state
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(operations):
+            gameboard.printGameboard()
+    return operations
+
+def prepareSeeds(operations):
+    """
+    prepareSeeds() draws the per-game seeds for runHeadlessGame().
+    :param operations: Integer number of games.
+    :return: List of integer seeds.
+    """
+    return [random.getrandbits(64) for i in range(operations)]
+
+def runHeadlessGame(seeds):
+    """
+    runHeadlessGame() plays full headless 0-player games, setup included.
+    :param seeds: List of integer seeds, one per game.
+    :return: Integer number of games.
+    """
+    for seed in seeds:
+        simulation.playHeadlessGame(seed)
+    return len(seeds)
+
+# Benchmark cases: name -> (prepare function, run function, operations per repeat).
+CASES = {"autoGameboardSetup":(prepareNothing,runSetup,200),
+         "Gameboard.addShip":(prepareAddShip,runAddShip,200),
+         "Gameboard.fireAtTarget":(prepareFireAtTarget,runFireAtTarget,50),
+         "Gameboard.fork":(prepareFork,runFork,500),
+         "autoFireAtTarget":(prepareFleets,runAutoFireAtTarget,20),
+         "densityFireAtTarget":(prepareFleets,runDensityFireAtTarget,5),
+         "printGameboard":(preparePrintGameboard,runPrintGameboard,50),
+         "headlessGame":(prepareSeeds,runHeadlessGame,10)}
+
+def percentile(sortedValues,fraction):
+    """
+    percentile() reads a percentile from sorted values using the nearest rank.
+    :param sortedValues: Sorted list of numbers.
+    :param fraction: Float from 0-1.
+    :return: The value at that rank.
+    """
+    return sortedValues[min(len(sortedValues)-1,int(fraction*len(sortedValues)))]
+
+def runCase(name,repeats,seed):
+    """
+    runCase() times one benchmark case.  Each repeat reseeds the RNG from the base seed so every run does the same work,
+    and the percentiles are taken over the per-operation time of each repeat.
+    :param name: String key into CASES.
+    :param repeats: Integer number of timed repeats.
+    :param seed: Integer base seed.
+    :return: Dictionary of statistics in seconds per operation.
+    """
+    prepare,run,operations = CASES[name]
+    samples = []
+    for repeat in range(repeats):
+        random.seed(seed*1000003+repeat)
+        state = prepare(operations)
+        start = time.perf_counter()
+        performed = run(state)
+        samples.append((time.perf_counter()-start)/performed)
+    samples.sort()
+    mean = sum(samples)/len(samples)
+    return {"mean":mean,
+            "p50":percentile(samples,0.5),
+            "p90":percentile(samples,0.9),
+            "p99":percentile(samples,0.99),
+            "opsPerSecond":1/mean,
+            "repeats":repeats}
+
+def runSuite(repeats=20,seed=0,cases=None):
+    """
+    runSuite() times every benchmark case.
+    :param repeats: Integer number of timed repeats per case.
+    :param seed: Integer base seed.
+    :param cases: Optional list of case names, defaults to every case.
+    :return: Dictionary with run metadata and the statistics per case.
+    """
+    results = {}
+    for name in cases or CASES:
+        results[name] = runCase(name,repeats,seed)
+    return {"python":platform.python_version(),
+            "platform":platform.platform(),
+            "seed":seed,
+            "timestamp":time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "cases":results}
+
+def compareResults(baseline,current,threshold,statistic="p50"):
+    """
+    compareResults() compares the time per operation of two benchmark runs.
+    :param baseline: Dictionary returned by runSuite().
+    :param current: Dictionary returned by runSuite().
+    :param threshold: Float, the relative slowdown that counts as a regression (0.1 is 10% slower).
+    :param statistic: String, which statistic to compare.  The median is the default as it shrugs off the odd slow repeat.
+    :return: List of (case, baseline time, current time, relative change, regressed) tuples.
+    """
+    rows = []
+    for name,stats in current["cases"].items():
+        if name not in baseline["cases"]:
+            continue
+        before = baseline["cases"][name][statistic]
+        change = stats[statistic]/before-1
+        rows.append((name,before,stats[statistic],change,change > threshold))
+    return rows
+
+def printResults(suite):
+    """
+    printResults() prints a table of benchmark statistics.
+    :param suite: Dictionary returned by runSuite().
+    :return: None.
+    """
+    print("{:<24}{:>12}{:>12}{:>12}{:>12}{:>14}".format("case","mean us","p50 us","p90 us","p99 us","ops/sec"))
+    for name,stats in suite["cases"].items():
+        print("{:<24}{:>12.2f}{:>12.2f}{:>12.2f}{:>12.2f}{:>14.0f}".format(
+            name,stats["mean"]*1e6,stats["p50"]*1e6,stats["p90"]*1e6,stats["p99"]*1e6,stats["opsPerSecond"]))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Battleship hot paths.")
+    commands = parser.add_subparsers(dest="command",required=True)
+    runParser = commands.add_parser("run",help="run the suite")
+    runParser.add_argument("--repeats",type=int,default=20,help="timed repeats per case")
+    runParser.add_argument("--seed",type=int,default=0,help="base seed")
+    runParser.add_argument("--case",action="append",choices=sorted(CASES),help="only run this case (repeatable)")
+    runParser.add_argument("--output",default=None,help="write the results to this JSON file")
+    compareParser = commands.add_parser("compare",help="compare two result files")
+    compareParser.add_argument("baseline",help="JSON file from an earlier run")
+    compareParser.add_argument("current",help="JSON file from the run being checked")
+    compareParser.add_argument("--threshold",type=float,default=0.10,help="relative slowdown counted as a regression")
+    compareParser.add_argument("--statistic",choices=["mean","p50","p90","p99"],default="p50",help="statistic to compare")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        suite = runSuite(args.repeats,args.seed,args.case)
+        printResults(suite)
+        if args.output:
+            with open(args.output,"w") as outputFile:
+                json.dump(suite,outputFile,indent=2)
+    else:
+        with open(args.baseline) as baselineFile:
+            baseline = json.load(baselineFile)
+        with open(args.current) as currentFile:
+            current = json.load(currentFile)
+        rows = compareResults(baseline,current,args.threshold,args.statistic)
+        print("{:<24}{:>12}{:>12}{:>10}".format("case","before us","after us","change"))
+        for name,before,after,change,regressed in rows:
+            print("{:<24}{:>12.2f}{:>12.2f}{:>+9.1%}{}".format(name,before*1e6,after*1e6,change,"  REGRESSION" if regressed else ""))
+        if any(i[4] for i in rows):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""
+bitboard.py
+Bitboard backed Gameboard.  Every coordinate (row,column) maps to bit row*columns+column of an integer, so overlap
+checks, hit tests and the "all ships sunk" test are single bit operations instead of dictionary lookups.  The masks are
+as wide as the gameboard, so on very large gameboards the dictionary backed Gameboard is the better choice.
+"""
+from array import array
+
+from battleship import Gameboard,gameboardGeometry,defaultFleet,firedOnMap,volleyResult
+
+def coordinateToBit(coordinate,columns=10):
+    """
+    coordinateToBit() converts a numeric coordinate into its single bit mask.
+    :param coordinate: Tuple of row and column indices.
+    :param columns: Integer number of columns on the gameboard.
+    :return: Integer with only the coordinate's bit set.
+    """
+    return 1 << (coordinate[0]*columns+coordinate[1])
+
+def coordinatesToMask(listOfCoordinates,columns=10):
+    """
+    coordinatesToMask() combines a list of numeric coordinates into a single bit mask.
+    :param listOfCoordinates: List of tuples of row and column indices.
+    :param columns: Integer number of columns on the gameboard.
+    :return: Integer with the bit of every coordinate set.
+    """
+    mask = 0
+    for i in listOfCoordinates:
+        mask |= 1 << (i[0]*columns+i[1])
+    return mask
+
+class BitboardGameboard(Gameboard):
+    """
+    BitboardGameboard class keeps the Gameboard contract (addShip, validShipLocation, fireAtTarget, printGameboard,
+    firedOn and remainingShips) but stores ship occupancy, hits and misses as bit masks.
+    """
+    __slots__ = ("shipMask","hits","misses","shipMasks","shipSizes","shipAt")
+
+    def __init__(self,player,rows=10,columns=10,fleet=None):
+        # Player name.
+        self.player = player
+        self.rows = rows
+        self.columns = columns
+        self.geometry = gameboardGeometry(rows,columns)
+        self.fleet = tuple(defaultFleet if fleet is None else fleet)
+        # firedOn is still a map of coordinates as it's written to by whoever is firing from this gameboard.
+        self.firedOn = firedOnMap(self.geometry)
+        self.remainingShips = 0
+        # Union of every ship's cells.
+        self.shipMask = 0
+        # Cells of a ship struck by the opponent.
+        self.hits = 0
+        # Cells the opponent fired at and missed.
+        self.misses = 0
+        # One mask per ship, indexed by ship number.
+        self.shipMasks = []
+        self.shipSizes = []
+        # shipAt maps a bit index to the ship number occupying it so a hit finds its ship without searching.  Entries
+        # for cells without a ship are never read.
+        self.shipAt = array("H",[0])*self.geometry.cells
+        # Copy-on-write flags, see Gameboard.fork().  Only the ship lists are ever changed in place; the masks are ints.
+        self.sharedBoard = False
+        self.sharedFiredOn = False
+
+    def validShipLocation(self,listOfCoordinates):
+        """
+        Determines if a ship can be placed at these coordinates.
+        :param listOfCoordinates: List of potential coordinates for a new ship.
+        :return: True if we can place the ship, false otherwise (coordinate is occupied by another ship).
+        """
+        return not (coordinatesToMask(listOfCoordinates,self.columns) & self.shipMask)
+
+    def addShip(self,listOfCoordinates):
+        """
+        Adds a new ship at the provided list of coordinates.
+        :param listOfCoordinates: List of coordinates for the new ship.
+        :return: True if successful, false otherwise.
+        """
+        mask = coordinatesToMask(listOfCoordinates,self.columns)
+        if mask & self.shipMask:
+            return False
+        if self.sharedBoard:
+            self.ownBoard()
+        shipNumber = len(self.shipMasks)
+        self.shipMasks.append(mask)
+        self.shipSizes.append(len(listOfCoordinates))
+        self.shipMask |= mask
+        for i in listOfCoordinates:
+            self.shipAt[i[0]*self.columns+i[1]] = shipNumber
+        self.remainingShips += 1
+        return True
+
+    def fireAtTarget(self,target):
+        """
+        Handles actions by your opponent on your gameboard.  Target represents the coordinate they want to fire at.
+        :param target: Coordinate representing the target.  Tuple of row and column indices.
+        :return: String representing the result of the action or an integer representing the ship's size if it sank.
+        "Hit" if it hit a ship, "Miss" if it didn't hit a ship, or "Repeat" if the user has already fired at this spot.
+        """
+        # Only ints change here, so a shared gameboard doesn't need to copy anything.
+        index = target[0]*self.columns+target[1]
+        bit = 1 << index
+        if (self.hits | self.misses) & bit:
+            return "Repeat"
+        if not (self.shipMask & bit):
+            self.misses |= bit
+            return "Miss"
+        self.hits |= bit
+        shipNumber = self.shipAt[index]
+        # The ship sank if none of its cells are left un-hit.
+        if not (self.shipMasks[shipNumber] & ~self.hits):
+            self.remainingShips -= 1
+            return self.shipSizes[shipNumber]
+        return "Hit"
+
+    def fireCells(self,cells):
+        """
+        Handles a salvo by your opponent, see Gameboard.fireVolley().  The masks are kept in locals through the salvo
+        and stored once at the end.
+        :param cells: List of integer cell indices.
+        :return: volleyResult instance.
+        """
+        self.checkVolley(cells)
+        previous = self.hits | self.misses
+        hits = self.hits
+        shipMask = self.shipMask
+        shipMasks = self.shipMasks
+        shipAt = self.shipAt
+        # Cells of this salvo so far.  Cells listed twice are dropped.
+        volleyMask = 0
+        distinct = []
+        results = []
+        repeats = 0
+        sunk = []
+        for cell in cells:
+            bit = 1 << cell
+            if volleyMask & bit:
+                continue
+            volleyMask |= bit
+            distinct.append(cell)
+            if previous & bit:
+                results.append("Repeat")
+                repeats += 1
+            elif shipMask & bit:
+                hits |= bit
+                shipNumber = shipAt[cell]
+                if shipMasks[shipNumber] & ~hits:
+                    results.append("Hit")
+                else:
+                    sunk.append(self.shipSizes[shipNumber])
+                    results.append(sunk[-1])
+            else:
+                results.append("Miss")
+        newHits = (hits & ~self.hits).bit_count()
+        self.hits = hits
+        self.misses |= volleyMask & ~shipMask
+        self.remainingShips -= len(sunk)
+        return volleyResult(self.geometry,distinct,results,newHits,repeats,sunk)
+
+    def ownBoard(self):
+        """
+        Give this gameboard its own copy of the ship lists before changing them.
+        :return: None.
+        """
+        self.shipMasks = list(self.shipMasks)
+        self.shipSizes = list(self.shipSizes)
+        self.shipAt = self.shipAt[:]
+        self.sharedBoard = False
+
+    def shipLayout(self):
+        """
+        Identify the coordinates of every ship on the gameboard, hit or not.
+        :return: List of coordinate lists, one per ship in the order they were added.
+        """
+        return [[divmod(i,self.columns) for i in range(self.geometry.cells) if mask >> i & 1] for mask in self.shipMasks]
+
+    def allShipsSunk(self):
+        """
+        Determines if every ship on this gameboard has been sunk.
+        :return: True if every ship cell has been hit, false otherwise.
+        """
+        return not (self.shipMask & ~self.hits)
+
+    def boardSymbol(self,coordinate):
+        """
+        Identify how a coordinate on your own gameboard should be displayed.
+        :param coordinate: Tuple of row and column indices.
+        :return: String representing the coordinate.
+        """
+        bit = coordinateToBit(coordinate,self.columns)
+        if self.shipMask & bit:
+            if self.hits & bit:
+                return "[#]"
+            return "[ ]"
+        if self.misses & bit:
+            return " O "
+        return "   "
@@ -0,0 +1,204 @@
+"""
+density.py
+Probability density NPC.  For every cell the NPC keeps a count of how many placements of the ships it hasn't sunk yet
+would cover that cell without crossing a miss or a ship it already sank.  Counts are updated incrementally from each
+result of Gameboard.fireAtTarget(), so a shot only touches the placements through the cell that was fired at.
+"""
+import argparse
+import json
+import random
+import time
+
+import battleship
+import instrumentation
+
+# placementCells[size] is a list of cell tuples, one per legal placement.  coveringPlacements[size][cell] lists the
+# indices into placementCells[size] of every placement covering that cell.  Built lazily by placementIndex().
+placementCells = {}
+coveringPlacements = {}
+
+def placementIndex(shipSize):
+    """
+    placementIndex() converts battleship.shipPlacements() into cell tuples plus a per-cell index of covering placements.
+    :param shipSize: Integer representing the ship size.
+    :return: Tuple of (list of placement cell tuples, list of covering placement index lists per cell).
+    """
+    if shipSize not in placementCells:
+        cells = [tuple(battleship.numCoordToCell(i) for i in coordinates)
+                 for coordinates,mask in battleship.shipPlacements(shipSize)]
+        covering = [[] for cell in range(100)]
+        for index,placement in enumerate(cells):
+            for cell in placement:
+                covering[cell].append(index)
+        placementCells[shipSize] = cells
+        coveringPlacements[shipSize] = covering
+    return placementCells[shipSize],coveringPlacements[shipSize]
+
+class densityMap:
+    """
+    densityMap class is an NPC's picture of the opponent's gameboard: the remaining fleet, which placements are still
+    possible, and the resulting placement count for every cell.
+    """
+    def __init__(self,fleet=battleship.defaultFleet,rng=None):
+        # Ties are broken with rng, a random.Random instance, or the random module if none is given.
+        self.rng = random if rng is None else rng
+        # remaining[size] is the number of ships of that size not sunk yet.
+        self.remaining = {}
+        for shipSize in fleet:
+            self.remaining[shipSize] = self.remaining.get(shipSize,0)+1
+        # valid[size][index] is 1 while placement index of that size doesn't cross a miss or a sunk ship.
+        self.valid = {}
+        # counts[cell] is the number of placements of remaining ships covering the cell, weighted by ships per size.
+        self.counts = [0]*100
+        for shipSize,ships in self.remaining.items():
+            cells,covering = placementIndex(shipSize)
+            self.valid[shipSize] = bytearray(b"\x01")*len(cells)
+            for cell in range(100):
+                self.counts[cell] += ships*len(covering[cell])
+        # fired[cell] is 1 once the NPC has fired at the cell.
+        self.fired = bytearray(100)
+        # Hits that don't belong to a ship known to have sunk.
+        self.openHits = set()
+
+    def block(self,cell):
+        """
+        Rule out every placement through a cell that can't hold an unsunk ship (a miss or part of a sunk ship).
+        :param cell: Integer cell index.
+        :return: None.
+        """
+        for shipSize,ships in self.remaining.items():
+            cells,covering = placementIndex(shipSize)
+            valid = self.valid[shipSize]
+            for index in covering[cell]:
+                if valid[index]:
+                    valid[index] = 0
+                    if ships:
+                        for i in cells[index]:
+                            self.counts[i] -= ships
+
+    def sinkShip(self,cell,shipSize):
+        """
+        Record that the shot at a cell sank a ship of the given size.  The ship's cells are taken to be a still valid
+        placement through the cell made up entirely of open hits; those cells are then blocked.
+        :param cell: Integer cell index of the sinking shot.
+        :param shipSize: Integer size reported by Gameboard.fireAtTarget().
+        :return: None.
+        """
+        cells,covering = placementIndex(shipSize)
+        valid = self.valid[shipSize]
+        sunkCells = (cell,)
+        for index in covering[cell]:
+            if valid[index] and all(i in self.openHits for i in cells[index]):
+                sunkCells = cells[index]
+                break
+        # One fewer ship of this size now contributes to every placement that's still valid.
+        self.remaining[shipSize] -= 1
+        for index,placement in enumerate(cells):
+            if valid[index]:
+                for i in placement:
+                    self.counts[i] -= 1
+        for i in sunkCells:
+            self.openHits.discard(i)
+            self.block(i)
+
+    def recordResult(self,cell,result):
+        """
+        Update the map with the result of a shot.
+        :param cell: Integer cell index fired at.
+        :param result: Result from Gameboard.fireAtTarget().
+        :return: None.
+        """
+        if result == "Repeat":
+            return
+        self.fired[cell] = 1
+        if result == "Miss":
+            self.block(cell)
+        else:
+            self.openHits.add(cell)
+            if isinstance(result,int):
+                self.sinkShip(cell,result)
+
+    def chooseTarget(self):
+        """
+        Choose the next cell to fire at.  While there are open hits, score unfired cells by the placements that pass
+        through them and through open hits (target mode).  Otherwise pick the unfired cell with the highest count (hunt
+        mode).  Ties are broken at random.
+        :return: Integer cell index.
+        """
+        fired = self.fired
+        scores = {}
+        for hit in self.openHits:
+            for shipSize,ships in self.remaining.items():
+                if not ships:
+                    continue
+                cells,covering = placementIndex(shipSize)
+                valid = self.valid[shipSize]
+                for index in covering[hit]:
+                    if valid[index]:
+                        placement = cells[index]
+                        # Placements through several open hits are much more likely to be the actual ship.
+                        weight = ships*len(self.openHits.intersection(placement))**2
+                        for i in placement:
+                            if not fired[i]:
+                                scores[i] = scores.get(i,0)+weight
+        if not scores:
+            counts = self.counts
+            scores = {cell:counts[cell] for cell in range(100) if not fired[cell]}
+        best = max(scores.values())
+        return self.rng.choice([cell for cell,score in scores.items() if score == best])
+
+def densityFireAtTarget(aggressorGameboard,aggressorMap,targetGameboard,verbose=True):
+    """
+    densityFireAtTarget() is a drop-in replacement for battleship.autoFireAtTarget() that picks targets from a
+    densityMap instead of a targetFrontier.
+    :param aggressorGameboard: Gameboard instance for the aggressor.
+    :param aggressorMap: densityMap instance for the aggressor.
+    :param targetGameboard: Gameboard instance for the target.
+    :param verbose: Boolean, print the shot and its outcome when True.
+    :return: Tuple of the numeric coordinate fired at and the result from Gameboard.fireAtTarget().
+    """
+    if instrumentation.enabled:
+        instrumentation.enterPhase("npc")
+    target = aggressorMap.chooseTarget()
+    targetBoardCoord = battleship.cellCoordinates[target]
+    result = battleship.resolveFireAtTarget(targetBoardCoord,aggressorGameboard,targetGameboard)
+    aggressorMap.recordResult(target,result)
+    if instrumentation.enabled:
+        instrumentation.exitPhase()
+    if verbose:
+        print("Player "+str(aggressorGameboard.player)+" is firing at "+battleship.cellLabels[target]+"!")
+        battleship.printFireResult(result)
+    return targetBoardCoord,result
+
+def benchmarkDensity(games,seed=0):
+    """
+    benchmarkDensity() times the density NPC sinking a full fleet on freshly set up gameboards.
+    :param games: Integer number of games.
+    :param seed: Integer seed.
+    :return: Dictionary with the mean milliseconds and shots per game.
+    """
+    random.seed(seed)
+    shots = 0
+    elapsed = 0.0
+    for game in range(games):
+        aggressorGameboard = battleship.Gameboard(1)
+        targetGameboard = battleship.autoGameboardSetup(2)
+        start = time.perf_counter()
+        aggressorMap = densityMap()
+        while targetGameboard.remainingShips > 0:
+            densityFireAtTarget(aggressorGameboard,aggressorMap,targetGameboard,verbose=False)
+            shots += 1
+        elapsed += time.perf_counter()-start
+    return {"games":games,
+            "msPerGame":round(elapsed/games*1000,3),
+            "meanShots":round(shots/games,2)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the probability density NPC.")
+    parser.add_argument("--games",type=int,default=200,help="number of fleets to sink")
+    parser.add_argument("--seed",type=int,default=0,help="seed for reproducible runs")
+    args = parser.parse_args()
+    print(json.dumps(benchmarkDensity(args.games,args.seed),indent=2))
+
+if __name__ == '__main__':
+    main()
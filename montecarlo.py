@@ -0,0 +1,258 @@
+"""
+montecarlo.py
+Monte Carlo NPC.  Every turn the NPC reads the misses and hits in its firedOn and samples many random fleets consistent
+with them and with the ships it has sunk: each sunk ship lies on hits through the cell that sank it, every other hit is
+covered by a ship still afloat, and no ship crosses a miss.  It fires at the unfired cell covered by the most sampled
+fleets.
+
+Fleets are built one ship at a time, each drawn uniformly from the placements that still fit, so every sample is
+consistent with what's been seen but layouts aren't weighted exactly as a uniform draw over all consistent fleets would.
+"""
+import argparse
+import json
+import random
+import time
+
+import battleship
+import instrumentation
+
+# Placement tables per (rows, columns, ship size), see placementTable().
+placementTables = {}
+
+def placementTable(geometry,shipSize):
+    """
+    placementTable() lists every placement of a ship on a gameboard as cell tuples, plus a per-cell index of the
+    placements covering it.
+    :param geometry: boardGeometry of the gameboard.
+    :param shipSize: Integer representing the ship size.
+    :return: Tuple of (list of placement cell tuples, list of covering placement index lists per cell).
+    """
+    key = (geometry.rows,geometry.columns,shipSize)
+    if key not in placementTables:
+        rows = geometry.rows
+        columns = geometry.columns
+        cells = [tuple(row*columns+column+i for i in range(shipSize))
+                 for row in range(rows) for column in range(columns-shipSize+1)]
+        # A single cell ship is the same placement either way round.
+        if shipSize > 1:
+            cells += [tuple((row+i)*columns+column for i in range(shipSize))
+                      for row in range(rows-shipSize+1) for column in range(columns)]
+        covering = [[] for cell in range(geometry.cells)]
+        for index,placement in enumerate(cells):
+            for cell in placement:
+                covering[cell].append(index)
+        placementTables[key] = (cells,covering)
+    return placementTables[key]
+
+# Cell states read from firedOn by fleetSampler.
+UNKNOWN = 0
+MISS = 1
+HIT = 2
+
+class fleetSampler:
+    """
+    fleetSampler class is an NPC's record of the ships it has sunk and a sampler of the fleets still consistent with
+    them and its firedOn.
+    """
+    def __init__(self,fleet=battleship.defaultFleet,samples=100,rng=None,geometry=None):
+        """
+        :param fleet: List of ship sizes the opponent placed.
+        :param samples: Integer number of fleets sampled per shot.
+        :param rng: random.Random instance fleets and ties are drawn from, defaults to the random module.
+        :param geometry: boardGeometry of the gameboard being fired at, defaults to the standard gameboard.
+        """
+        self.rng = random if rng is None else rng
+        self.geometry = geometry or battleship.standardGeometry
+        # Sizes of the ships still afloat.
+        self.remaining = sorted(fleet,reverse=True)
+        self.samples = samples
+        # sinks holds a (cell, ship size, shot number) tuple for every shot that sank a ship.
+        self.sinks = []
+        # hitShots[cell] is the shot number that hit the cell.  A sunk ship's other cells were hit before it sank.
+        self.hitShots = {}
+        self.shots = 0
+
+    def recordResult(self,cell,result):
+        """
+        Note the result of a shot.  Misses and hits are read back from firedOn, only the order of hits and which shots
+        sank a ship are kept here.
+        :param cell: Integer cell index fired at.
+        :param result: Result from Gameboard.fireAtTarget().
+        :return: None.
+        """
+        self.shots += 1
+        if result == "Hit" or isinstance(result,int):
+            self.hitShots[cell] = self.shots
+        if isinstance(result,int):
+            self.sinks.append((cell,result,self.shots))
+            self.remaining.remove(result)
+
+    def readFiredOn(self,firedOn):
+        """
+        Turn firedOn into a cell state per cell.
+        :param firedOn: The aggressor's Gameboard.firedOn.
+        :return: bytearray of UNKNOWN, MISS or HIT per cell.
+        """
+        if isinstance(firedOn,battleship.cellMap):
+            # cellMap already stores 0, 1 for "O" and 2 for "X".
+            return bytearray(firedOn.cells)
+        status = bytearray(self.geometry.cells)
+        columns = self.geometry.columns
+        for (row,column),value in firedOn.items():
+            status[row*columns+column] = HIT if value == "X" else MISS
+        return status
+
+    def candidates(self,status):
+        """
+        Filter the placements that fit the cell states, once per turn, so sampleFleet() only has to check overlaps.
+        :param status: bytearray from readFiredOn().
+        :return: Tuple of (list of (sunk ship placements) per sink, list of hit cells, dictionary mapping a hit cell to
+        its (ship size, placement) options for ships still afloat).
+        """
+        hitShots = self.hitShots
+        sinkOptions = []
+        for cell,shipSize,shot in self.sinks:
+            cells,covering = placementTable(self.geometry,shipSize)
+            sinkOptions.append([cells[index] for index in covering[cell]
+                                if all(status[i] == HIT and hitShots.get(i,shot) <= shot for i in cells[index])])
+        hits = [cell for cell,state in enumerate(status) if state == HIT]
+        hitOptions = {}
+        for hit in hits:
+            options = []
+            for shipSize in set(self.remaining):
+                cells,covering = placementTable(self.geometry,shipSize)
+                for index in covering[hit]:
+                    placement = cells[index]
+                    # A ship still afloat can't cross a miss and must have a cell left that hasn't been fired at.
+                    if MISS not in (status[i] for i in placement) and UNKNOWN in (status[i] for i in placement):
+                        options.append((shipSize,placement))
+            hitOptions[hit] = options
+        return sinkOptions,hits,hitOptions
+
+    def sampleFleet(self,status,candidates):
+        """
+        Draw one fleet consistent with the cell states and the sinks.  Sunk ships are placed first, each on hits only,
+        through the cell that sank it and on no cell hit after it sank.  Then ships still afloat are placed through
+        every hit not yet covered, and finally the rest of the afloat ships anywhere clear of misses and hits.
+        :param status: bytearray from readFiredOn().
+        :param candidates: Tuple from candidates().
+        :return: List of cell tuples, one per afloat ship, or None if this attempt couldn't fit the fleet.
+        """
+        rng = self.rng
+        sinkOptions,hits,hitOptions = candidates
+        occupied = bytearray(len(status))
+        order = list(range(len(sinkOptions)))
+        rng.shuffle(order)
+        for sink in order:
+            options = [placement for placement in sinkOptions[sink] if not any(occupied[i] for i in placement)]
+            if not options:
+                return None
+            for i in rng.choice(options):
+                occupied[i] = 1
+        sizes = list(self.remaining)
+        placed = []
+        openHits = list(hits)
+        rng.shuffle(openHits)
+        for hit in openHits:
+            if occupied[hit]:
+                continue
+            options = [(shipSize,placement) for shipSize,placement in hitOptions[hit]
+                       if shipSize in sizes and not any(occupied[i] for i in placement)]
+            if not options:
+                return None
+            shipSize,placement = rng.choice(options)
+            for i in placement:
+                occupied[i] = 1
+            sizes.remove(shipSize)
+            placed.append(placement)
+        for shipSize in sizes:
+            cells,covering = placementTable(self.geometry,shipSize)
+            for attempt in range(20):
+                placement = rng.choice(cells)
+                if not any(occupied[i] or status[i] for i in placement):
+                    for i in placement:
+                        occupied[i] = 1
+                    placed.append(placement)
+                    break
+            else:
+                return None
+        return placed
+
+    def chooseTarget(self,firedOn):
+        """
+        Choose the unfired cell covered by the most sampled fleets.  Ties are broken at random, and a random unfired cell
+        is picked if no fleet could be sampled.
+        :param firedOn: The aggressor's Gameboard.firedOn.
+        :return: Integer cell index.
+        """
+        status = self.readFiredOn(firedOn)
+        candidates = self.candidates(status)
+        counts = [0]*self.geometry.cells
+        for sample in range(self.samples):
+            placed = self.sampleFleet(status,candidates)
+            if placed is not None:
+                for placement in placed:
+                    for i in placement:
+                        counts[i] += 1
+        unfired = [cell for cell,state in enumerate(status) if state == UNKNOWN]
+        best = max(counts[cell] for cell in unfired)
+        return self.rng.choice([cell for cell in unfired if counts[cell] == best])
+
+def monteCarloFireAtTarget(aggressorGameboard,aggressorSampler,targetGameboard,verbose=True):
+    """
+    monteCarloFireAtTarget() is a drop-in replacement for battleship.autoFireAtTarget() that picks targets with a
+    fleetSampler instead of a targetFrontier.
+    :param aggressorGameboard: Gameboard instance for the aggressor.
+    :param aggressorSampler: fleetSampler instance for the aggressor.
+    :param targetGameboard: Gameboard instance for the target.
+    :param verbose: Boolean, print the shot and its outcome when True.
+    :return: Tuple of the numeric coordinate fired at and the result from Gameboard.fireAtTarget().
+    """
+    if instrumentation.enabled:
+        instrumentation.enterPhase("npc")
+    target = aggressorSampler.chooseTarget(aggressorGameboard.firedOn)
+    targetBoardCoord = aggressorSampler.geometry.cellCoordinates[target]
+    result = battleship.resolveFireAtTarget(targetBoardCoord,aggressorGameboard,targetGameboard)
+    aggressorSampler.recordResult(target,result)
+    if instrumentation.enabled:
+        instrumentation.exitPhase()
+    if verbose:
+        print("Player "+str(aggressorGameboard.player)+" is firing at "+aggressorSampler.geometry.cellLabels[target]+"!")
+        battleship.printFireResult(result)
+    return targetBoardCoord,result
+
+def benchmarkMonteCarlo(games,samples=100,seed=0):
+    """
+    benchmarkMonteCarlo() times the Monte Carlo NPC sinking a full fleet on freshly set up gameboards.
+    :param games: Integer number of games.
+    :param samples: Integer number of fleets sampled per shot.
+    :param seed: Integer seed.
+    :return: Dictionary with the mean milliseconds and shots per game.
+    """
+    random.seed(seed)
+    shots = 0
+    elapsed = 0.0
+    for game in range(games):
+        aggressorGameboard = battleship.Gameboard(1)
+        targetGameboard = battleship.autoGameboardSetup(2)
+        start = time.perf_counter()
+        aggressorSampler = fleetSampler(samples=samples)
+        while targetGameboard.remainingShips > 0:
+            monteCarloFireAtTarget(aggressorGameboard,aggressorSampler,targetGameboard,verbose=False)
+            shots += 1
+        elapsed += time.perf_counter()-start
+    return {"games":games,
+            "samples":samples,
+            "msPerGame":round(elapsed/games*1000,3),
+            "meanShots":round(shots/games,2)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Monte Carlo NPC.")
+    parser.add_argument("--games",type=int,default=20,help="number of fleets to sink")
+    parser.add_argument("--samples",type=int,default=100,help="fleets sampled per shot")
+    parser.add_argument("--seed",type=int,default=0,help="seed for reproducible runs")
+    args = parser.parse_args()
+    print(json.dumps(benchmarkMonteCarlo(args.games,args.samples,args.seed),indent=2))
+
+if __name__ == '__main__':
+    main()
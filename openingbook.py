@@ -0,0 +1,332 @@
+"""
+openingbook.py
+Opening book for the hunting NPC.  Until its first hit, autoFireAtTarget() fires at uniformly random cells.  The book
+replaces those shots with the cells most likely to hold a ship given that every earlier book shot missed, worked out
+offline from a large sample of fleets placed by battleship.autoGameboardSetup(), the same placements the NPC faces.  As
+long as every shot has missed there's only one history, so the book is simply a list of cells, one per shot.  The first
+hit leaves the book and the usual hunting takes over.  Every game puts the book through a random symmetry of the
+gameboard, which is equally good as placements are symmetric, so the NPC doesn't open the same way every game.
+
+The book is stored as a small binary table:
+    header   magic (8 bytes), format, rows, columns, depth (uint16 each), version key (32 bytes), little endian
+    cells    depth uint16 cell indices
+The NPC memory-maps it on the first shot it takes from the book, so importing this module or creating the NPC doesn't
+touch the disk.  The version key hashes the format and the build settings.  The NPC never builds a book itself: if the
+file is missing or its key doesn't match, the book strategy plays exactly like the hunting NPC.  Build it with:
+
+    python openingbook.py --samples 100000 --workers 4
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import random
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import battleship
+
+magic = b"BSHPBOOK"
+# Bump when the file layout, the way books are built or the way autoGameboardSetup() places fleets changes, so books
+# built before no longer match.
+formatVersion = 2
+headerFormat = "<8sHHHH32s"
+headerSize = struct.calcsize(headerFormat)
+# Defaults shared by the command line and the NPC, so a book built from the command line is the one the NPC looks for.
+defaultPath = os.path.join(os.path.dirname(os.path.abspath(__file__)),"openingbook.bin")
+defaultDepth = 12
+defaultSamples = 100000
+defaultSeed = 0
+
+def transformCell(cell,symmetry,rows=10,columns=10):
+    """
+    transformCell() maps a cell through one of the symmetries of the gameboard, see battleship.transformLayout().
+    :param cell: Integer cell index.
+    :param symmetry: Integer 0-7.
+    :param rows: Integer number of rows.
+    :param columns: Integer number of columns.
+    :return: Integer cell index.
+    """
+    (row,column), = battleship.transformLayout([[divmod(cell,columns)]],symmetry,rows,columns)[0]
+    return row*columns+column
+
+def sampleOccupancy(seeds,rows=10,columns=10,fleet=None):
+    """
+    sampleOccupancy() places one fleet per seed with battleship.autoGameboardSetup() and keeps only where the ships are.
+    :param seeds: List of integer seeds.
+    :param rows: Integer number of rows.
+    :param columns: Integer number of columns.
+    :param fleet: List of ship sizes, defaults to battleship.defaultFleet.
+    :return: List of integer masks with bit row*columns+column set for every cell holding a ship.
+    """
+    masks = []
+    for seed in seeds:
+        random.seed(seed)
+        mask = 0
+        for coordinates in battleship.autoGameboardSetup(1,rows=rows,columns=columns,fleet=fleet).shipLayout():
+            for row,column in coordinates:
+                mask |= 1 << (row*columns+column)
+        masks.append(mask)
+    return masks
+
+def versionKey(rows=10,columns=10,fleet=None,depth=defaultDepth,samples=defaultSamples,seed=defaultSeed):
+    """
+    versionKey() identifies the book built with these settings.  Only the settings are hashed, so checking a book is
+    cheap.  formatVersion stands in for the placement code.
+    :param rows: Integer number of rows.
+    :param columns: Integer number of columns.
+    :param fleet: List of ship sizes, defaults to battleship.defaultFleet.
+    :param depth: Integer number of shots in the book.
+    :param samples: Integer number of sampled fleets.
+    :param seed: Integer base seed of the sample.
+    :return: 32 byte digest.
+    """
+    fleet = list(battleship.defaultFleet if fleet is None else fleet)
+    settings = [formatVersion,rows,columns,fleet,depth,samples,seed]
+    return hashlib.sha256(json.dumps(settings).encode()).digest()
+
+def buildBook(rows=10,columns=10,fleet=None,depth=defaultDepth,samples=defaultSamples,seed=defaultSeed,workers=1):
+    """
+    buildBook() samples fleets and picks the book greedily: each shot is the cell not fired at yet that the most sampled
+    fleets still consistent with every earlier shot missing have a ship on.  Fleets are dropped from the counts as
+    earlier shots rule them out, so every sampled ship cell is only counted in and out once.
+    :param rows: Integer number of rows.
+    :param columns: Integer number of columns.
+    :param fleet: List of ship sizes, defaults to battleship.defaultFleet.
+    :param depth: Integer number of shots in the book.
+    :param samples: Integer number of sampled fleets.
+    :param seed: Integer base seed of the sample.
+    :param workers: Integer number of worker processes sampling fleets.  1 samples in this process.
+    :return: Tuple of the list of book cells and the list of each shot's hit probability over the sample.
+    """
+    seedGenerator = random.Random(seed)
+    seeds = [seedGenerator.getrandbits(64) for i in range(samples)]
+    sample = partial(sampleOccupancy,rows=rows,columns=columns,fleet=fleet)
+    if workers <= 1:
+        state = random.getstate()
+        try:
+            masks = sample(seeds)
+        finally:
+            random.setstate(state)
+    else:
+        chunkSize = max(1,-(-samples//(workers*4)))
+        masks = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for chunk in executor.map(sample,[seeds[i:i+chunkSize] for i in range(0,samples,chunkSize)]):
+                masks.extend(chunk)
+    cellCount = rows*columns
+    counts = [0]*cellCount
+    for mask in masks:
+        while mask:
+            low = mask & -mask
+            counts[low.bit_length()-1] += 1
+            mask ^= low
+    book = []
+    probabilities = []
+    fired = set()
+    live = masks
+    for shot in range(min(depth,cellCount)):
+        if not live:
+            break
+        cell = max((cell for cell in range(cellCount) if cell not in fired),key=counts.__getitem__)
+        book.append(cell)
+        probabilities.append(counts[cell]/len(live))
+        fired.add(cell)
+        # Fleets with a ship on the cell are inconsistent with it missing.
+        bit = 1 << cell
+        remaining = []
+        for mask in live:
+            if mask & bit:
+                while mask:
+                    low = mask & -mask
+                    counts[low.bit_length()-1] -= 1
+                    mask ^= low
+            else:
+                remaining.append(mask)
+        live = remaining
+    return book,probabilities
+
+def writeBook(path,key,rows,columns,cells):
+    """
+    writeBook() writes a book file, replacing any old one in a single step so readers never see half a book.
+    :param path: String file path.
+    :param key: 32 byte version key from versionKey().
+    :param rows: Integer number of rows.
+    :param columns: Integer number of columns.
+    :param cells: List of book cell indices.
+    :return: None.
+    """
+    temporaryPath = path+"."+str(os.getpid())+".tmp"
+    with open(temporaryPath,"wb") as bookFile:
+        bookFile.write(struct.pack(headerFormat,magic,formatVersion,rows,columns,len(cells),key))
+        bookFile.write(struct.pack("<"+str(len(cells))+"H",*cells))
+    os.replace(temporaryPath,path)
+
+class openingBook:
+    """
+    openingBook class is a book file the NPC reads lazily.  Nothing is read or checked until the first call to cell().
+    A missing or stale book is treated as empty, see available().
+    """
+    def __init__(self,path=defaultPath,rows=10,columns=10,fleet=None,depth=defaultDepth,samples=defaultSamples,
+                 seed=defaultSeed):
+        """
+        :param path: String book file path.
+        :param rows: Integer number of rows.
+        :param columns: Integer number of columns.
+        :param fleet: List of ship sizes the book is built for, defaults to battleship.defaultFleet.
+        :param depth: Integer number of shots in the book.
+        :param samples: Integer number of sampled fleets the book was built from.
+        :param seed: Integer base seed of the sample.
+        """
+        self.path = path
+        self.rows = rows
+        self.columns = columns
+        self.fleet = fleet
+        self.depth = depth
+        self.samples = samples
+        self.seed = seed
+        # Memory-mapped book cells once loaded, empty if there's no valid book.
+        self.cells = None
+        self.memory = None
+
+    def read(self,key):
+        """
+        Map the book file if it exists and matches the version key.
+        :param key: 32 byte version key.
+        :return: True if the book was mapped, False if it's missing or stale.
+        """
+        try:
+            with open(self.path,"rb") as bookFile:
+                memory = mmap.mmap(bookFile.fileno(),0,access=mmap.ACCESS_READ)
+        except (OSError,ValueError):
+            return False
+        if len(memory) >= headerSize:
+            found,version,rows,columns,depth,foundKey = struct.unpack_from(headerFormat,memory,0)
+            if (found,version,rows,columns,foundKey) == (magic,formatVersion,self.rows,self.columns,key) and \
+                    len(memory) == headerSize+2*depth:
+                self.memory = memory
+                self.cells = memoryview(memory)[headerSize:].cast("H")
+                return True
+        memory.close()
+        return False
+
+    def load(self):
+        """
+        Map the book.  A missing or stale book leaves it empty, so the NPC hunts as usual; build it with main().
+        :return: None.
+        """
+        if not self.read(versionKey(self.rows,self.columns,self.fleet,self.depth,self.samples,self.seed)):
+            self.cells = ()
+
+    def available(self):
+        """
+        Check whether a valid book was found.
+        :return: True if the book file exists and matches its settings.
+        """
+        if self.cells is None:
+            self.load()
+        return len(self.cells) > 0
+
+    def cell(self,shot):
+        """
+        Look up a book shot.
+        :param shot: Integer shot number from 0.
+        :return: Integer cell index, or None past the end of the book.
+        """
+        if self.cells is None:
+            self.load()
+        return self.cells[shot] if shot < len(self.cells) else None
+
+# The book the "book" strategy uses, for the standard gameboard and fleet.
+defaultBook = openingBook()
+
+def reportMissingBook(stream=None):
+    """
+    reportMissingBook() tells the user when the book strategy will play without a book.
+    :param stream: File to write to, defaults to sys.stderr.
+    :return: True if defaultBook is missing or stale.
+    """
+    if defaultBook.available():
+        return False
+    (stream or sys.stderr).write("No valid opening book at "+defaultBook.path+", the book strategy plays as hunt.  "
+                                 "Build it with: python openingbook.py\n")
+    return True
+
+class bookFrontier(battleship.targetFrontier):
+    """
+    bookFrontier class is a targetFrontier that takes its random picks from an opening book until the NPC's first hit.
+    A hit always queues the cells next to it, so the first enqueue() marks the end of the book.
+    """
+    __slots__ = ("book","shots","symmetry","inBook")
+
+    def __init__(self,geometry=None,book=None,rng=None):
+        """
+        :param geometry: boardGeometry of the gameboard being fired at, defaults to the standard gameboard.
+        :param book: openingBook for that gameboard, defaults to defaultBook.
+        :param rng: random.Random instance the random picks are drawn from, defaults to the random module.
+        """
+        super().__init__(geometry,rng)
+        self.book = defaultBook if book is None else book
+        self.shots = 0
+        # Drawn on the first book shot, so without a book the NPC draws exactly what the hunting NPC would.
+        self.symmetry = None
+        # A book only fits the gameboard size it was built for.
+        self.inBook = (self.book.rows,self.book.columns) == (self.geometry.rows,self.geometry.columns)
+
+    def randomCell(self):
+        """
+        Pick the next book cell while every shot so far has missed, otherwise a random cell that hasn't been fired at.
+        :return: Integer cell index.
+        """
+        if self.inBook:
+            cell = self.book.cell(self.shots)
+            self.shots += 1
+            if cell is not None:
+                if self.symmetry is None:
+                    self.symmetry = self.rng.randrange(8)
+                cell = transformCell(cell,self.symmetry,self.geometry.rows,self.geometry.columns)
+                if self.position[cell] >= 0:
+                    return cell
+            self.inBook = False
+        return super().randomCell()
+
+    def enqueue(self,value):
+        self.inBook = False
+        super().enqueue(value)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the NPC's opening book.")
+    parser.add_argument("--output",default=defaultPath,help="book file (default: openingbook.bin next to this script)")
+    parser.add_argument("--depth",type=int,default=defaultDepth,help="shots in the book")
+    parser.add_argument("--samples",type=int,default=defaultSamples,help="fleets sampled from autoGameboardSetup()")
+    parser.add_argument("--seed",type=int,default=defaultSeed,help="base seed of the sample")
+    parser.add_argument("--rows",type=int,default=10,help="gameboard rows")
+    parser.add_argument("--columns",type=int,default=10,help="gameboard columns")
+    parser.add_argument("--fleet",type=battleship.parseFleet,default=None,help="ship sizes, e.g. 5,4,3*2,2*4")
+    parser.add_argument("--workers",type=int,default=os.cpu_count() or 1,help="worker processes sampling fleets")
+    parser.add_argument("--force",action="store_true",help="rebuild even if the book is up to date")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    key = versionKey(args.rows,args.columns,args.fleet,args.depth,args.samples,args.seed)
+    book = openingBook(args.output,args.rows,args.columns,args.fleet,args.depth,args.samples,args.seed)
+    if args.force or not book.read(key):
+        cells,probabilities = buildBook(args.rows,args.columns,args.fleet,args.depth,args.samples,args.seed,args.workers)
+        writeBook(args.output,key,args.rows,args.columns,cells)
+        summary = {"built":True,"hitProbabilities":[round(probability,4) for probability in probabilities]}
+    else:
+        cells = list(book.cells)
+        summary = {"built":False}
+    geometry = battleship.gameboardGeometry(args.rows,args.columns)
+    summary.update({"output":args.output,
+                    "versionKey":key.hex()[:16],
+                    "shots":[geometry.cellLabels[cell] for cell in cells],
+                    "seconds":round(time.perf_counter()-start,3)})
+    print(json.dumps(summary,indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+"""
+placement.py
+Searches for fleet layouts that take a given NPC shooter as many shots as possible to sink.  A layout's score is the
+mean number of shots the shooter needs over a fixed set of seeded headless games, the same seeds for every layout so
+layouts are compared on equal terms.  The search is a (mu + lambda) evolutionary loop: every generation each layout in
+the population is mutated (one ship moved one cell or moved anywhere), the children are scored over a process pool,
+and the best distinct layouts of parents and children survive.  Scores are cached by layout, so a layout the search
+comes back to isn't played again.
+
+The best layouts are then scored again on fresh seeds, which takes out the luck that helped them survive, and written
+to a library.  `battleship.py --layouts` and battleship.autoGameboardSetup(layouts=...) draw NPC fleets from it.
+
+    python placement.py --strategy hunt --generations 20 --output layouts.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import battleship
+import simulation
+
+def layoutKey(layout):
+    """
+    layoutKey() identifies a layout regardless of the order its ships and coordinates are listed in.
+    :param layout: List of coordinate lists.
+    :return: Tuple usable as a dictionary key.
+    """
+    return tuple(sorted(tuple(sorted(coordinates)) for coordinates in layout))
+
+def shotsToSink(layout,strategy,seeds,backend="dict"):
+    """
+    shotsToSink() counts the shots a strategy needs to sink a layout in one game per seed.  Each game's shooter draws
+    from its own random.Random seeded with the game's seed.
+    :param layout: List of coordinate lists.
+    :param strategy: String key into simulation.STRATEGIES.
+    :param seeds: List of integer seeds, one per game.
+    :param backend: String key into simulation.BACKENDS.
+    :return: Integer total shots over every game.
+    """
+    fireFunction = simulation.STRATEGIES[strategy][1]
+    gameboardClass = simulation.BACKENDS[backend]
+    fleet = [len(coordinates) for coordinates in layout]
+    total = 0
+    for seed in seeds:
+        aggressorGameboard = gameboardClass(1,10,10,fleet)
+        targetGameboard = gameboardClass(2,10,10,fleet)
+        for coordinates in layout:
+            targetGameboard.addShip(list(coordinates))
+        state = simulation.createState(strategy,fleet,random.Random(seed))
+        while targetGameboard.remainingShips > 0:
+            fireFunction(aggressorGameboard,state,targetGameboard,verbose=False)
+            total += 1
+    return total
+
+def mutateLayout(layout,rng):
+    """
+    mutateLayout() moves one ship: one cell up, down, left or right when that's legal, otherwise to a random legal
+    placement.  Half the time it goes straight to a random placement.
+    :param layout: List of coordinate lists, one per ship.
+    :param rng: random.Random instance.
+    :return: New layout, with the ships in the same order.
+    """
+    index = rng.randrange(len(layout))
+    ship = layout[index]
+    occupied = set()
+    for other,coordinates in enumerate(layout):
+        if other != index:
+            occupied.update(coordinates)
+    if rng.random() < 0.5:
+        rowStep,columnStep = rng.choice(((1,0),(-1,0),(0,1),(0,-1)))
+        moved = [(row+rowStep,column+columnStep) for row,column in ship]
+        if all(0 <= row < 10 and 0 <= column < 10 and (row,column) not in occupied for row,column in moved):
+            return layout[:index]+[moved]+layout[index+1:]
+    candidates = [coordinates for coordinates,mask in battleship.shipPlacements(len(ship))
+                  if occupied.isdisjoint(coordinates)]
+    return layout[:index]+[list(rng.choice(candidates))]+layout[index+1:]
+
+def randomLayout(fleet,rng):
+    """
+    randomLayout() draws a starting layout the way the NPC places its fleet.
+    :param fleet: List of ship sizes.
+    :param rng: random.Random instance.
+    :return: List of coordinate lists in fleet order.
+    """
+    return [list(coordinates) for coordinates in battleship.sampleFleet(fleet,rng=rng)]
+
+class layoutScores:
+    """
+    layoutScores class scores layouts against one strategy on a fixed set of seeds, playing each distinct layout only
+    once and spreading new layouts over a process pool.
+    """
+    def __init__(self,strategy,seeds,backend="dict",executor=None):
+        """
+        :param strategy: String key into simulation.STRATEGIES.
+        :param seeds: List of integer seeds shared by every layout.
+        :param backend: String key into simulation.BACKENDS.
+        :param executor: ProcessPoolExecutor, or None to play in this process.
+        """
+        self.strategy = strategy
+        self.seeds = seeds
+        self.backend = backend
+        self.executor = executor
+        # Mean shots to sink, keyed by layoutKey().
+        self.cache = {}
+        self.hits = 0
+        self.evaluations = 0
+
+    def score(self,layouts):
+        """
+        Score layouts, playing only the ones not scored before.
+        :param layouts: List of layouts.
+        :return: List of mean shots to sink, in the same order.
+        """
+        keys = [layoutKey(layout) for layout in layouts]
+        missing = {}
+        for key,layout in zip(keys,layouts):
+            if key in self.cache or key in missing:
+                self.hits += 1
+            else:
+                missing[key] = layout
+        if missing:
+            play = partial(shotsToSink,strategy=self.strategy,seeds=self.seeds,backend=self.backend)
+            if self.executor is None:
+                totals = map(play,missing.values())
+            else:
+                totals = self.executor.map(play,missing.values())
+            for key,total in zip(missing,totals):
+                self.cache[key] = total/len(self.seeds)
+            self.evaluations += len(missing)
+        return [self.cache[key] for key in keys]
+
+def optimizeLayouts(strategy="hunt",fleet=None,generations=20,population=16,children=32,games=200,library=10,
+                    validationGames=1000,seed=0,workers=None,backend="dict",progress=None):
+    """
+    optimizeLayouts() runs the evolutionary search and rescores the best layouts on fresh seeds.
+    :param strategy: String key into simulation.STRATEGIES, the shooter the layouts should hold out against.
+    :param fleet: List of ship sizes, defaults to battleship.defaultFleet.
+    :param generations: Integer number of generations.
+    :param population: Integer number of layouts kept from one generation to the next.
+    :param children: Integer number of mutated layouts scored per generation.
+    :param games: Integer games per layout during the search.
+    :param library: Integer number of layouts in the library.
+    :param validationGames: Integer games per layout when rescoring the library on fresh seeds.
+    :param seed: Integer base seed.
+    :param workers: Integer number of worker processes.  Defaults to the CPU count; 1 plays every game in this process.
+    :param backend: String key into simulation.BACKENDS.
+    :param progress: Optional function called with the generation number and the population's scores.
+    :return: Dictionary holding the library and how the search went.
+    """
+    fleet = list(battleship.defaultFleet if fleet is None else fleet)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    rng = random.Random(seed)
+    searchSeeds = [rng.getrandbits(64) for i in range(games)]
+    validationSeeds = [rng.getrandbits(64) for i in range(validationGames)]
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        scores = layoutScores(strategy,searchSeeds,backend,executor)
+        # Random layouts score the baseline the search has to beat, and the first population is drawn from them.
+        baseline = [randomLayout(fleet,rng) for i in range(max(population,children))]
+        baselineScores = scores.score(baseline)
+        ranked = sorted(zip(baselineScores,range(len(baseline))),reverse=True)[:population]
+        parents = [(score,baseline[index]) for score,index in ranked]
+        for generation in range(generations):
+            offspring = [mutateLayout(parents[i % len(parents)][1],rng) for i in range(children)]
+            pool = parents+list(zip(scores.score(offspring),offspring))
+            survivors = {}
+            for score,layout in sorted(pool,key=lambda entry: -entry[0]):
+                survivors.setdefault(layoutKey(layout),(score,layout))
+            parents = list(survivors.values())[:population]
+            if progress is not None:
+                progress(generation+1,[score for score,layout in parents])
+        best = parents[:library]
+        validation = layoutScores(strategy,validationSeeds,backend,executor)
+        validated = validation.score([layout for score,layout in best])
+        baselineValidated = validation.score(baseline[:library])
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    entries = [{"layout":layout,"searchMeanShots":round(score,3),"meanShots":round(validatedScore,3)}
+               for (score,layout),validatedScore in zip(best,validated)]
+    entries.sort(key=lambda entry: -entry["meanShots"])
+    return {"strategy":strategy,
+            "backend":backend,
+            "fleet":fleet,
+            "games":games,
+            "validationGames":validationGames,
+            "generations":generations,
+            "evaluations":scores.evaluations,
+            "cacheHits":scores.hits,
+            "baselineMeanShots":round(sum(baselineValidated)/len(baselineValidated),3),
+            "libraryMeanShots":round(sum(validated)/len(validated),3),
+            "layouts":entries}
+
+def main():
+    parser = argparse.ArgumentParser(description="Search for fleet layouts that are hard for an NPC shooter to sink.")
+    parser.add_argument("--strategy",choices=sorted(simulation.STRATEGIES),default="hunt",help="shooter to hold out against")
+    parser.add_argument("--fleet",type=battleship.parseFleet,default=None,help="ship sizes, e.g. 5,4,3*2,2*4")
+    parser.add_argument("--generations",type=int,default=20,help="generations of the evolutionary loop")
+    parser.add_argument("--population",type=int,default=16,help="layouts kept between generations")
+    parser.add_argument("--children",type=int,default=32,help="mutated layouts scored per generation")
+    parser.add_argument("--games",type=int,default=200,help="games per layout during the search")
+    parser.add_argument("--library",type=int,default=10,help="layouts written to the library")
+    parser.add_argument("--validation-games",type=int,default=1000,help="games per layout when rescoring the library")
+    parser.add_argument("--seed",type=int,default=0,help="base seed for reproducible runs")
+    parser.add_argument("--workers",type=int,default=None,help="worker processes (default: CPU count)")
+    parser.add_argument("--backend",choices=sorted(simulation.BACKENDS),default="dict",help="Gameboard implementation")
+    parser.add_argument("--output",default=None,help="write the layout library to this JSON file")
+    parser.add_argument("--quiet",action="store_true",help="don't report each generation")
+    args = parser.parse_args()
+
+    def progress(generation,populationScores):
+        sys.stderr.write("generation "+str(generation)+": best "+str(round(populationScores[0],2))+", worst kept "+
+                         str(round(populationScores[-1],2))+"\n")
+
+    start = time.perf_counter()
+    result = optimizeLayouts(args.strategy,args.fleet,args.generations,args.population,args.children,args.games,
+                             args.library,args.validation_games,args.seed,args.workers,args.backend,
+                             None if args.quiet else progress)
+    result["seconds"] = round(time.perf_counter()-start,3)
+    if args.output:
+        with open(args.output,"w") as outputFile:
+            json.dump(result,outputFile,indent=2)
+    summary = dict(result)
+    summary["layouts"] = [entry["meanShots"] for entry in result["layouts"]]
+    print(json.dumps(summary,indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+playerinput.py
+Input sources for the human player prompts in battleship.py.  Every input source has read(prompt), which returns the
+next line the player entered without its newline and raises EOFError when there's nothing left, just like input().
+
+consoleInput asks at the terminal and is the default.  scriptedInput plays back lines from a file or any iterator of
+strings, so 1- and 2-player games can run without a terminal.  recordingInput wraps another input source and keeps every
+line read from it, so a game played at the terminal can be replayed later.
+"""
+
+class consoleInput:
+    """
+    consoleInput class reads each line from the terminal with input().
+    """
+    def read(self,prompt):
+        """
+        Prompt the player and wait for a line.
+        :param prompt: String printed before reading.
+        :return: String entered.
+        """
+        return input(prompt)
+
+class scriptedInput:
+    """
+    scriptedInput class plays back a script holding one line per prompt, exactly what a player would type.
+    """
+    def __init__(self,lines,echo=False):
+        """
+        :param lines: File or iterator of strings.  Trailing newlines are stripped.
+        :param echo: Boolean, print each prompt followed by the line read, as a terminal would show it.
+        """
+        self.lines = iter(lines)
+        self.echo = echo
+        # Number of lines read so far.
+        self.consumed = 0
+
+    def read(self,prompt):
+        """
+        Take the next line of the script.
+        :param prompt: String prompt, only printed when echo is on.
+        :return: String line.  Raises EOFError once the script runs out.
+        """
+        try:
+            line = next(self.lines)
+        except StopIteration:
+            raise EOFError("the script ran out after "+str(self.consumed)+" lines") from None
+        self.consumed += 1
+        line = line.rstrip("\r\n")
+        if self.echo:
+            print(prompt+line)
+        return line
+
+class recordingInput:
+    """
+    recordingInput class passes reads through to another input source and keeps every line it returned.
+    """
+    def __init__(self,source):
+        """
+        :param source: Input source to read from.
+        """
+        self.source = source
+        # Lines read so far, in order.  Feeding them to scriptedInput replays the same answers.
+        self.lines = []
+
+    def read(self,prompt):
+        """
+        Read a line from the wrapped input source and record it.
+        :param prompt: String prompt.
+        :return: String line.
+        """
+        line = self.source.read(prompt)
+        self.lines.append(line)
+        return line
@@ -0,0 +1,419 @@
+"""
+records.py
+Compact binary archive of finished games.  A file starts with an 8 byte header (b"BSGR", a format version byte and
+three reserved bytes) followed by records laid out as:
+
+    uint32  body length in bytes (little endian), not counting these 4 bytes
+    uint8   winner (1 or 2)
+    fleet   player one's fleet: uint8 ship count, then per ship a uint8 size followed by one byte per cell index
+    fleet   player two's fleet, same layout
+    uint16  shot count (little endian)
+    bytes   one byte per shot: the cell index fired at, with the high bit set when player two fired
+    bytes   one result code per shot: RESULT_MISS, RESULT_HIT, RESULT_REPEAT, or RESULT_SUNK + the sunk ship's size
+
+recordWriter appends records in bulk.  recordReader memory-maps a file and hands out gameRecord views over it without
+copying, so any game in a large archive can be found and replayed into Gameboard instances on demand.
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import weakref
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import aggregate
+import battleship
+import simulation
+
+MAGIC = b"BSGR"
+VERSION = 1
+HEADER = MAGIC+bytes((VERSION,0,0,0))
+
+RESULT_MISS = 0
+RESULT_HIT = 1
+RESULT_REPEAT = 2
+# A sunk ship is stored as RESULT_SUNK plus its size, so sink codes start at 3.
+RESULT_SUNK = 2
+
+# Shot bytes set this bit when player two fired.  Cell indices 0-99 fit in the low 7 bits.
+PLAYER_TWO_BIT = 0x80
+# Records hold the standard 10x10 gameboard only: cells are stored as row*10+column in one byte.
+BOARD_SIZE = 10
+
+lengthStruct = struct.Struct("<I")
+shotCountStruct = struct.Struct("<H")
+
+def encodeResult(result):
+    """
+    encodeResult() converts a Gameboard.fireAtTarget() result into a result code.
+    :param result: "Hit", "Miss", "Repeat" or the size of a sunk ship.
+    :return: Integer result code.
+    """
+    if result == "Miss":
+        return RESULT_MISS
+    if result == "Hit":
+        return RESULT_HIT
+    if result == "Repeat":
+        return RESULT_REPEAT
+    return RESULT_SUNK+result
+
+def decodeResult(code):
+    """
+    decodeResult() converts a result code back into a Gameboard.fireAtTarget() result.
+    :param code: Integer result code.
+    :return: "Hit", "Miss", "Repeat" or the size of a sunk ship.
+    """
+    if code == RESULT_MISS:
+        return "Miss"
+    if code == RESULT_HIT:
+        return "Hit"
+    if code == RESULT_REPEAT:
+        return "Repeat"
+    return code-RESULT_SUNK
+
+def encodeGame(winner,layouts,shotStream):
+    """
+    encodeGame() packs one game into a record, length prefix included.
+    :param winner: Integer winning player.
+    :param layouts: Pair of fleet layouts as returned by Gameboard.shipLayout().
+    :param shotStream: List of (player, cell index, result) tuples in the order they were fired.
+    :return: bytes.  Raises ValueError if a ship or shot is off the 10x10 gameboard, since its cell wouldn't fit.
+    """
+    body = bytearray((winner,))
+    for layout in layouts:
+        body.append(len(layout))
+        for coordinates in layout:
+            for row,column in coordinates:
+                if not (0 <= row < BOARD_SIZE and 0 <= column < BOARD_SIZE):
+                    raise ValueError("coordinate "+str((row,column))+" is off the 10x10 gameboard records can hold")
+            body.append(len(coordinates))
+            body.extend(battleship.numCoordToCell(i) for i in coordinates)
+    cells = [cell for player,cell,result in shotStream]
+    if cells and (min(cells) < 0 or max(cells) >= BOARD_SIZE*BOARD_SIZE):
+        raise ValueError("a shot is off the 10x10 gameboard records can hold")
+    body += shotCountStruct.pack(len(shotStream))
+    body.extend(cell | PLAYER_TWO_BIT if player == 2 else cell for player,cell,result in shotStream)
+    body.extend(encodeResult(result) for player,cell,result in shotStream)
+    return lengthStruct.pack(len(body))+body
+
+class recordWriter:
+    """
+    recordWriter class appends game records to an archive.  Records are collected in memory and written in large
+    chunks.
+    """
+    def __init__(self,path,bufferSize=1 << 20):
+        """
+        :param path: String path of the archive.  Created with a header if it doesn't exist.
+        :param bufferSize: Integer number of bytes collected before a write.
+        """
+        self.file = open(path,"ab")
+        if self.file.tell() == 0:
+            self.file.write(HEADER)
+        self.buffer = bytearray()
+        self.bufferSize = bufferSize
+
+    def write(self,winner,layouts,shotStream):
+        """
+        Add a game to the archive.
+        :param winner: Integer winning player.
+        :param layouts: Pair of fleet layouts.
+        :param shotStream: List of (player, cell index, result) tuples.
+        :return: None.
+        """
+        self.buffer += encodeGame(winner,layouts,shotStream)
+        if len(self.buffer) >= self.bufferSize:
+            self.flush()
+
+    def writeResults(self,results):
+        """
+        Add games recorded by simulation.simulateGames(..., record=True).
+        :param results: Iterable of game result dictionaries with "layouts" and "shotStream".
+        :return: None.
+        """
+        for i in results:
+            self.write(i["winner"],i["layouts"],i["shotStream"])
+
+    def writeRecords(self,records):
+        """
+        Add games already packed by encodeGame().
+        :param records: bytes of one or more records, length prefixes included.
+        :return: None.
+        """
+        self.buffer += records
+        if len(self.buffer) >= self.bufferSize:
+            self.flush()
+
+    def flush(self):
+        """
+        Write out every buffered record.
+        :return: None.
+        """
+        if self.buffer:
+            self.file.write(self.buffer)
+            self.buffer = bytearray()
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+class gameRecord:
+    """
+    gameRecord class is a view of one record inside a memory-mapped archive.  Nothing is copied until a field is read.
+    A record can't be read once it's released or its recordReader is closed.
+    """
+    def __init__(self,view):
+        # view is a memoryview of the record body.
+        self.view = view
+        self.shotsOffset = None
+        # Views of the shot bytes and result codes, kept so release() can let go of them too.
+        self.shotViews = None
+
+    def release(self):
+        """
+        Let go of this record's views of the archive so the recordReader can unmap it.
+        :return: None.
+        """
+        if self.shotViews is not None:
+            for view in self.shotViews:
+                view.release()
+            self.shotViews = None
+        self.view.release()
+
+    @property
+    def winner(self):
+        return self.view[0]
+
+    def layouts(self):
+        """
+        Decode both fleets.
+        :return: Pair of fleet layouts, each a list of numeric coordinate lists.
+        """
+        view = self.view
+        offset = 1
+        layouts = []
+        for player in (1,2):
+            layout = []
+            for ship in range(view[offset]):
+                size = view[offset+1]
+                layout.append([battleship.cellCoordinates[i] for i in view[offset+2:offset+2+size]])
+                offset += 1+size
+            offset += 1
+            layouts.append(layout)
+        self.shotsOffset = offset
+        return layouts
+
+    def shotBytes(self):
+        """
+        Locate the shot stream.
+        :return: Tuple of (memoryview of shot bytes, memoryview of result codes).
+        """
+        if self.shotViews is None:
+            if self.shotsOffset is None:
+                self.layouts()
+            offset = self.shotsOffset
+            count = shotCountStruct.unpack_from(self.view,offset)[0]
+            offset += shotCountStruct.size
+            self.shotViews = (self.view[offset:offset+count],self.view[offset+count:offset+2*count])
+        return self.shotViews
+
+    def shots(self):
+        """
+        Decode the shot stream.
+        :return: Generator of (player, cell index, result) tuples.
+        """
+        shots,results = self.shotBytes()
+        for shot,code in zip(shots,results):
+            yield (2 if shot & PLAYER_TWO_BIT else 1),shot & ~PLAYER_TWO_BIT,decodeResult(code)
+
+    def replay(self,gameboardClass=battleship.Gameboard,shots=None):
+        """
+        Rebuild both gameboards and fire the recorded shots at them.
+        :param gameboardClass: Gameboard class or subclass to create.
+        :param shots: Integer number of shots to replay, defaults to all of them.
+        :return: Tuple of (player one Gameboard, player two Gameboard).  Raises ValueError if a result differs from the
+        recorded one.
+        """
+        gameboards = {}
+        for player,layout in zip((1,2),self.layouts()):
+            gameboards[player] = gameboardClass(player)
+            for coordinates in layout:
+                gameboards[player].addShip(coordinates)
+        for number,(player,cell,result) in enumerate(self.shots()):
+            if shots is not None and number >= shots:
+                break
+            replayed = battleship.resolveFireAtTarget(battleship.cellCoordinates[cell],gameboards[player],gameboards[3-player])
+            if replayed != result:
+                raise ValueError("shot "+str(number)+" replayed as "+str(replayed)+", recorded as "+str(result))
+        return gameboards[1],gameboards[2]
+
+class recordReader:
+    """
+    recordReader class memory-maps an archive and iterates its records lazily.  Indexing by game number first walks
+    the length prefixes once to build an offset table.
+    """
+    def __init__(self,path):
+        self.file = open(path,"rb")
+        if os.fstat(self.file.fileno()).st_size < len(HEADER):
+            self.file.close()
+            raise ValueError(path+" is not a game record archive")
+        self.map = mmap.mmap(self.file.fileno(),0,access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        # Every gameRecord handed out that's still alive, released by close().
+        self.records = weakref.WeakSet()
+        header = bytes(self.view[:len(HEADER)])
+        if header[:4] != MAGIC or header[4] != VERSION:
+            self.close()
+            if header[:4] != MAGIC:
+                raise ValueError(path+" is not a game record archive")
+            raise ValueError(path+" uses record format version "+str(header[4]))
+        # offsets[i] is where record i's length prefix starts.  Built on first random access.
+        self.offsets = None
+
+    def record(self,offset,length):
+        """
+        Hand out a gameRecord over part of the archive, tracked so close() can release it.
+        :param offset: Integer offset of the record body.
+        :param length: Integer length of the record body.
+        :return: gameRecord instance.
+        """
+        gameRecordView = gameRecord(self.view[offset:offset+length])
+        self.records.add(gameRecordView)
+        return gameRecordView
+
+    def __iter__(self):
+        view = self.view
+        offset = len(HEADER)
+        end = len(view)
+        while offset < end:
+            length = lengthStruct.unpack_from(view,offset)[0]
+            offset += lengthStruct.size
+            yield self.record(offset,length)
+            offset += length
+
+    def buildIndex(self):
+        """
+        Walk the length prefixes to find where every record starts.
+        :return: array of offsets.
+        """
+        if self.offsets is None:
+            offsets = array("Q")
+            offset = len(HEADER)
+            end = len(self.view)
+            while offset < end:
+                offsets.append(offset)
+                offset += lengthStruct.size+lengthStruct.unpack_from(self.view,offset)[0]
+            self.offsets = offsets
+        return self.offsets
+
+    def __len__(self):
+        return len(self.buildIndex())
+
+    def __getitem__(self,index):
+        offset = self.buildIndex()[index]
+        length = lengthStruct.unpack_from(self.view,offset)[0]
+        return self.record(offset+lengthStruct.size,length)
+
+    def close(self):
+        """
+        Unmap the archive.  Every gameRecord handed out is released first, so none of them can be read afterwards.
+        :return: None.
+        """
+        for gameRecordView in list(self.records):
+            gameRecordView.release()
+        self.view.release()
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+def encodeHeadlessGames(seeds,strategy="hunt"):
+    """
+    encodeHeadlessGames() plays a chunk of games inside one worker process and packs them, so only the records travel
+    back to the parent.
+    :param seeds: List of integer seeds, one per game.
+    :param strategy: String key into simulation.STRATEGIES.
+    :return: bytes of the packed records in seed order.
+    """
+    return b"".join(encodeGame(i["winner"],i["layouts"],i["shotStream"])
+                    for i in simulation.playHeadlessGames(seeds,strategy=strategy,record=True))
+
+def archiveGames(path,games,workers=None,seed=0,chunkSize=1000,strategy="hunt"):
+    """
+    archiveGames() simulates games over a process pool and appends each chunk to an archive as soon as it and every
+    chunk before it are done, so the games land in the same order as simulation.simulateGames() returns them.  At most
+    two chunks per worker are in flight, so memory doesn't grow with the number of games.
+    :param path: String path of the archive.
+    :param games: Integer number of games to play.
+    :param workers: Integer number of worker processes.  Defaults to the CPU count; 1 plays every game in this process.
+    :param seed: Integer base seed.
+    :param chunkSize: Integer number of games handed to a worker at once.
+    :param strategy: String key into simulation.STRATEGIES.
+    :return: None.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    chunks = aggregate.seedChunks(games,seed,chunkSize)
+    with recordWriter(path) as writer:
+        if workers <= 1:
+            for chunk in chunks:
+                writer.writeRecords(encodeHeadlessGames(chunk,strategy))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(executor.submit(encodeHeadlessGames,chunk,strategy))
+                    if len(pending) >= 2*workers:
+                        writer.writeRecords(pending.popleft().result())
+                while pending:
+                    writer.writeRecords(pending.popleft().result())
+
+def main():
+    parser = argparse.ArgumentParser(description="Write or read archived Battleship games.")
+    commands = parser.add_subparsers(dest="command",required=True)
+    writeParser = commands.add_parser("write",help="simulate games and append them to an archive")
+    writeParser.add_argument("path",help="archive file")
+    writeParser.add_argument("--games",type=int,default=1000,help="number of games to simulate")
+    writeParser.add_argument("--workers",type=int,default=None,help="worker processes (default: CPU count)")
+    writeParser.add_argument("--seed",type=int,default=0,help="base seed")
+    writeParser.add_argument("--chunk",type=int,default=1000,help="games per worker task")
+    writeParser.add_argument("--strategy",choices=sorted(simulation.STRATEGIES),default="hunt",help="NPC strategy")
+    readParser = commands.add_parser("read",help="summarize an archive or replay one game")
+    readParser.add_argument("path",help="archive file")
+    readParser.add_argument("--game",type=int,default=None,help="replay this game and print both gameboards")
+    args = parser.parse_args()
+
+    if args.command == "write":
+        archiveGames(args.path,args.games,args.workers,args.seed,args.chunk,args.strategy)
+        print(json.dumps({"games":args.games,"bytes":os.path.getsize(args.path)}))
+    else:
+        reader = recordReader(args.path)
+        if args.game is None:
+            games = 0
+            playerOneWins = 0
+            shots = 0
+            for gameRecordView in reader:
+                games += 1
+                playerOneWins += gameRecordView.winner == 1
+                shots += len(gameRecordView.shotBytes()[0])
+            print(json.dumps({"games":games,"playerOneWins":playerOneWins,"meanShots":round(shots/games,2) if games else None}))
+        else:
+            playerOneGameboard,playerTwoGameboard = reader[args.game].replay()
+            playerOneGameboard.printGameboard()
+            playerTwoGameboard.printGameboard()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+renderer.py
+Gameboard renderers for runBattleship().  Every renderer has render(gameboard) and close().
+
+bufferedRenderer writes the usual printGameboard() layout as one frame with a single write call.  ansiRenderer pins the
+frame to the top of the terminal and afterwards only rewrites the characters that changed since the same player's last
+frame, which after a turn is just the cells touched by fireAtTarget().  nullRenderer draws nothing for headless runs.
+"""
+import shutil
+import sys
+
+import instrumentation
+
+class bufferedRenderer:
+    """
+    bufferedRenderer class writes each gameboard frame with a single call.  This is the default output.
+    """
+    def __init__(self,stream=None):
+        self.stream = stream
+
+    @instrumentation.phase("render")
+    def render(self,gameboard):
+        """
+        Draw a gameboard.
+        :param gameboard: Gameboard instance.
+        :return: None.
+        """
+        (self.stream or sys.stdout).write(gameboard.renderGameboard())
+
+    def close(self):
+        """
+        Finish rendering.  Nothing to clean up.
+        :return: None.
+        """
+        pass
+
+class nullRenderer:
+    """
+    nullRenderer class draws nothing.  Used for headless runs.
+    """
+    def render(self,gameboard):
+        """
+        Ignore a gameboard.
+        :param gameboard: Gameboard instance.
+        :return: None.
+        """
+        pass
+
+    def close(self):
+        """
+        Finish rendering.  Nothing to clean up.
+        :return: None.
+        """
+        pass
+
+def changedSpans(before,after):
+    """
+    changedSpans() finds the runs of characters that differ between two lines.  Runs separated by a few unchanged
+    characters are merged, as one cursor move plus a few extra characters is cheaper than two cursor moves.
+    :param before: String currently on screen.
+    :param after: String to show.
+    :return: List of (start index, replacement text) tuples.
+    """
+    spans = []
+    start = None
+    end = None
+    for index in range(max(len(before),len(after))):
+        if before[index:index+1] != after[index:index+1]:
+            if start is None:
+                start = index
+            elif index-end > 4:
+                spans.append((start,after[start:end].ljust(end-start)))
+                start = index
+            end = index+1
+    if start is not None:
+        spans.append((start,after[start:end].ljust(end-start)))
+    return spans
+
+class ansiRenderer:
+    """
+    ansiRenderer class keeps the current frame at the top of the terminal and reserves the rest of the screen for game
+    messages with a scroll region.  After the first frame only the characters that changed are redrawn.  In a 2-player
+    game the frames alternate between the players' gameboards, which share almost nothing, so switching player rewrites
+    every changed line whole and only frames for the same player are diffed character by character.
+    """
+    def __init__(self,stream=None):
+        self.stream = stream
+        # Lines of the frame currently on screen, or None before the first frame.
+        self.screen = None
+        # Player whose gameboard is on screen.
+        self.player = None
+
+    @instrumentation.phase("render")
+    def render(self,gameboard):
+        """
+        Draw a gameboard, redrawing only what changed since the last frame drawn for the same player.
+        :param gameboard: Gameboard instance.
+        :return: None.
+        """
+        stream = self.stream or sys.stdout
+        lines = gameboard.renderGameboard().split("\n")[:-1]
+        if self.screen is None or len(lines) != len(self.screen):
+            height = shutil.get_terminal_size().lines
+            # Clear the screen, draw the frame at the top and keep messages scrolling underneath it.
+            output = "\x1b[2J\x1b[H"+"\n".join(lines)
+            if height > len(lines)+2:
+                output += "\x1b["+str(len(lines)+1)+";"+str(height)+"r\x1b["+str(len(lines)+1)+";1H"
+            stream.write(output)
+        elif gameboard.player != self.player:
+            # Rewrite whole lines in place, skipping the borders and labels both players share.
+            output = []
+            for lineNumber,(before,after) in enumerate(zip(self.screen,lines),1):
+                if before != after:
+                    output.append("\x1b["+str(lineNumber)+";1H"+after+"\x1b[K")
+            if output:
+                stream.write("\x1b7"+"".join(output)+"\x1b8")
+        else:
+            # Save the cursor, overwrite each changed span in place and put the cursor back.
+            output = []
+            for lineNumber,(before,after) in enumerate(zip(self.screen,lines),1):
+                if before != after:
+                    for start,text in changedSpans(before,after):
+                        output.append("\x1b["+str(lineNumber)+";"+str(start+1)+"H"+text)
+            if output:
+                stream.write("\x1b7"+"".join(output)+"\x1b8")
+        self.screen = lines
+        self.player = gameboard.player
+        stream.flush()
+
+    def close(self):
+        """
+        Release the scroll region so the terminal behaves normally again.
+        :return: None.
+        """
+        if self.screen is not None:
+            (self.stream or sys.stdout).write("\x1b[r\n")
+            self.screen = None
+            self.player = None
+
+# Renderers selectable from the command line.
+RENDERERS = {"buffered":bufferedRenderer,"ansi":ansiRenderer,"null":nullRenderer}
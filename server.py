@@ -0,0 +1,376 @@
+"""
+server.py
+Asyncio TCP server hosting many concurrent Battleship matches, one Gameboard pair per match.  Everything runs on one
+event loop, so thousands of idle connections cost only their sockets and a few small objects each.
+
+The protocol is line based ASCII.  Client commands:
+
+    NPC                 start a match against the NPC
+    JOIN                wait for another client and start a match against them
+    PLACE <start> <dir> place your next ship, same start coordinate and direction rules as the console game
+    AUTO                place the rest of your fleet at random
+    FIRE <coordinate>   fire at the opponent, e.g. FIRE B7
+    STATS               report open connections and matches
+    QUIT                close the connection
+
+Server messages:
+
+    WELCOME
+    MATCHED <player> <fleet>    you're player 1 or 2; fleet lists ship sizes in placement order, e.g. 1,1,2,2,3,4,5
+    PLACED <size>               a ship was placed
+    WAITING                     your fleet is placed, the opponent's isn't yet
+    READY                       both fleets are placed
+    TURN                        it's your turn to fire
+    HIT <c> | MISS <c> | SUNK <c> <size>           result of your shot
+    INCOMING <c> HIT | INCOMING <c> MISS | INCOMING <c> SUNK <size>   the opponent's shot
+    WIN | LOSE | OPPONENT_LEFT
+    STATS <connections> <matches> <waiting>
+    ERR <reason>
+
+A line the server can't read, e.g. one longer than the stream limit, gets "ERR malformed line" and the connection is
+closed.
+"""
+import argparse
+import asyncio
+
+import battleship
+
+# Raise the open file limit so one process can hold thousands of connections.  Not every platform has resource.
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def raiseFileLimit():
+    """
+    raiseFileLimit() lifts the soft open file limit up to the hard limit where the platform allows it.
+    :return: Integer soft limit now in effect, or None if unknown.
+    """
+    if resource is None:
+        return None
+    soft,hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE,(hard,hard))
+            soft = hard
+        except (ValueError,OSError):
+            pass
+    return soft
+
+class playerConnection:
+    """
+    playerConnection class is one connected client.  The match and player fields are filled in once it's matched.
+    """
+    def __init__(self,writer):
+        self.writer = writer
+        self.match = None
+        self.player = None
+
+    def send(self,line):
+        """
+        Queue a line for the client.  Lines are flushed when the handler drains the writer.
+        :param line: String without a newline.
+        :return: None.
+        """
+        self.writer.write(line.encode()+b"\n")
+
+class match:
+    """
+    match class is one game between two connections, or a connection and the NPC (connection None).
+    """
+    def __init__(self,playerOne,playerTwo):
+        self.connections = {1:playerOne,2:playerTwo}
+        self.gameboards = {1:battleship.Gameboard(1),2:battleship.Gameboard(2)}
+        # shipsPlaced[player] is how many ships of battleship.defaultFleet that player has placed.
+        self.shipsPlaced = {1:0,2:0}
+        self.turn = 1
+        self.finished = False
+        self.npcFrontier = None
+        for player,connection in self.connections.items():
+            if connection is None:
+                self.gameboards[player] = battleship.autoGameboardSetup(player)
+                self.shipsPlaced[player] = len(battleship.defaultFleet)
+                self.npcFrontier = battleship.targetFrontier()
+            else:
+                connection.match = self
+                connection.player = player
+                connection.send("MATCHED "+str(player)+" "+",".join(str(i) for i in battleship.defaultFleet))
+
+    def fleetPlaced(self,player):
+        return self.shipsPlaced[player] == len(battleship.defaultFleet)
+
+    def placeShip(self,player,start,direction):
+        """
+        Place the player's next ship.
+        :param player: Integer player.
+        :param start: String start coordinate.
+        :param direction: String direction N, E, S or W.
+        :return: None.
+        """
+        connection = self.connections[player]
+        if self.fleetPlaced(player):
+            connection.send("ERR fleet already placed")
+            return
+        shipSize = battleship.defaultFleet[self.shipsPlaced[player]]
+        if not (direction.isalpha() and len(direction) == 1 and
+                battleship.validateAndAddShip(start.capitalize(),direction,shipSize,self.gameboards[player])):
+            connection.send("ERR invalid placement")
+            return
+        self.shipsPlaced[player] += 1
+        connection.send("PLACED "+str(shipSize))
+        if self.fleetPlaced(player):
+            self.fleetReady(player)
+
+    def autoPlace(self,player):
+        """
+        Place the rest of the player's fleet at random.
+        :param player: Integer player.
+        :return: None.
+        """
+        connection = self.connections[player]
+        if self.fleetPlaced(player):
+            connection.send("ERR fleet already placed")
+            return
+        gameboard = self.gameboards[player]
+        remainingFleet = battleship.defaultFleet[self.shipsPlaced[player]:]
+        while True:
+            candidate = battleship.sampleFleet(remainingFleet)
+            if all(gameboard.validShipLocation(coordinates) for coordinates in candidate):
+                break
+        for coordinates,shipSize in zip(candidate,remainingFleet):
+            gameboard.addShip(list(coordinates))
+            connection.send("PLACED "+str(shipSize))
+        self.shipsPlaced[player] = len(battleship.defaultFleet)
+        self.fleetReady(player)
+
+    def fleetReady(self,player):
+        """
+        Start the game once both fleets are placed.
+        :param player: Integer player who just finished placing.
+        :return: None.
+        """
+        if not self.fleetPlaced(3-player):
+            self.connections[player].send("WAITING")
+            return
+        for connection in self.connections.values():
+            if connection is not None:
+                connection.send("READY")
+        self.promptTurn()
+
+    def promptTurn(self):
+        """
+        Tell whoever's turn it is to fire.  The NPC fires straight away.
+        :return: None.
+        """
+        if self.connections[self.turn] is None:
+            self.npcFire()
+        else:
+            self.connections[self.turn].send("TURN")
+
+    def fire(self,player,coordinate):
+        """
+        Fire the player's shot.
+        :param player: Integer player.
+        :param coordinate: String target coordinate.
+        :return: None.
+        """
+        connection = self.connections[player]
+        if not (self.fleetPlaced(1) and self.fleetPlaced(2)):
+            connection.send("ERR fleets not placed")
+            return
+        if self.finished:
+            connection.send("ERR game over")
+            return
+        if self.turn != player:
+            connection.send("ERR not your turn")
+            return
+        target = battleship.validCoordinate(coordinate.capitalize())
+        if not target:
+            connection.send("ERR invalid coordinate")
+            return
+        result = battleship.resolveFireAtTarget(target,self.gameboards[player],self.gameboards[3-player])
+        if result == "Repeat":
+            connection.send("ERR already fired at "+coordinate.upper())
+            return
+        self.resolved(player,target,result)
+
+    def npcFire(self):
+        """
+        Let the NPC take its shot.
+        :return: None.
+        """
+        player = self.turn
+        target,result = battleship.autoFireAtTarget(self.gameboards[player],self.npcFrontier,self.gameboards[3-player],verbose=False)
+        self.resolved(player,target,result)
+
+    def resolved(self,player,target,result):
+        """
+        Report a shot to both sides and move on to the next turn or end the game.
+        :param player: Integer player who fired.
+        :param target: Tuple numeric coordinate fired at.
+        :param result: Result from Gameboard.fireAtTarget().
+        :return: None.
+        """
+        label = battleship.cellLabels[battleship.numCoordToCell(target)]
+        if isinstance(result,int):
+            outcome = "SUNK "+label+" "+str(result)
+        else:
+            outcome = result.upper()+" "+label
+        shooter = self.connections[player]
+        opponent = self.connections[3-player]
+        if shooter is not None:
+            shooter.send(outcome)
+        if opponent is not None:
+            opponent.send("INCOMING "+label+" "+outcome.split(" ",2)[0]+(" "+str(result) if isinstance(result,int) else ""))
+        if self.gameboards[3-player].remainingShips == 0:
+            self.finished = True
+            if shooter is not None:
+                shooter.send("WIN")
+            if opponent is not None:
+                opponent.send("LOSE")
+            return
+        self.turn = 3-player
+        self.promptTurn()
+
+    def leave(self,player):
+        """
+        Handle a player disconnecting.
+        :param player: Integer player who left.
+        :return: None.
+        """
+        opponent = self.connections[3-player]
+        if opponent is not None and not self.finished:
+            opponent.send("OPPONENT_LEFT")
+            opponent.match = None
+        self.finished = True
+
+class battleshipServer:
+    """
+    battleshipServer class accepts connections, pairs them into matches and dispatches their commands.
+    """
+    def __init__(self):
+        self.connections = set()
+        self.matches = set()
+        # A connection that sent JOIN and is waiting for an opponent.
+        self.waiting = None
+
+    def startMatch(self,playerOne,playerTwo):
+        newMatch = match(playerOne,playerTwo)
+        self.matches.add(newMatch)
+        return newMatch
+
+    def endMatch(self,connection):
+        """
+        Forget the connection's match once it's over.
+        :param connection: playerConnection instance.
+        :return: None.
+        """
+        if connection.match is not None and connection.match.finished:
+            self.matches.discard(connection.match)
+            connection.match = None
+
+    def handleLine(self,connection,line):
+        """
+        Dispatch one command from a client.
+        :param connection: playerConnection instance.
+        :param line: String command without the newline.
+        :return: False if the connection should close, True otherwise.
+        """
+        words = line.split()
+        if not words:
+            return True
+        command = words[0].upper()
+        currentMatch = connection.match
+        if command == "FIRE" and len(words) == 2 and currentMatch is not None:
+            currentMatch.fire(connection.player,words[1])
+            self.endMatch(connection)
+        elif command == "PLACE" and len(words) == 3 and currentMatch is not None:
+            currentMatch.placeShip(connection.player,words[1],words[2])
+        elif command == "AUTO" and currentMatch is not None:
+            currentMatch.autoPlace(connection.player)
+        elif command in ("NPC","JOIN"):
+            if currentMatch is not None and not currentMatch.finished:
+                connection.send("ERR already in a match")
+            elif command == "NPC":
+                self.startMatch(connection,None)
+            elif self.waiting is None or self.waiting is connection:
+                self.waiting = connection
+            else:
+                opponent = self.waiting
+                self.waiting = None
+                self.startMatch(opponent,connection)
+        elif command == "STATS":
+            connection.send("STATS "+str(len(self.connections))+" "+str(len(self.matches))+" "+str(int(self.waiting is not None)))
+        elif command == "QUIT":
+            return False
+        elif currentMatch is None and command in ("FIRE","PLACE","AUTO"):
+            connection.send("ERR not in a match")
+        else:
+            connection.send("ERR unknown command")
+        return True
+
+    async def handleClient(self,reader,writer):
+        """
+        Serve one client until it quits or disconnects.
+        :param reader: asyncio.StreamReader.
+        :param writer: asyncio.StreamWriter.
+        :return: None.
+        """
+        connection = playerConnection(writer)
+        self.connections.add(connection)
+        connection.send("WELCOME")
+        try:
+            while True:
+                await writer.drain()
+                line = await reader.readline()
+                if not line or not self.handleLine(connection,line.decode("ascii","replace").strip()):
+                    break
+                # An NPC match's opponent is the server itself, so a finished match can be dropped right away.
+                self.endMatch(connection)
+        except (ConnectionError,asyncio.IncompleteReadError):
+            pass
+        except (ValueError,asyncio.LimitOverrunError):
+            # readline() raises ValueError for a line past the stream limit.  Whatever is left of such a line can't be
+            # told apart from the next command, so the connection is closed after the reply.
+            connection.send("ERR malformed line")
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+        finally:
+            self.connections.discard(connection)
+            if self.waiting is connection:
+                self.waiting = None
+            if connection.match is not None:
+                connection.match.leave(connection.player)
+                self.matches.discard(connection.match)
+            writer.close()
+
+    async def serve(self,host,port,ready=None):
+        """
+        Accept connections forever.
+        :param host: String address to bind.
+        :param port: Integer port to bind, 0 picks a free one.
+        :param ready: Optional asyncio.Future resolved with the bound port once listening.
+        :return: None.
+        """
+        listener = await asyncio.start_server(self.handleClient,host,port,backlog=4096)
+        if ready is not None:
+            ready.set_result(listener.sockets[0].getsockname()[1])
+        async with listener:
+            await listener.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Host networked Battleship matches.")
+    parser.add_argument("--host",default="127.0.0.1",help="address to bind")
+    parser.add_argument("--port",type=int,default=7777,help="port to bind")
+    args = parser.parse_args()
+    raiseFileLimit()
+    print("Listening on "+args.host+":"+str(args.port))
+    try:
+        asyncio.run(battleshipServer().serve(args.host,args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
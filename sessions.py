@@ -0,0 +1,125 @@
+"""
+sessions.py
+Replays human player sessions without a terminal.  A session is one JSON line holding the NPC seed, the gameboard size,
+the fleet, every line the players typed in order (starting with the number of players) and, optionally, the player who
+won.  `battleship.py --record` appends sessions played at the terminal, and `generate` makes up sessions for load tests.
+`replay` plays sessions through the same code as the console game with a scriptedInput, discards the output and reports
+throughput and any session whose winner differs from the recorded one.
+
+    python sessions.py generate --sessions 1000 --players 2 --output sessions.jsonl
+    python sessions.py replay sessions.jsonl
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import time
+
+import battleship
+import playerinput
+import renderer
+
+def playSession(session):
+    """
+    playSession() plays one session with its output discarded.
+    :param session: Dictionary with "seed", "inputs" and optionally "rows", "columns", "fleet" and "salvo".
+    :return: Tuple of the winning player (None if the inputs ran out first) and the number of inputs read.
+    """
+    random.seed(session["seed"])
+    inputSource = playerinput.scriptedInput(session["inputs"])
+    with open(os.devnull,"w") as devnull, contextlib.redirect_stdout(devnull):
+        try:
+            winner = battleship.startGame(session.get("rows",10),session.get("columns",10),session.get("fleet"),
+                                          renderer.nullRenderer(),inputSource,salvo=session.get("salvo",False))
+        except EOFError:
+            winner = None
+    return winner,inputSource.consumed
+
+def generateSession(players,seed,rows=10,columns=10,fleet=None):
+    """
+    generateSession() makes up a session: random legal placements for each human player, then shots at every cell in a
+    random order.  Player two's shots are interleaved with player one's in a 2-player game.
+    :param players: Integer 1 or 2.
+    :param seed: Integer seed for both the made up answers and the NPC.
+    :param rows: Integer number of rows.
+    :param columns: Integer number of columns.
+    :param fleet: List of ship sizes.  Defaults to battleship.defaultFleet.
+    :return: Session dictionary including the winner.
+    """
+    rng = random.Random(seed)
+    inputs = [str(players)]
+    shots = []
+    for player in range(players):
+        scratch = battleship.Gameboard(None,rows,columns,fleet)
+        for shipSize in scratch.fleet:
+            while True:
+                start = battleship.rowLabel(rng.randrange(rows))+str(rng.randrange(columns)+1)
+                direction = rng.choice("NESW")
+                if battleship.validateAndAddShip(start,direction,shipSize,scratch):
+                    break
+            inputs += [start,direction]
+        targets = [battleship.rowLabel(row)+str(column+1) for row in range(rows) for column in range(columns)]
+        rng.shuffle(targets)
+        shots.append(targets)
+    for turn in zip(*shots):
+        inputs.extend(turn)
+    session = {"seed":seed,"rows":rows,"columns":columns,"fleet":list(fleet or battleship.defaultFleet),"inputs":inputs}
+    session["winner"] = playSession(session)[0]
+    return session
+
+def replaySessions(sessions):
+    """
+    replaySessions() plays every session and checks the winner against the recorded one where there is one.
+    :param sessions: Iterable of session dictionaries.
+    :return: Dictionary of results.
+    """
+    played = 0
+    inputs = 0
+    outcomes = {}
+    mismatches = []
+    start = time.perf_counter()
+    for number,session in enumerate(sessions):
+        winner,consumed = playSession(session)
+        played += 1
+        inputs += consumed
+        outcome = "incomplete" if winner is None else "player"+str(winner)
+        outcomes[outcome] = outcomes.get(outcome,0)+1
+        if "winner" in session and session["winner"] != winner:
+            mismatches.append(number)
+    elapsed = time.perf_counter()-start
+    return {"sessions":played,
+            "seconds":round(elapsed,3),
+            "sessionsPerSecond":round(played/elapsed,1) if elapsed else None,
+            "inputsPerSecond":round(inputs/elapsed,1) if elapsed else None,
+            "outcomes":outcomes,
+            "mismatches":mismatches}
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate and replay scripted human player sessions.")
+    commands = parser.add_subparsers(dest="command",required=True)
+    generate = commands.add_parser("generate",help="make up sessions")
+    generate.add_argument("--sessions",type=int,default=1000,help="number of sessions")
+    generate.add_argument("--players",type=int,choices=(1,2),default=1,help="human players per session")
+    generate.add_argument("--rows",type=int,default=10,help="gameboard rows")
+    generate.add_argument("--columns",type=int,default=10,help="gameboard columns")
+    generate.add_argument("--fleet",type=battleship.parseFleet,default=None,help="ship sizes, e.g. 5,4,3*2,2*4")
+    generate.add_argument("--seed",type=int,default=0,help="seed of the first session")
+    generate.add_argument("--output",required=True,help="JSON lines file to write")
+    replay = commands.add_parser("replay",help="play sessions and report throughput and mismatched winners")
+    replay.add_argument("path",help="JSON lines file of sessions")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        with open(args.output,"w") as outputFile:
+            for seed in range(args.seed,args.seed+args.sessions):
+                session = generateSession(args.players,seed,args.rows,args.columns,args.fleet)
+                outputFile.write(json.dumps(session)+"\n")
+        print(json.dumps({"sessions":args.sessions,"output":args.output},indent=2))
+    else:
+        with open(args.path) as sessionFile:
+            results = replaySessions(json.loads(line) for line in sessionFile if line.strip())
+        print(json.dumps(results,indent=2))
+
+if __name__ == '__main__':
+    main()
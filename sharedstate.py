@@ -0,0 +1,537 @@
+"""
+sharedstate.py
+Live games in shared memory.  A liveGames block is a multiprocessing.shared_memory segment holding a fixed number of
+game slots.  The simulator points both gameboards of a game at their slot, so Gameboard.cells and firedOn are written
+straight into shared memory by the usual game code and nothing is pickled or copied per turn.  Spectator and analytics
+processes attach to the segment by name and read any slot while the game goes on.
+
+Each slot starts with a sequence counter.  The simulator makes it odd before changing the slot and even again once the
+turn is done.  A reader copies the slot and accepts the copy only if the counter was even and unchanged across the copy,
+so it never sees half a turn.
+
+Layout, all integers little endian:
+    header   magic (8 bytes), rows, columns, slots, slotSize, running (uint32 each), padding to 32 bytes
+    slot     sequence (uint64), game number (uint64), turns (uint32), status, winner, last player, last result (uint8
+             each), last cell (uint32), remaining ships of player one and two (uint16 each), then rows*columns bytes
+             each of player one's cells, player one's firedOn, player two's cells and player two's firedOn.
+Cells and firedOn bytes use the codes of battleship.Gameboard.cells and battleship.cellMap.
+
+    python sharedstate.py --games 50 --slots 4 --readers 3 --show
+"""
+import argparse
+import json
+import multiprocessing
+import pickle
+import random
+import struct
+import time
+from multiprocessing import shared_memory
+
+import battleship
+import simulation
+
+magic = b"BSHPLIVE"
+headerFormat = "<8sIIIII"
+headerSize = 32
+# Offset of the running flag in the header.
+runningOffset = 24
+slotFormat = "<QQIBBBBIHH"
+slotHeaderSize = struct.calcsize(slotFormat)
+# The slot header after the sequence counter.
+slotFieldsFormat = "<"+slotFormat[2:]
+# Slot status.
+emptySlot = 0
+playingSlot = 1
+finishedSlot = 2
+
+def resultCode(result):
+    """
+    resultCode() packs a Gameboard.fireAtTarget() result into a byte.
+    :param result: "Miss", "Hit", "Repeat" or the size of the ship that sank.
+    :return: Integer 1 for a miss, 2 for a hit, 3 for a repeat or 3 plus the size of a ship that sank.
+    """
+    if result == "Miss":
+        return 1
+    if result == "Hit":
+        return 2
+    if result == "Repeat":
+        return 3
+    return 3+result
+
+def codeResult(code):
+    """
+    codeResult() unpacks a byte from resultCode().
+    :param code: Integer.
+    :return: The Gameboard.fireAtTarget() result, or None for 0 (no shot yet).
+    """
+    return (None,"Miss","Hit","Repeat")[code] if code <= 3 else code-3
+
+class liveGames:
+    """
+    liveGames class is a shared memory block of game slots.  The process that creates it owns it and removes it on
+    close(); other processes attach by name.
+    """
+    def __init__(self,memory,owner=False):
+        """
+        Use createLiveGames() or attachLiveGames() rather than creating a liveGames directly.
+        :param memory: multiprocessing.shared_memory.SharedMemory instance.
+        :param owner: Boolean, unlink the shared memory on close().
+        """
+        self.memory = memory
+        self.owner = owner
+        found,self.rows,self.columns,self.slots,self.slotSize,running = struct.unpack_from(headerFormat,memory.buf,0)
+        if found != magic:
+            raise ValueError(memory.name+" doesn't hold live games")
+        self.cells = self.rows*self.columns
+        # Slots the simulator in this process has attached gameboards to.
+        self.writers = {}
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    @property
+    def running(self):
+        return struct.unpack_from("<I",self.memory.buf,runningOffset)[0] != 0
+
+    def stop(self):
+        """
+        Tell readers no more turns are coming.
+        :return: None.
+        """
+        struct.pack_into("<I",self.memory.buf,runningOffset,0)
+
+    def slotOffset(self,slot):
+        return headerSize+slot*self.slotSize
+
+    def writer(self,slot):
+        """
+        Get the liveSlot used to write a slot from this process.
+        :param slot: Integer slot number.
+        :return: liveSlot instance.
+        """
+        if slot not in self.writers:
+            self.writers[slot] = liveSlot(self,slot)
+        return self.writers[slot]
+
+    def read(self,slot):
+        """
+        Copy a slot consistently.  Retries while the simulator is part way through a turn.
+        :param slot: Integer slot number.
+        :return: Dictionary with the slot's fields, its cells and firedOn bytes per player and the number of retries.
+        """
+        buffer = self.memory.buf
+        offset = self.slotOffset(slot)
+        retries = 0
+        while True:
+            before = struct.unpack_from("<Q",buffer,offset)[0]
+            if not before & 1:
+                data = bytes(buffer[offset:offset+self.slotSize])
+                if struct.unpack_from("<Q",buffer,offset)[0] == before:
+                    break
+            retries += 1
+            time.sleep(0)
+        sequence,game,turns,status,winner,lastPlayer,lastResult,lastCell,remainingOne,remainingTwo = \
+            struct.unpack_from(slotFormat,data,0)
+        cells = self.cells
+        start = slotHeaderSize
+        return {"slot":slot,
+                "sequence":sequence,
+                "game":game,
+                "turns":turns,
+                "status":status,
+                "winner":winner or None,
+                "lastShot":(lastPlayer,lastCell,codeResult(lastResult)) if lastResult else None,
+                "remainingShips":(remainingOne,remainingTwo),
+                "cells":(data[start:start+cells],data[start+2*cells:start+3*cells]),
+                "firedOn":(data[start+cells:start+2*cells],data[start+3*cells:start+4*cells]),
+                "retries":retries}
+
+    def gameboard(self,snapshot,player):
+        """
+        Build a read-only Gameboard from a slot read with read(), e.g. to call renderGameboard() on it.
+        :param snapshot: Dictionary from read().
+        :param player: Integer 1 or 2.
+        :return: Gameboard instance backed by the snapshot's bytes.
+        """
+        gameboard = battleship.Gameboard(player,self.rows,self.columns)
+        gameboard.cells = snapshot["cells"][player-1]
+        gameboard.firedOn.cells = snapshot["firedOn"][player-1]
+        gameboard.remainingShips = snapshot["remainingShips"][player-1]
+        return gameboard
+
+    def close(self):
+        """
+        Detach every gameboard still pointing at this block and close it, removing it if this process created it.
+        :return: None.
+        """
+        for writer in self.writers.values():
+            writer.detach()
+        self.writers = {}
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+def createLiveGames(slots,rows=10,columns=10):
+    """
+    createLiveGames() creates a shared memory block for live games.
+    :param slots: Integer number of games that can be live at once.
+    :param rows: Integer number of gameboard rows.
+    :param columns: Integer number of gameboard columns.
+    :return: liveGames instance owning the block.
+    """
+    if rows*columns > battleship.denseCells:
+        raise ValueError("only gameboards of up to "+str(battleship.denseCells)+" cells can be shared")
+    slotSize = slotHeaderSize+4*rows*columns
+    slotSize += -slotSize % 8
+    memory = shared_memory.SharedMemory(create=True,size=headerSize+slots*slotSize)
+    memory.buf[:headerSize+slots*slotSize] = bytes(headerSize+slots*slotSize)
+    struct.pack_into(headerFormat,memory.buf,0,magic,rows,columns,slots,slotSize,1)
+    return liveGames(memory,owner=True)
+
+def attachLiveGames(name):
+    """
+    attachLiveGames() attaches to a block made by createLiveGames() in another process.
+    :param name: String shared memory name, liveGames.name in the creating process.
+    :return: liveGames instance.
+    """
+    return liveGames(shared_memory.SharedMemory(name=name))
+
+class liveSlot:
+    """
+    liveSlot class is the simulator's side of a slot.  attach() points a game's gameboards at the slot, and every turn is
+    wrapped in beginTurn() and endTurn() so readers only see whole turns.
+    """
+    def __init__(self,games,slot):
+        self.games = games
+        self.offset = games.slotOffset(slot)
+        self.gameboards = ()
+        self.views = []
+        self.turns = 0
+
+    def sequence(self):
+        return struct.unpack_from("<Q",self.games.memory.buf,self.offset)[0]
+
+    def beginTurn(self):
+        """
+        Mark the slot as being changed.
+        :return: None.
+        """
+        struct.pack_into("<Q",self.games.memory.buf,self.offset,self.sequence()+1)
+
+    def endTurn(self,player=0,cell=0,result=None,status=playingSlot,winner=0):
+        """
+        Record the turn's outcome and mark the slot as consistent again.
+        :param player: Integer player who fired.
+        :param cell: Integer cell fired at.
+        :param result: Result from Gameboard.fireAtTarget(), or None if no shot was fired.
+        :param status: Integer slot status.
+        :param winner: Integer winning player, 0 while the game goes on.
+        :return: None.
+        """
+        buffer = self.games.memory.buf
+        if result is not None:
+            self.turns += 1
+        remaining = [gameboard.remainingShips for gameboard in self.gameboards] or [0,0]
+        struct.pack_into(slotFieldsFormat,buffer,self.offset+8,self.game,self.turns,status,winner,player,
+                         0 if result is None else resultCode(result),cell,remaining[0],remaining[1])
+        struct.pack_into("<Q",buffer,self.offset,self.sequence()+1)
+
+    def attach(self,playerOneGameboard,playerTwoGameboard,game):
+        """
+        Copy a game's gameboards into the slot and point them at it, replacing the slot's previous game.
+        :param playerOneGameboard: Gameboard instance for player one.
+        :param playerTwoGameboard: Gameboard instance for player two.
+        :param game: Integer game number readers see.
+        :return: None.
+        """
+        for gameboard in (playerOneGameboard,playerTwoGameboard):
+            if gameboard.rows != self.games.rows or gameboard.columns != self.games.columns:
+                raise ValueError("the gameboard doesn't match the slot's size")
+            if not isinstance(gameboard.cells,bytearray) or not isinstance(gameboard.firedOn,battleship.cellMap) or \
+                    len(gameboard.ships) > 126:
+                raise ValueError("only Gameboards with one byte per cell can be shared")
+            # A fork would copy shared structures away from the slot on its first change, so take private copies now.
+            if gameboard.sharedBoard:
+                gameboard.ownBoard()
+            if gameboard.sharedFiredOn:
+                gameboard.firedOn = gameboard.firedOn.copy()
+                gameboard.sharedFiredOn = False
+        self.detach()
+        self.beginTurn()
+        buffer = self.games.memory.buf
+        cells = self.games.cells
+        start = self.offset+slotHeaderSize
+        for index,gameboard in enumerate((playerOneGameboard,playerTwoGameboard)):
+            cellsView = buffer[start+2*index*cells:start+(2*index+1)*cells]
+            firedOnView = buffer[start+(2*index+1)*cells:start+(2*index+2)*cells]
+            cellsView[:] = gameboard.cells
+            firedOnView[:] = gameboard.firedOn.cells
+            gameboard.cells = cellsView
+            gameboard.firedOn.cells = firedOnView
+            self.views += [cellsView,firedOnView]
+        self.gameboards = (playerOneGameboard,playerTwoGameboard)
+        self.game = game
+        self.turns = 0
+        self.endTurn()
+
+    def detach(self):
+        """
+        Give the attached gameboards private copies of their cells and firedOn and release the slot.
+        :return: None.
+        """
+        for gameboard in self.gameboards:
+            gameboard.cells = bytearray(gameboard.cells)
+            gameboard.firedOn.cells = bytearray(gameboard.firedOn.cells)
+        for view in self.views:
+            view.release()
+        self.gameboards = ()
+        self.views = []
+
+def playLiveGame(games,slot,game,seed,strategy="hunt",turnDelay=0.0):
+    """
+    playLiveGame() plays a 0-player game in a slot, one turn per step.
+    :param games: liveGames instance.
+    :param slot: Integer slot number.
+    :param game: Integer game number.
+    :param seed: Integer seed used to set up the fleets.
+    :param strategy: String key into simulation.STRATEGIES.
+    :param turnDelay: Float seconds to sleep after each turn so the game can be watched.
+    :return: Generator yielding the seconds each turn took, slot bookkeeping included.
+    """
+    random.seed(seed)
+    playerOneGameboard = battleship.autoGameboardSetup(1,rows=games.rows,columns=games.columns)
+    playerTwoGameboard = battleship.autoGameboardSetup(2,rows=games.rows,columns=games.columns)
+    writer = games.writer(slot)
+    writer.attach(playerOneGameboard,playerTwoGameboard,game)
+    stateFactory,fireFunction = simulation.STRATEGIES[strategy]
+    turns = ((playerOneGameboard,stateFactory(),playerTwoGameboard),(playerTwoGameboard,stateFactory(),playerOneGameboard))
+    while True:
+        for aggressorGameboard,state,targetGameboard in turns:
+            start = time.perf_counter()
+            writer.beginTurn()
+            target,result = fireFunction(aggressorGameboard,state,targetGameboard,verbose=False)
+            cell = target[0]*games.columns+target[1]
+            if targetGameboard.remainingShips == 0:
+                writer.endTurn(aggressorGameboard.player,cell,result,finishedSlot,aggressorGameboard.player)
+                yield time.perf_counter()-start
+                return
+            writer.endTurn(aggressorGameboard.player,cell,result)
+            yield time.perf_counter()-start
+            if turnDelay:
+                time.sleep(turnDelay)
+
+def privateCopy(gameboard):
+    """
+    privateCopy() copies an attached gameboard out of shared memory without touching it, unlike fork() which would make
+    the attached gameboard copy itself away from its slot on its next change.
+    :param gameboard: Gameboard instance.
+    :return: Gameboard instance with its own cells, ships and firedOn.
+    """
+    clone = object.__new__(gameboard.__class__)
+    battleship.copyState(gameboard,clone)
+    clone.cells = bytearray(gameboard.cells)
+    clone.ships = [ship.copy() for ship in gameboard.ships]
+    clone.firedOn = gameboard.firedOn.copy()
+    clone.sharedBoard = clone.sharedFiredOn = False
+    return clone
+
+def runSimulator(name,games,strategy,seed,turnDelay,ready,results):
+    """
+    runSimulator() is the simulator process of the demo.  It keeps every slot busy with a game, stepping the games in
+    turn, and stops the block when all games are done.  It also times pickling both gameboards, which is what mirroring
+    a game to another process would cost without shared memory.
+    :param name: String shared memory name.
+    :param games: Integer number of games to play.
+    :param strategy: String key into simulation.STRATEGIES.
+    :param seed: Integer base seed.
+    :param turnDelay: Float seconds to sleep after each turn.
+    :param ready: multiprocessing.Barrier every process waits at once it has attached.
+    :param results: multiprocessing.Queue the report is put on.
+    :return: None.
+    """
+    block = attachLiveGames(name)
+    try:
+        ready.wait()
+        report = simulateLiveGames(block,games,strategy,seed,turnDelay)
+    finally:
+        # Readers poll until the block stops, so stop it even if a game fails.
+        block.stop()
+        block.close()
+    results.put(("simulator",report))
+
+def simulateLiveGames(block,games,strategy,seed,turnDelay):
+    """
+    simulateLiveGames() is the body of runSimulator().
+    :param block: liveGames instance.
+    :param games: Integer number of games to play.
+    :param strategy: String key into simulation.STRATEGIES.
+    :param seed: Integer base seed.
+    :param turnDelay: Float seconds to sleep after each turn.
+    :return: Dictionary report.
+    """
+    seeds = simulation.gameSeeds(games,seed)
+    active = {}
+    nextGame = 0
+    turns = 0
+    turnSeconds = 0.0
+    pickleSeconds = 0.0
+    pickled = 0
+    start = time.perf_counter()
+    while nextGame < games or active:
+        for slot in range(block.slots):
+            if slot not in active and nextGame < games:
+                active[slot] = playLiveGame(block,slot,nextGame,seeds[nextGame],strategy,turnDelay)
+                nextGame += 1
+            if slot in active:
+                try:
+                    turnSeconds += next(active[slot])
+                    turns += 1
+                except StopIteration:
+                    del active[slot]
+                    continue
+                if turns % 50 == 0:
+                    gameboards = tuple(privateCopy(gameboard) for gameboard in block.writer(slot).gameboards)
+                    pickleStart = time.perf_counter()
+                    pickle.dumps(gameboards)
+                    pickleSeconds += time.perf_counter()-pickleStart
+                    pickled += 1
+    elapsed = time.perf_counter()-start
+    return {"games":games,
+            "turns":turns,
+            "seconds":round(elapsed,3),
+            "turnsPerSecond":round(turns/elapsed,1),
+            "microsecondsPerTurn":round(turnSeconds/turns*1e6,2),
+            "microsecondsToPickleBothGameboards":round(pickleSeconds/max(1,pickled)*1e6,2)}
+
+def runSpectator(name,interval,ready,results):
+    """
+    runSpectator() is a spectator process of the demo.  It renders slot 0 from player one's side every interval.
+    :param name: String shared memory name.
+    :param interval: Float seconds between frames.
+    :param ready: multiprocessing.Barrier every process waits at once it has attached.
+    :param results: multiprocessing.Queue the report is put on.
+    :return: None.
+    """
+    block = attachLiveGames(name)
+    ready.wait()
+    frames = 0
+    retries = 0
+    frame = ""
+    while block.running:
+        snapshot = block.read(0)
+        retries += snapshot["retries"]
+        if snapshot["status"] != emptySlot:
+            frame = "Game "+str(snapshot["game"])+", turn "+str(snapshot["turns"])+"\n"+\
+                    block.gameboard(snapshot,1).renderGameboard()
+            frames += 1
+        time.sleep(interval)
+    block.close()
+    results.put(("spectator",{"frames":frames,"retries":retries,"lastFrame":frame}))
+
+def runAnalytics(name,reader,ready,results):
+    """
+    runAnalytics() is an analytics process of the demo.  It polls every slot as fast as it can, counts the turns and
+    finished games it sees and checks every copy it reads for consistency with the turn counter.
+    :param name: String shared memory name.
+    :param reader: Integer reader number.
+    :param ready: multiprocessing.Barrier every process waits at once it has attached.
+    :param results: multiprocessing.Queue the report is put on.
+    :return: None.
+    """
+    block = attachLiveGames(name)
+    ready.wait()
+    reads = 0
+    retries = 0
+    inconsistent = 0
+    seen = {}
+    finished = {}
+    hitCells = [0]*block.cells
+    start = time.perf_counter()
+    running = True
+    while running:
+        # One last pass after the simulator stops picks up the games that finished at the very end.
+        running = block.running
+        for slot in range(block.slots):
+            snapshot = block.read(slot)
+            reads += 1
+            retries += snapshot["retries"]
+            if snapshot["status"] == emptySlot:
+                continue
+            # Every turn is exactly one shot, so a whole turn shows as shots on both firedOn boards adding up to turns.
+            fired = sum(len(firedOn)-firedOn.count(0) for firedOn in snapshot["firedOn"])
+            if fired != snapshot["turns"]:
+                inconsistent += 1
+            seen[snapshot["game"]] = max(seen.get(snapshot["game"],0),snapshot["turns"])
+            if snapshot["status"] == finishedSlot and snapshot["game"] not in finished:
+                finished[snapshot["game"]] = snapshot["winner"]
+                for firedOn in snapshot["firedOn"]:
+                    for cell,value in enumerate(firedOn):
+                        if value == 2:
+                            hitCells[cell] += 1
+    elapsed = time.perf_counter()-start
+    block.close()
+    results.put(("analytics"+str(reader),{"reads":reads,
+                                          "readsPerSecond":round(reads/elapsed,1) if elapsed else None,
+                                          "retries":retries,
+                                          "inconsistentReads":inconsistent,
+                                          "gamesSeen":len(seen),
+                                          "finishedGamesSeen":len(finished),
+                                          "playerOneWinsSeen":sum(1 for winner in finished.values() if winner == 1),
+                                          "mostHitCell":battleship.gameboardGeometry(block.rows,block.columns).label(
+                                              max(range(block.cells),key=hitCells.__getitem__))}))
+
+def runDemo(games=50,slots=4,readers=3,strategy="hunt",seed=0,turnDelay=0.0002,interval=0.05):
+    """
+    runDemo() runs one simulator process and several reader processes against a shared liveGames block.  The first
+    reader is a spectator rendering frames, the rest are analytics readers.
+    :param games: Integer number of games to play.
+    :param slots: Integer number of games live at once.
+    :param readers: Integer number of reader processes.
+    :param strategy: String key into simulation.STRATEGIES.
+    :param seed: Integer base seed.
+    :param turnDelay: Float seconds the simulator sleeps after each turn.
+    :param interval: Float seconds between spectator frames.
+    :return: Dictionary of every process's report.
+    """
+    block = createLiveGames(slots)
+    results = multiprocessing.Queue()
+    # The simulator waits for every reader to attach, so short runs aren't over before the readers start.
+    ready = multiprocessing.Barrier(readers+1)
+    processes = []
+    for reader in range(readers):
+        if reader == 0:
+            processes.append(multiprocessing.Process(target=runSpectator,args=(block.name,interval,ready,results)))
+        else:
+            processes.append(multiprocessing.Process(target=runAnalytics,args=(block.name,reader,ready,results)))
+    processes.append(multiprocessing.Process(target=runSimulator,args=(block.name,games,strategy,seed,turnDelay,ready,results)))
+    try:
+        for process in processes:
+            process.start()
+        reports = dict(results.get() for process in processes)
+        for process in processes:
+            process.join()
+    finally:
+        block.close()
+    return {name:reports[name] for name in sorted(reports)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Play games in shared memory while other processes watch them.")
+    parser.add_argument("--games",type=int,default=50,help="number of games to play")
+    parser.add_argument("--slots",type=int,default=4,help="games live at once")
+    parser.add_argument("--readers",type=int,default=3,help="reader processes, the first renders frames")
+    parser.add_argument("--strategy",choices=sorted(simulation.STRATEGIES),default="hunt",help="NPC targeting strategy")
+    parser.add_argument("--seed",type=int,default=0,help="base seed for reproducible runs")
+    parser.add_argument("--turn-delay",type=float,default=0.0002,help="seconds the simulator sleeps after each turn, 0 for full speed")
+    parser.add_argument("--interval",type=float,default=0.05,help="seconds between spectator frames")
+    parser.add_argument("--show",action="store_true",help="print the spectator's last frame")
+    args = parser.parse_args()
+    reports = runDemo(args.games,args.slots,args.readers,args.strategy,args.seed,args.turn_delay,args.interval)
+    if "spectator" in reports:
+        frame = reports["spectator"].pop("lastFrame")
+        if args.show:
+            print(frame)
+    print(json.dumps(reports,indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+"""
+simulation.py
+Headless batch simulation of 0-player games.  Games are played without any console I/O and spread across a process
+pool so large AI-vs-AI runs scale with the number of cores.
+"""
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import battleship
+import bitboard
+import density
+import instrumentation
+import montecarlo
+import openingbook
+
+# Gameboard backends selectable from the command line.
+BACKENDS = {"dict":battleship.Gameboard,"bitboard":bitboard.BitboardGameboard}
+# NPC strategies selectable from the command line.  This is the strategy interface: each entry is a (per-game state
+# factory, fire function) pair where the fire function has the same signature as battleship.autoFireAtTarget().  New
+# strategies are added here so worker processes see them too.
+STRATEGIES = {"hunt":(battleship.targetFrontier,battleship.autoFireAtTarget),
+              "density":(density.densityMap,density.densityFireAtTarget),
+              "random":(battleship.targetFrontier,battleship.randomFireAtTarget),
+              "montecarlo":(montecarlo.fleetSampler,montecarlo.monteCarloFireAtTarget),
+              "book":(openingbook.bookFrontier,battleship.autoFireAtTarget)}
+# Strategies whose state factory takes the opponent's fleet, a list of ship sizes, as its first argument.  The others
+# don't depend on the fleet.
+FLEET_STRATEGIES = {"density","montecarlo"}
+# Strategies whose state factory takes the target gameboard's boardGeometry, so they can play on gameboards of any size.
+# The others only know the standard 10x10 gameboard.
+SCALABLE_STRATEGIES = {"hunt":(battleship.createFrontier,battleship.autoFireAtTarget),
+                       "random":(battleship.createFrontier,battleship.randomFireAtTarget)}
+# Strategies that can play the salvo variant, as (state factory taking a boardGeometry, volley function) pairs where the
+# volley function has the same signature as battleship.autoFireVolley().
+SALVO_STRATEGIES = {"hunt":(battleship.createFrontier,battleship.autoFireVolley),
+                    "random":(battleship.createFrontier,battleship.randomFireVolley)}
+
+def createState(strategy,fleet=None,rng=None):
+    """
+    createState() creates the per-game state of a STRATEGIES strategy firing at a 10x10 gameboard.
+    :param strategy: String key into STRATEGIES.
+    :param fleet: List of ship sizes on the gameboard being fired at, defaults to battleship.defaultFleet.
+    :param rng: random.Random instance the strategy draws from, defaults to the random module.
+    :return: State passed to the strategy's fire function.
+    """
+    stateFactory = STRATEGIES[strategy][0]
+    if strategy in FLEET_STRATEGIES and fleet is not None:
+        return stateFactory(fleet,rng=rng)
+    return stateFactory(rng=rng)
+
+def playGame(playerOneGameboard,playerTwoGameboard,strategies=("hunt","hunt"),record=False,firstPlayer=1):
+    """
+    playGame() plays two set up gameboards against each other silently.
+    :param playerOneGameboard: Gameboard instance for player one.
+    :param playerTwoGameboard: Gameboard instance for player two.
+    :param strategies: Pair of string keys into STRATEGIES, one per player.  Gameboards of any other size than 10x10
+    need keys into SCALABLE_STRATEGIES.
+    :param record: Boolean, also return both fleet layouts and every shot so the game can be archived with records.py.
+    :param firstPlayer: Integer player who fires first, 1 or 2.
+    :return: Dictionary with the winner, shot counts and sink order of the game, plus "layouts" and "shotStream" (a list
+    of (player, cell index, result) tuples) when record is True.  "firstPlayer" is only included when it's 2.
+    """
+    if playerOneGameboard.geometry is battleship.standardGeometry:
+        turns = ((playerOneGameboard,createState(strategies[0],playerTwoGameboard.fleet),STRATEGIES[strategies[0]][1],
+                  playerTwoGameboard),
+                 (playerTwoGameboard,createState(strategies[1],playerOneGameboard.fleet),STRATEGIES[strategies[1]][1],
+                  playerOneGameboard))
+    else:
+        playerOneState,playerOneFire = SCALABLE_STRATEGIES[strategies[0]]
+        playerTwoState,playerTwoFire = SCALABLE_STRATEGIES[strategies[1]]
+        turns = ((playerOneGameboard,playerOneState(playerTwoGameboard.geometry),playerOneFire,playerTwoGameboard),
+                 (playerTwoGameboard,playerTwoState(playerOneGameboard.geometry),playerTwoFire,playerOneGameboard))
+    if firstPlayer == 2:
+        turns = turns[::-1]
+    columns = playerOneGameboard.columns
+    shots = {1:0,2:0}
+    # sinkOrder holds (aggressor player, ship size) pairs in the order the ships went down.
+    sinkOrder = []
+    shotStream = []
+    while True:
+        for aggressorGameboard,aggressorState,fireAtTarget,targetGameboard in turns:
+            target,result = fireAtTarget(aggressorGameboard,aggressorState,targetGameboard,verbose=False)
+            shots[aggressorGameboard.player] += 1
+            if record:
+                shotStream.append((aggressorGameboard.player,target[0]*columns+target[1],result))
+            if isinstance(result,int):
+                sinkOrder.append((aggressorGameboard.player,result))
+                # Unlike the console loop, stop as soon as the last ship sinks so the loser doesn't get a free shot.
+                if targetGameboard.remainingShips == 0:
+                    gameResult = {"winner":aggressorGameboard.player,
+                                  "shots":shots[aggressorGameboard.player],
+                                  "totalShots":shots[1]+shots[2],
+                                  "sinkOrder":sinkOrder}
+                    if firstPlayer == 2:
+                        gameResult["firstPlayer"] = 2
+                    if record:
+                        gameResult["layouts"] = [playerOneGameboard.shipLayout(),playerTwoGameboard.shipLayout()]
+                        gameResult["shotStream"] = shotStream
+                    return gameResult
+
+def playSalvoGame(playerOneGameboard,playerTwoGameboard,strategies=("hunt","hunt"),record=False,firstPlayer=1):
+    """
+    playSalvoGame() is playGame() for the salvo variant: every turn fires one shot per ship the aggressor has afloat,
+    resolved together by Gameboard.fireVolley().
+    :param playerOneGameboard: Gameboard instance for player one.
+    :param playerTwoGameboard: Gameboard instance for player two.
+    :param strategies: Pair of string keys into SALVO_STRATEGIES, one per player.
+    :param record: Boolean, also return both fleet layouts and every shot.  See playGame().
+    :param firstPlayer: Integer player who fires first, 1 or 2.
+    :return: Dictionary with the same fields as playGame() plus "salvo" and "volleys", the number of turns the winner
+    took.  "shots" counts single shots.
+    """
+    playerOneState,playerOneFire = SALVO_STRATEGIES[strategies[0]]
+    playerTwoState,playerTwoFire = SALVO_STRATEGIES[strategies[1]]
+    turns = ((playerOneGameboard,playerOneState(playerTwoGameboard.geometry),playerOneFire,playerTwoGameboard),
+             (playerTwoGameboard,playerTwoState(playerOneGameboard.geometry),playerTwoFire,playerOneGameboard))
+    if firstPlayer == 2:
+        turns = turns[::-1]
+    columns = playerOneGameboard.columns
+    shots = {1:0,2:0}
+    volleys = {1:0,2:0}
+    sinkOrder = []
+    shotStream = []
+    while True:
+        for aggressorGameboard,aggressorState,fireVolley,targetGameboard in turns:
+            player = aggressorGameboard.player
+            volley = fireVolley(aggressorGameboard,aggressorState,targetGameboard,aggressorGameboard.remainingShips,
+                                verbose=False)
+            shots[player] += len(volley.results)
+            volleys[player] += 1
+            if record:
+                shotStream.extend((player,target[0]*columns+target[1],result) for target,result in volley)
+            if volley.sunk:
+                sinkOrder.extend((player,shipSize) for shipSize in volley.sunk)
+                if targetGameboard.remainingShips == 0:
+                    gameResult = {"winner":player,
+                                  "shots":shots[player],
+                                  "totalShots":shots[1]+shots[2],
+                                  "sinkOrder":sinkOrder,
+                                  "salvo":True,
+                                  "volleys":volleys[player]}
+                    if firstPlayer == 2:
+                        gameResult["firstPlayer"] = 2
+                    if record:
+                        gameResult["layouts"] = [playerOneGameboard.shipLayout(),playerTwoGameboard.shipLayout()]
+                        gameResult["shotStream"] = shotStream
+                    return gameResult
+
+def playHeadlessGame(seed,backend="dict",strategy="hunt",record=False,rows=10,columns=10,fleet=None,firstPlayer=1,
+                     salvo=False):
+    """
+    playHeadlessGame() plays a single 0-player game silently.  The module level RNG used by battleship.py is reseeded
+    with the game's own seed so every game is reproducible no matter which worker process ends up playing it.
+    :param seed: Integer seed for this game.
+    :param backend: String key into BACKENDS selecting the Gameboard implementation.
+    :param strategy: String key into STRATEGIES selecting how both NPCs pick targets.
+    :param record: Boolean, also return both fleet layouts and every shot.  See playGame().
+    :param rows: Integer number of gameboard rows.
+    :param columns: Integer number of gameboard columns.
+    :param fleet: List of ship sizes, defaults to battleship.defaultFleet.
+    :param firstPlayer: Integer player who fires first, 1 or 2.
+    :param salvo: Boolean, play the salvo variant with a strategy from SALVO_STRATEGIES.  See playSalvoGame().
+    :return: Dictionary with the seed followed by the fields returned by playGame() or playSalvoGame().
+    """
+    random.seed(seed)
+    gameboardClass = BACKENDS[backend]
+    playerOneGameboard = battleship.autoGameboardSetup(1,gameboardClass,False,rows,columns,fleet)
+    playerTwoGameboard = battleship.autoGameboardSetup(2,gameboardClass,False,rows,columns,fleet)
+    gameResult = {"seed":seed}
+    play = playSalvoGame if salvo else playGame
+    gameResult.update(play(playerOneGameboard,playerTwoGameboard,(strategy,strategy),record,firstPlayer))
+    return gameResult
+
+def playHeadlessGames(seeds,backend="dict",strategy="hunt",record=False,rows=10,columns=10,fleet=None,salvo=False):
+    """
+    playHeadlessGames() plays a chunk of games inside one worker process.
+    :param seeds: List of integer seeds, one per game.
+    :param backend: String key into BACKENDS selecting the Gameboard implementation.
+    :param strategy: String key into STRATEGIES.
+    :param record: Boolean, include layouts and shot streams.  See playHeadlessGame().
+    :param rows: Integer number of gameboard rows.
+    :param columns: Integer number of gameboard columns.
+    :param fleet: List of ship sizes, defaults to battleship.defaultFleet.
+    :param salvo: Boolean, play the salvo variant.
+    :return: List of game result dictionaries in the same order as the seeds.
+    """
+    return [playHeadlessGame(seed,backend,strategy,record,rows,columns,fleet,salvo=salvo) for seed in seeds]
+
+def gameSeeds(games,seed):
+    """
+    gameSeeds() derives the per-game seeds for a run from a single base seed.
+    :param games: Integer number of games.
+    :param seed: Integer base seed.
+    :return: List of integer seeds.
+    """
+    seedGenerator = random.Random(seed)
+    return [seedGenerator.getrandbits(64) for i in range(games)]
+
+def simulateGames(games,workers=None,seed=0,chunkSize=None,backend="dict",strategy="hunt",record=False,rows=10,columns=10,
+                  fleet=None,salvo=False):
+    """
+    simulateGames() plays a batch of headless 0-player games over a process pool.
+    :param games: Integer number of games to play.
+    :param workers: Integer number of worker processes.  Defaults to the CPU count; 1 plays every game in this process.
+    :param seed: Integer base seed.  The same seed always produces the same results regardless of the worker count.
+    :param chunkSize: Integer number of games handed to a worker at once.  Defaults to an even split into 4 chunks per
+    worker so the pool stays busy without paying inter-process overhead on every game.
+    :param backend: String key into BACKENDS selecting the Gameboard implementation.
+    :param strategy: String key into STRATEGIES.
+    :param record: Boolean, include layouts and shot streams.  See playHeadlessGame().
+    :param rows: Integer number of gameboard rows.
+    :param columns: Integer number of gameboard columns.
+    :param fleet: List of ship sizes, defaults to battleship.defaultFleet.
+    :param salvo: Boolean, play the salvo variant.
+    :return: List of game result dictionaries ordered by game index.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    seeds = gameSeeds(games,seed)
+    if workers <= 1:
+        return playHeadlessGames(seeds,backend,strategy,record,rows,columns,fleet,salvo)
+    if chunkSize is None:
+        chunkSize = max(1,-(-games//(workers*4)))
+    chunks = [seeds[i:i+chunkSize] for i in range(0,games,chunkSize)]
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk in executor.map(partial(playHeadlessGames,backend=backend,strategy=strategy,record=record,
+                                                  rows=rows,columns=columns,fleet=fleet,salvo=salvo),chunks):
+            results.extend(chunk)
+    return results
+
+def summarizeResults(results,elapsed):
+    """
+    summarizeResults() reduces a list of game results into a printable summary.
+    :param results: List of game result dictionaries.
+    :param elapsed: Float representing wall clock seconds spent playing.
+    :return: Dictionary of summary statistics.
+    """
+    games = len(results)
+    playerOneWins = sum(1 for i in results if i["winner"] == 1)
+    return {"games":games,
+            "seconds":round(elapsed,3),
+            "gamesPerSecond":round(games/elapsed,1) if elapsed > 0 else None,
+            "playerOneWinRate":round(playerOneWins/games,4) if games else None,
+            "meanShotsToWin":round(sum(i["shots"] for i in results)/games,2) if games else None}
+
+def main():
+    parser = argparse.ArgumentParser(description="Play headless 0-player Battleship games in parallel.")
+    parser.add_argument("--games",type=int,default=1000,help="number of games to play")
+    parser.add_argument("--workers",type=int,default=None,help="worker processes (default: CPU count)")
+    parser.add_argument("--seed",type=int,default=0,help="base seed for reproducible runs")
+    parser.add_argument("--backend",choices=sorted(BACKENDS),default="dict",help="Gameboard implementation")
+    parser.add_argument("--strategy",choices=sorted(STRATEGIES),default="hunt",help="NPC targeting strategy")
+    parser.add_argument("--rows",type=int,default=10,help="gameboard rows")
+    parser.add_argument("--columns",type=int,default=10,help="gameboard columns")
+    parser.add_argument("--fleet",type=battleship.parseFleet,default=None,help="ship sizes, e.g. 5,4,3*2,2*4 (default: 1,1,2,2,3,4,5)")
+    parser.add_argument("--salvo",action="store_true",help="salvo variant: one shot per ship afloat each turn")
+    parser.add_argument("--output",default=None,help="write per-game results to this file as JSON lines")
+    parser.add_argument("--instrument",action="store_true",help="collect engine and NPC counters (plays in this process)")
+    parser.add_argument("--profile",default=None,help="also write a cProfile file per phase to this directory")
+    args = parser.parse_args()
+    if (args.rows,args.columns) != (10,10) and args.strategy not in SCALABLE_STRATEGIES:
+        parser.error("only "+", ".join(sorted(SCALABLE_STRATEGIES))+" can play on gameboards other than 10x10")
+    if args.salvo and args.strategy not in SALVO_STRATEGIES:
+        parser.error("only "+", ".join(sorted(SALVO_STRATEGIES))+" can play the salvo variant")
+    if args.strategy == "book":
+        openingbook.reportMissingBook()
+
+    # Counters live in each process, so instrumented runs don't use the pool.
+    if args.instrument or args.profile:
+        args.workers = 1
+        instrumentation.enable(profile=args.profile is not None)
+
+    start = time.perf_counter()
+    results = simulateGames(args.games,args.workers,args.seed,backend=args.backend,strategy=args.strategy,
+                            rows=args.rows,columns=args.columns,fleet=args.fleet,salvo=args.salvo)
+    elapsed = time.perf_counter()-start
+
+    if args.output:
+        with open(args.output,"w") as outputFile:
+            for i in results:
+                outputFile.write(json.dumps(i)+"\n")
+    summary = summarizeResults(results,elapsed)
+    if instrumentation.enabled:
+        summary["instrumentation"] = instrumentation.snapshot()
+        if args.profile:
+            summary["profiles"] = instrumentation.dumpProfiles(args.profile)
+    print(json.dumps(summary,indent=2))
+
+if __name__ == '__main__':
+    main()
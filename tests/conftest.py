@@ -0,0 +1,8 @@
+"""
+conftest.py
+The game modules live at the top of the repository rather than in a package, so put it on the import path.
+"""
+import os
+import sys
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,157 @@
+"""
+test_gameboard.py
+Gameboard behaviour on the dense and sparse backends, the bitboard backend against the dictionary one, and the
+records.py round trip.
+"""
+import random
+
+import pytest
+
+import battleship
+import bitboard
+import records
+import simulation
+
+# 10x10 keeps one byte per cell, 120x120 is past denseCells and only stores ships and shots.
+SIZES = {"dense":(10,10),"sparse":(120,120)}
+
+def fleetBoard(rows,columns,gameboardClass=battleship.Gameboard):
+    """
+    Build a gameboard with a 3-cell ship in the top left corner, a 1-cell ship in the middle and a 2-cell ship in the
+    bottom right corner.
+    :param rows: Integer number of rows.
+    :param columns: Integer number of columns.
+    :param gameboardClass: Gameboard class or subclass to create.
+    :return: Gameboard instance.
+    """
+    gameboard = gameboardClass(1,rows,columns)
+    for coordinates in ([(0,0),(0,1),(0,2)],[(rows//2,columns//2)],[(rows-1,columns-2),(rows-1,columns-1)]):
+        assert gameboard.addShip(coordinates)
+    return gameboard
+
+@pytest.fixture(params=sorted(SIZES))
+def gameboard(request):
+    rows,columns = SIZES[request.param]
+    return fleetBoard(rows,columns)
+
+def test_backend(gameboard):
+    assert isinstance(gameboard.cells,bytearray) == (gameboard.geometry.cells <= battleship.denseCells)
+
+def test_addShip_counts_ships(gameboard):
+    assert gameboard.remainingShips == 3
+    assert not gameboard.addShip([(0,2),(1,2)])
+    assert gameboard.remainingShips == 3
+    assert gameboard.shipLayout()[0] == [(0,0),(0,1),(0,2)]
+
+def test_fire_and_sink(gameboard):
+    middle = (gameboard.rows//2,gameboard.columns//2)
+    assert gameboard.fireAtTarget((1,0)) == "Miss"
+    assert gameboard.fireAtTarget((1,0)) == "Repeat"
+    assert gameboard.fireAtTarget((0,0)) == "Hit"
+    assert gameboard.fireAtTarget((0,0)) == "Repeat"
+    assert gameboard.fireAtTarget((0,1)) == "Hit"
+    assert gameboard.fireAtTarget((0,2)) == 3
+    assert gameboard.remainingShips == 2
+    assert gameboard.fireAtTarget(middle) == 1
+    assert gameboard.fireAtTarget((gameboard.rows-1,gameboard.columns-2)) == "Hit"
+    assert gameboard.fireAtTarget((gameboard.rows-1,gameboard.columns-1)) == 2
+    assert gameboard.remainingShips == 0
+
+def test_fork_is_independent(gameboard):
+    clone = gameboard.fork()
+    assert clone.fireAtTarget((0,0)) == "Hit"
+    assert gameboard.fireAtTarget((0,0)) == "Hit"
+    assert gameboard.fireAtTarget((0,1)) == "Hit"
+    assert gameboard.fireAtTarget((0,2)) == 3
+    assert clone.fireAtTarget((0,1)) == "Hit"
+    assert clone.remainingShips == 3
+    assert gameboard.remainingShips == 2
+    clone.recordShot((5,5),"Miss")
+    assert (5,5) in clone.firedOn
+    assert (5,5) not in gameboard.firedOn
+
+def test_snapshot_restore(gameboard):
+    gameboard.fireAtTarget((0,0))
+    snapshot = gameboard.snapshot()
+    gameboard.fireAtTarget((0,1))
+    gameboard.fireAtTarget((0,2))
+    gameboard.recordShot((3,3),"Hit")
+    assert gameboard.remainingShips == 2
+    gameboard.restore(snapshot)
+    assert gameboard.remainingShips == 3
+    assert (3,3) not in gameboard.firedOn
+    assert gameboard.fireAtTarget((0,0)) == "Repeat"
+    assert gameboard.fireAtTarget((0,1)) == "Hit"
+    # The snapshot can be restored again after the gameboard moved on.
+    gameboard.restore(snapshot)
+    assert gameboard.fireAtTarget((0,1)) == "Hit"
+
+def test_bitboard_matches_dict():
+    rng = random.Random(7)
+    layouts = [fleetBoard(10,10).shipLayout()]+[randomLayout(rng) for game in range(20)]
+    for layout in layouts:
+        reference = battleship.Gameboard(1)
+        candidate = bitboard.BitboardGameboard(1)
+        for coordinates in layout:
+            assert reference.addShip(coordinates) == candidate.addShip(coordinates)
+        cells = [rng.randrange(100) for shot in range(150)]
+        for cell in cells:
+            target = battleship.cellCoordinates[cell]
+            assert reference.fireAtTarget(target) == candidate.fireAtTarget(target)
+            assert reference.remainingShips == candidate.remainingShips
+        assert reference.shipLayout() == candidate.shipLayout()
+
+def randomLayout(rng):
+    """
+    Place the default fleet at random without overlaps.
+    :param rng: random.Random instance.
+    :return: List of coordinate lists.
+    """
+    occupied = set()
+    layout = []
+    for size in battleship.defaultFleet:
+        while True:
+            row,column = rng.randrange(10),rng.randrange(10)
+            if rng.random() < 0.5:
+                coordinates = [(row,column+i) for i in range(size)]
+            else:
+                coordinates = [(row+i,column) for i in range(size)]
+            if all(r < 10 and c < 10 and (r,c) not in occupied for r,c in coordinates):
+                break
+        occupied.update(coordinates)
+        layout.append(coordinates)
+    return layout
+
+def test_records_round_trip(tmp_path):
+    path = str(tmp_path/"games.bsgr")
+    games = simulation.playHeadlessGames(list(range(5)),record=True)
+    with records.recordWriter(path) as writer:
+        for game in games:
+            writer.write(game["winner"],game["layouts"],game["shotStream"])
+    with records.recordReader(path) as reader:
+        assert len(reader) == len(games)
+        for game,record in zip(games,reader):
+            assert record.winner == game["winner"]
+            assert record.layouts() == [[list(map(tuple,ship)) for ship in layout] for layout in game["layouts"]]
+            playerOne,playerTwo = record.replay()
+            assert min(playerOne.remainingShips,playerTwo.remainingShips) == 0
+
+def test_records_close_with_live_records(tmp_path):
+    path = str(tmp_path/"games.bsgr")
+    game = simulation.playHeadlessGames([3],record=True)[0]
+    with records.recordWriter(path) as writer:
+        writer.write(game["winner"],game["layouts"],game["shotStream"])
+    reader = records.recordReader(path)
+    record = reader[0]
+    record.shotBytes()
+    reader.close()
+    with pytest.raises(ValueError):
+        record.winner
+
+def test_records_reject_bad_input(tmp_path):
+    with pytest.raises(ValueError):
+        records.encodeGame(1,[[[(0,10)]],[[(0,0)]]],[])
+    path = tmp_path/"short.bsgr"
+    path.write_bytes(b"BS")
+    with pytest.raises(ValueError):
+        records.recordReader(str(path))
@@ -0,0 +1,326 @@
+"""
+tournament.py
+Round-robin tournament between NPC strategies from simulation.STRATEGIES.  Every strategy faces the same fleets: a
+pool of layouts is drawn once with battleship.autoGameboardSetup() and each round of a pairing uses the next two
+layouts from the pool, played twice with the strategies swapping seats so both fire first once and both attack both
+fleets.  Every game's seed is derived from the base seed and the game's place in the schedule, so results don't depend
+on the worker count or on the order games finish in.
+
+Rounds are handed out in batches over a process pool.  After each batch the aggregate table is updated and printed,
+and the tournament stops early once neighbouring strategies in the win rate ranking have confidence intervals that no
+longer overlap.
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import battleship
+import openingbook
+import simulation
+
+# layoutPool is filled in by loadLayouts() in every worker process.
+layoutPool = []
+
+# Strategies left out of the default line-up because each of their games takes seconds.  They only play when named.
+SLOW_STRATEGIES = {"montecarlo"}
+
+def buildLayoutPool(size,seed):
+    """
+    buildLayoutPool() draws fleet layouts with battleship.autoGameboardSetup().
+    :param size: Integer number of layouts.
+    :param seed: Integer seed.
+    :return: List of layouts as returned by Gameboard.shipLayout().
+    """
+    layouts = []
+    for layoutSeed in simulation.gameSeeds(size,seed):
+        random.seed(layoutSeed)
+        layouts.append(battleship.autoGameboardSetup(1).shipLayout())
+    return layouts
+
+def loadLayouts(size,seed):
+    """
+    loadLayouts() builds this process's copy of the layout pool.  Used as the process pool initializer so layouts are
+    built once per worker rather than sent with every game.
+    :param size: Integer number of layouts.
+    :param seed: Integer seed.
+    :return: None.
+    """
+    layoutPool[:] = buildLayoutPool(size,seed)
+
+def matchSeed(seed,roundNumber,pairing,game):
+    """
+    matchSeed() derives a game's seed from its place in the schedule.
+    :param seed: Integer base seed.
+    :param roundNumber: Integer round.
+    :param pairing: Pair of strategy names.
+    :param game: Integer 0 or 1, which of the round's two games.
+    :return: Integer seed.
+    """
+    return random.Random(str(seed)+":"+str(roundNumber)+":"+pairing[0]+":"+pairing[1]+":"+str(game)).getrandbits(64)
+
+def scheduleBatch(strategies,firstRound,rounds,seed):
+    """
+    scheduleBatch() lists the games of a run of rounds for every pairing.
+    :param strategies: List of strategy names.
+    :param firstRound: Integer first round in the batch.
+    :param rounds: Integer number of rounds in the batch.
+    :param seed: Integer base seed.
+    :return: List of (seed, player one strategy, player two strategy, player one layout, player two layout) tuples.
+    Layouts are indices into the layout pool.
+    """
+    games = []
+    for roundNumber in range(firstRound,firstRound+rounds):
+        for pairing in itertools.combinations(strategies,2):
+            first = 2*roundNumber
+            second = 2*roundNumber+1
+            games.append((matchSeed(seed,roundNumber,pairing,0),pairing[0],pairing[1],first,second))
+            games.append((matchSeed(seed,roundNumber,pairing,1),pairing[1],pairing[0],first,second))
+    return games
+
+def playTournamentGames(games,backend="dict"):
+    """
+    playTournamentGames() plays a chunk of scheduled games inside one worker process.
+    :param games: List of scheduled games from scheduleBatch().
+    :param backend: String key into simulation.BACKENDS.
+    :return: List of (winning strategy, losing strategy, winner's shots) tuples.
+    """
+    gameboardClass = simulation.BACKENDS[backend]
+    results = []
+    for seed,playerOneStrategy,playerTwoStrategy,playerOneLayout,playerTwoLayout in games:
+        random.seed(seed)
+        gameboards = []
+        for player,layout in ((1,playerOneLayout),(2,playerTwoLayout)):
+            gameboard = gameboardClass(player)
+            for coordinates in layoutPool[layout % len(layoutPool)]:
+                gameboard.addShip(coordinates)
+            gameboards.append(gameboard)
+        gameResult = simulation.playGame(gameboards[0],gameboards[1],(playerOneStrategy,playerTwoStrategy))
+        if gameResult["winner"] == 1:
+            results.append((playerOneStrategy,playerTwoStrategy,gameResult["shots"]))
+        else:
+            results.append((playerTwoStrategy,playerOneStrategy,gameResult["shots"]))
+    return results
+
+class standings:
+    """
+    standings class aggregates game results per strategy.  Only sums and a shot histogram are kept, so results can be
+    added in any order.
+    """
+    def __init__(self,strategies,rows=10,columns=10):
+        """
+        :param strategies: List of strategy names.
+        :param rows: Integer number of gameboard rows.
+        :param columns: Integer number of gameboard columns.
+        """
+        self.strategies = list(strategies)
+        self.games = {name:0 for name in self.strategies}
+        self.wins = {name:0 for name in self.strategies}
+        # headToHead[winner][loser] counts wins.
+        self.headToHead = {name:{other:0 for other in self.strategies if other != name} for name in self.strategies}
+        # shotCounts[name][shots] counts wins that took that many shots.  A game can't last more shots than there are cells.
+        self.shotCounts = {name:[0]*(rows*columns+1) for name in self.strategies}
+        self.shotSums = {name:0 for name in self.strategies}
+        self.shotSquares = {name:0 for name in self.strategies}
+
+    def add(self,winner,loser,shots):
+        """
+        Add one game.
+        :param winner: String winning strategy.
+        :param loser: String losing strategy.
+        :param shots: Integer shots the winner took.
+        :return: None.
+        """
+        self.games[winner] += 1
+        self.games[loser] += 1
+        self.wins[winner] += 1
+        self.headToHead[winner][loser] += 1
+        self.shotCounts[winner][shots] += 1
+        self.shotSums[winner] += shots
+        self.shotSquares[winner] += shots*shots
+
+    def shotPercentile(self,name,fraction):
+        """
+        Shots to win at a fraction of the way through the strategy's wins.
+        :param name: String strategy.
+        :param fraction: Float between 0 and 1.
+        :return: Integer shots, or None without wins.
+        """
+        wins = self.wins[name]
+        if not wins:
+            return None
+        rank = min(wins-1,int(fraction*wins))
+        seen = 0
+        for shots,count in enumerate(self.shotCounts[name]):
+            seen += count
+            if seen > rank:
+                return shots
+
+    def table(self,confidence=0.95):
+        """
+        Build the aggregate table, best win rate first.
+        :param confidence: Float confidence level of the intervals.
+        :return: List of dictionaries, one per strategy.
+        """
+        z = NormalDist().inv_cdf(0.5+confidence/2)
+        rows = []
+        for name in self.strategies:
+            games = self.games[name]
+            wins = self.wins[name]
+            row = {"strategy":name,"games":games,"wins":wins,"winRate":None,"winRateInterval":None,
+                   "meanShotsToWin":None,"meanShotsInterval":None,
+                   "p50ShotsToWin":self.shotPercentile(name,0.5),"p90ShotsToWin":self.shotPercentile(name,0.9)}
+            if games:
+                # Wilson score interval, which behaves sensibly near win rates of 0 and 1.
+                rate = wins/games
+                centre = (rate+z*z/(2*games))/(1+z*z/games)
+                spread = z*math.sqrt(rate*(1-rate)/games+z*z/(4*games*games))/(1+z*z/games)
+                row["winRate"] = round(rate,4)
+                row["winRateInterval"] = [round(centre-spread,4),round(centre+spread,4)]
+            if wins:
+                mean = self.shotSums[name]/wins
+                variance = max(0.0,self.shotSquares[name]/wins-mean*mean)*wins/max(1,wins-1)
+                spread = z*math.sqrt(variance/wins)
+                row["meanShotsToWin"] = round(mean,2)
+                row["meanShotsInterval"] = [round(mean-spread,2),round(mean+spread,2)]
+            rows.append(row)
+        rows.sort(key=lambda row:-(row["winRate"] or 0))
+        return rows
+
+    def settled(self,confidence=0.95):
+        """
+        Whether the ranking is settled: every pair of neighbours in the table has non-overlapping win rate intervals.
+        :param confidence: Float confidence level of the intervals.
+        :return: Boolean.
+        """
+        rows = self.table(confidence)
+        if any(row["winRateInterval"] is None for row in rows):
+            return False
+        return all(better["winRateInterval"][0] > worse["winRateInterval"][1] for better,worse in zip(rows,rows[1:]))
+
+def printTable(rows,stream=None):
+    """
+    printTable() writes the aggregate table as aligned text.
+    :param rows: List of dictionaries from standings.table().
+    :param stream: File to write to, defaults to sys.stdout.
+    :return: None.
+    """
+    stream = stream or sys.stdout
+    stream.write("%-10s %7s %7s %17s %16s %5s %5s\n" % ("strategy","games","winRate","interval","meanShots","p50","p90"))
+    for row in rows:
+        interval = "-" if row["winRateInterval"] is None else "%.3f-%.3f" % tuple(row["winRateInterval"])
+        meanShots = "-" if row["meanShotsToWin"] is None else "%.2f+-%.2f" % (row["meanShotsToWin"],row["meanShotsToWin"]-row["meanShotsInterval"][0])
+        stream.write("%-10s %7d %7s %17s %16s %5s %5s\n" % (row["strategy"],row["games"],
+                     "-" if row["winRate"] is None else "%.3f" % row["winRate"],interval,meanShots,
+                     "-" if row["p50ShotsToWin"] is None else row["p50ShotsToWin"],
+                     "-" if row["p90ShotsToWin"] is None else row["p90ShotsToWin"]))
+
+def runTournament(strategies,maxRounds=2000,batchRounds=50,minRounds=50,confidence=0.95,layouts=1000,seed=0,
+                  workers=None,backend="dict",progress=None):
+    """
+    runTournament() plays the round-robin until the ranking is settled or maxRounds rounds have been played.
+    :param strategies: List of strategy names from simulation.STRATEGIES.
+    :param maxRounds: Integer most rounds to play.  A round is two games per pairing.
+    :param batchRounds: Integer rounds scheduled at once.  The stopping rule is checked after each batch.
+    :param minRounds: Integer rounds to play before the stopping rule is checked.
+    :param confidence: Float confidence level of the intervals.
+    :param layouts: Integer size of the layout pool.  Rounds past the end of the pool wrap around.
+    :param seed: Integer base seed.
+    :param workers: Integer number of worker processes.  Defaults to the CPU count; 1 plays every game in this process.
+    :param backend: String key into simulation.BACKENDS.
+    :param progress: Optional function called with the standings and the Integer rounds played after every batch.
+    :return: Tuple of (standings instance, Integer rounds played, Boolean settled).
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    results = standings(strategies)
+    layoutSeed = random.Random(seed).getrandbits(64)
+    rounds = 0
+    settled = False
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers,initializer=loadLayouts,initargs=(layouts,layoutSeed))
+    else:
+        loadLayouts(layouts,layoutSeed)
+
+    def submitBatch(firstRound):
+        count = min(batchRounds,maxRounds-firstRound)
+        games = scheduleBatch(strategies,firstRound,count,seed)
+        if executor is None:
+            return count,[playTournamentGames(games,backend)]
+        chunkSize = max(1,-(-len(games)//(workers*2)))
+        return count,[executor.submit(playTournamentGames,games[i:i+chunkSize],backend) for i in range(0,len(games),chunkSize)]
+
+    try:
+        # Keep the next batch in flight while the current one is tallied.  If the tournament stops it's discarded, so
+        # the outcome only depends on how many batches were tallied.
+        pending = submitBatch(0)
+        while pending is not None:
+            count,chunks = pending
+            pending = submitBatch(rounds+count) if rounds+count < maxRounds else None
+            for chunk in chunks:
+                for winner,loser,shots in (chunk if executor is None else chunk.result()):
+                    results.add(winner,loser,shots)
+            rounds += count
+            if progress is not None:
+                progress(results,rounds)
+            if rounds >= minRounds and results.settled(confidence):
+                settled = True
+                break
+        if pending is not None and executor is not None:
+            for chunk in pending[1]:
+                chunk.cancel()
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return results,rounds,settled
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a round-robin tournament between NPC strategies.")
+    defaultStrategies = sorted(set(simulation.STRATEGIES)-SLOW_STRATEGIES)
+    parser.add_argument("strategies",nargs="*",help="strategies to enter (default: "+", ".join(defaultStrategies)+"; "+
+                        ", ".join(sorted(SLOW_STRATEGIES))+" only when named)")
+    parser.add_argument("--max-rounds",type=int,default=2000,help="most rounds to play, two games per pairing each")
+    parser.add_argument("--batch",type=int,default=50,help="rounds per batch; the stopping rule is checked between batches")
+    parser.add_argument("--min-rounds",type=int,default=50,help="rounds to play before stopping early")
+    parser.add_argument("--confidence",type=float,default=0.95,help="confidence level of the intervals")
+    parser.add_argument("--layouts",type=int,default=1000,help="fleet layouts in the shared pool")
+    parser.add_argument("--seed",type=int,default=0,help="base seed for reproducible runs")
+    parser.add_argument("--workers",type=int,default=None,help="worker processes (default: CPU count)")
+    parser.add_argument("--backend",choices=sorted(simulation.BACKENDS),default="dict",help="Gameboard implementation")
+    parser.add_argument("--quiet",action="store_true",help="only print the final table")
+    parser.add_argument("--json",action="store_true",help="print the final table as JSON")
+    args = parser.parse_args()
+    strategies = list(dict.fromkeys(args.strategies)) or defaultStrategies
+    for name in strategies:
+        if name not in simulation.STRATEGIES:
+            parser.error("unknown strategy "+name)
+    if len(strategies) < 2:
+        parser.error("a tournament needs at least two strategies")
+    if "book" in strategies:
+        openingbook.reportMissingBook()
+
+    def progress(results,rounds):
+        sys.stderr.write("after "+str(rounds)+" rounds\n")
+        printTable(results.table(args.confidence),sys.stderr)
+
+    start = time.perf_counter()
+    results,rounds,settled = runTournament(strategies,args.max_rounds,args.batch,args.min_rounds,
+                                           args.confidence,args.layouts,args.seed,args.workers,args.backend,
+                                           None if args.quiet or args.json else progress)
+    elapsed = time.perf_counter()-start
+    if args.json:
+        print(json.dumps({"rounds":rounds,"settled":settled,"seconds":round(elapsed,3),
+                          "table":results.table(args.confidence),"headToHead":results.headToHead},indent=2))
+    else:
+        print(("Settled" if settled else "Not settled")+" after "+str(rounds)+" rounds in "+str(round(elapsed,2))+"s")
+        printTable(results.table(args.confidence))
+
+if __name__ == '__main__':
+    main()